@@ -1,6 +1,7 @@
 #!/bin/bash
 # Monitor Joint 1 following error to see if it's building up over time
 # Run this before starting a job, let it run for 20+ minutes
+# Samples at 1 Hz only - python/hal_sampler.py captures the same pins every servo period
 
 echo "Time,Following_Error,Position_Cmd,Position_Fb,PID_Output,PID_Integral"
 while true; do
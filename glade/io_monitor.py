@@ -5,11 +5,27 @@ gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GLib
 import gladevcp
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+from ini_config import get_config
+
+# LED labels: (widget id = io_monitor pin, size in points, on colour, off colour)
+LEDS = (
+    ('left_button_led', 20, '#4CAF50', '#B71C1C'),
+    ('right_button_led', 15, '#00FF00', '#FF0000'),
+    ('vacuum_ok_led', 15, '#00FF00', '#FF0000'),
+    ('tool_locked_led', 15, '#00FF00', '#FF0000'),
+    ('x_safe_led', 15, '#00FF00', '#FF0000'),
+    ('y_safe_led', 15, '#00FF00', '#FF0000'),
+)
 
 class HandlerClass:
     def __init__(self, halcomp, builder, useropts):
         self.hal = halcomp
         self.builder = builder
+        self.FRAME_RATE = get_config().get_float('IO_MONITOR', 'FRAME_RATE', 10.0)  # Panel refreshes per second
+        self.timer = None
         
         # Get the main window
         self.window = self.builder.get_object('window1')
@@ -43,6 +59,12 @@ class HandlerClass:
         
         # Connect HAL signals
         self.setup_hal_signals()
+        self.setup_leds()
+        
+        # Refresh only while the IO Monitor page is on screen: hidden notebook
+        # pages, and the gmoccapy tab this panel is embedded in, unmap it
+        self.scrolled_window.connect('map', self.on_map)
+        self.scrolled_window.connect('unmap', self.on_unmap)
         
         # Show all widgets
         self.window.show_all()
@@ -67,15 +89,43 @@ class HandlerClass:
         except Exception as e:
             print(f"Error setting up HAL signals: {e}")
     
+    def setup_leds(self):
+        """One io_monitor pin per LED label, read together once per frame"""
+        self.led_names = []
+        self.led_markup = []   # (widget, markup off, markup on)
+        for name, size, on, off in LEDS:
+            self.hal.newpin(name, hal.HAL_BIT, hal.HAL_IN)
+            self.led_names.append(name)
+            self.led_markup.append((self.builder.get_object(name),
+                                    f'<span foreground="{off}" size="{size * 1024}">\u25cf</span>',
+                                    f'<span foreground="{on}" size="{size * 1024}">\u25cf</span>'))
+        self.shown = [None] * len(self.led_names)
+    
+    def on_map(self, widget):
+        if self.timer is None:
+            self.shown = [None] * len(self.led_names)   # Redraw everything once
+            self.periodic()
+            self.timer = GLib.timeout_add(int(1000 / max(self.FRAME_RATE, 1.0)), self.periodic)
+    
+    def on_unmap(self, widget):
+        if self.timer is not None:
+            GLib.source_remove(self.timer)
+            self.timer = None
+    
     def on_window_destroy(self, widget, data=None):
         """Handle window close button"""
         Gtk.main_quit()
         return False
     
     def periodic(self):
-        """Called periodically by the HAL component"""
-        # Add any periodic updates here
-        return True
+        """One frame: read every pin in one pass, then touch only the widgets that changed"""
+        values = [bool(self.hal[name]) for name in self.led_names]
+        for i, value in enumerate(values):
+            if value != self.shown[i]:
+                widget, markup_off, markup_on = self.led_markup[i]
+                widget.set_markup(markup_on if value else markup_off)
+                self.shown[i] = value
+        return True  # Keep the frame timer running
 
 def get_handlers(halcomp, builder, useropts):
     return [HandlerClass(halcomp, builder, useropts)] 
\ No newline at end of file
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Joint odometry: travelled distance, direction reversals and moving time per
+# position bin for each joint, for lube and maintenance planning.
+#
+# joint.N.pos-fb is sampled every SAMPLE_INTERVAL into a preallocated array
+# and processed once per second with NumPy: differences give distance and
+# direction, np.bincount folds them into BINS fixed bins over
+# [JOINT_N]MIN_LIMIT..MAX_LIMIT. Steps slower than MIN_SPEED are encoder
+# dither, not travel. Totals are added to the axis_odometry/axis_bins tables
+# of the timers database every FLUSH_INTERVAL by a writer thread, so a busy
+# database never delays sampling or the heartbeat.
+#
+#   python3 python/axis_odometry.py                  Run as a HAL component (loadusr)
+#   python3 python/axis_odometry.py report [--joint N] [--top K]
+#   python3 python/axis_odometry.py lube JOINT       Record a lube at the current distance
+#   python3 python/axis_odometry.py export FILE.csv  Per-bin totals
+
+import sys
+import hal
+import time
+import queue
+import signal
+import threading
+import argparse
+import numpy as np
+import timers_db
+from heartbeat import Heartbeat
+from ini_config import get_config
+
+UNITS_PER_METER = 1000.0    # Joint positions are mm
+BATCH = 50                  # Samples per NumPy pass (1s at the default 20ms)
+
+class JointHistogram:
+    """Fixed bins over one joint's travel range"""
+
+    def __init__(self, joint, low, high, bins):
+        self.joint = joint
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.scale = bins / (high - low)
+        self.moving_time = np.zeros(bins)
+        self.distance = np.zeros(bins)
+        self.reversals = np.zeros(bins, dtype=np.int64)
+        self.direction = 0      # Sign of the last move, carried across batches
+
+    def bin_of(self, pos):
+        return np.clip(((pos - self.low) * self.scale).astype(np.int64), 0, self.bins - 1)
+
+    def add(self, pos, step, dt):
+        """pos: positions after each step; step, dt: moves and sample times (moving samples only)"""
+        if not len(step):
+            return
+        bins = self.bin_of(pos)
+        self.moving_time += np.bincount(bins, weights=dt, minlength=self.bins)
+        self.distance += np.bincount(bins, weights=np.abs(step), minlength=self.bins)
+        signs = np.sign(step)
+        previous = np.concatenate(([self.direction], signs[:-1]))
+        turned = (signs != previous) & (previous != 0)
+        if turned.any():
+            self.reversals += np.bincount(bins[turned], minlength=self.bins)
+        self.direction = signs[-1]
+
+    def edges(self, i):
+        width = (self.high - self.low) / self.bins
+        return self.low + i * width, self.low + (i + 1) * width
+
+    def take_rows(self):
+        """Non-empty bins as (bin, low, high, moving_time, distance m, reversals); clears them"""
+        rows = []
+        for i in np.flatnonzero(self.moving_time):
+            low, high = self.edges(i)
+            rows.append((int(i), round(low, 3), round(high, 3), float(self.moving_time[i]),
+                         float(self.distance[i]) / UNITS_PER_METER, int(self.reversals[i])))
+        self.moving_time[:] = 0
+        self.distance[:] = 0
+        self.reversals[:] = 0
+        return rows
+
+def read_totals(conn, joints):
+    """joint -> (distance, reversals, lube_distance) as stored"""
+    totals = {}
+    for joint in joints:
+        row = conn.execute("SELECT distance, reversals, lube_distance FROM axis_odometry WHERE joint = ?",
+                           (joint,)).fetchone()
+        totals[joint] = row or (0.0, 0, 0.0)
+    return totals
+
+class OdometryWriter(threading.Thread):
+    """Background writer for the odometry tables. The sampling loop only queues
+    batches; a failed batch is kept and retried with backoff. totals and
+    unsaved (distance, reversals queued but not stored yet) are read under lock.
+    """
+    def __init__(self, db_path, joints, totals, flush_interval=1.0):
+        super().__init__(name="odometry-writer", daemon=True)
+        self.db_path = db_path
+        self.joints = joints
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.totals = totals
+        self.unsaved = np.zeros((len(joints), 2))
+        self.retry = []          # Batches kept from a failed flush, oldest first
+        self.failures = 0
+        self.retry_at = 0
+
+    def submit(self, amounts, rows):
+        """Queue per joint (distance m, reversals, moving time) and bin rows - never blocks"""
+        with self.lock:
+            self.unsaved += amounts[:, :2]
+        self.pending.put((amounts, rows))
+
+    def stop(self):
+        """Write everything queued and stop the thread"""
+        self.stopping.set()
+        self.join(timeout=10.0)
+
+    def run(self):
+        self.conn = timers_db.connect(self.db_path)
+        while not self.stopping.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+        self.conn.close()
+
+    def flush(self):
+        batch = self.retry
+        while True:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        self.retry = batch
+        if not batch:
+            return
+        if self.failures and time.monotonic() < self.retry_at and not self.stopping.is_set():
+            return
+        try:
+            with self.conn:  # One transaction for the whole batch
+                for amounts, rows in batch:
+                    for k, joint in enumerate(self.joints):
+                        distance, reversals, moving_time = amounts[k]
+                        if moving_time:
+                            timers_db.add_axis_odometry(self.conn, joint, float(distance), int(reversals), float(moving_time))
+                            timers_db.add_axis_bins(self.conn, joint, rows[k])
+            self.retry = []
+            self.failures = 0
+            totals = read_totals(self.conn, self.joints)   # Picks up lubes recorded from the command line
+            with self.lock:
+                self.unsaved -= sum(amounts[:, :2] for amounts, _ in batch)
+                self.totals = totals
+        except Exception as e:
+            self.failures += 1
+            delay = min(60.0, self.flush_interval * 2 ** self.failures)
+            self.retry_at = time.monotonic() + delay
+            print(f"Warning: Axis odometry failed to save, retrying in {delay:.1f}s: {e}")
+
+    def stored(self):
+        """(totals, unsaved) - the database totals and what is queued on top of them"""
+        with self.lock:
+            return self.totals, self.unsaved.copy()
+
+class AxisOdometry:
+    def __init__(self):
+        self.h = hal.component("axis_odometry")
+        self.config = get_config()
+        self.load_parameters()
+
+        # Input pins
+        for joint in self.JOINTS:
+            self.h.newpin(f"joint{joint}_pos", hal.HAL_FLOAT, hal.HAL_IN)        # joint.N.pos-fb
+
+        # Output pins
+        for joint in self.JOINTS:
+            self.h.newpin(f"joint{joint}_distance", hal.HAL_FLOAT, hal.HAL_OUT)  # Total travel (m)
+            self.h.newpin(f"joint{joint}_reversals", hal.HAL_S32, hal.HAL_OUT)   # Total direction reversals
+            self.h.newpin(f"joint{joint}_lube_due", hal.HAL_BIT, hal.HAL_OUT)    # LUBE_DISTANCE travelled since the last lube
+
+        # State tracking
+        self.histograms = [JointHistogram(joint, self.config.get_float(f"JOINT_{joint}", 'MIN_LIMIT', 0.0),
+                                          self.config.get_float(f"JOINT_{joint}", 'MAX_LIMIT', 1000.0), self.BINS)
+                           for joint in self.JOINTS]
+        self.samples = np.empty((BATCH, len(self.JOINTS)))
+        self.times = np.empty(BATCH)
+        self.count = 0
+        self.last_pos = None
+        self.last_time = None
+        self.pending = np.zeros((len(self.JOINTS), 3))   # Unflushed distance (m), reversals, moving time
+        self.lube_warned = set()
+        self.last_flush = time.monotonic()
+
+        # Checked once at start; after that only the writer thread touches the database
+        db_path = timers_db.default_db_path()
+        self.conn = timers_db.connect(db_path)
+        self.check_bins()
+        totals = read_totals(self.conn, self.JOINTS)
+        self.conn.close()
+        self.writer = OdometryWriter(db_path, self.JOINTS, totals)
+        self.writer.start()
+
+        # Liveness pins watched by component_supervisor.py
+        self.heartbeat = Heartbeat(self.h)
+
+        self.h.ready()
+
+    def load_parameters(self):
+        """Load sampling and maintenance settings from the cached INI config"""
+        self.JOINTS = [int(j) for j in self.config.get_str('AXIS_ODOMETRY', 'JOINTS', '0 1 2').split()]
+        self.BINS = self.config.get_int('AXIS_ODOMETRY', 'BINS', 100)                           # Position bins per joint
+        self.SAMPLE_INTERVAL = self.config.get_float('AXIS_ODOMETRY', 'SAMPLE_INTERVAL', 0.02)  # Seconds between samples
+        self.MIN_SPEED = self.config.get_float('AXIS_ODOMETRY', 'MIN_SPEED', 1.0)               # Slower steps are not travel (units/s)
+        self.FLUSH_INTERVAL = self.config.get_float('AXIS_ODOMETRY', 'FLUSH_INTERVAL', 60.0)    # Seconds between database writes
+        self.LUBE_DISTANCE = self.config.get_float('AXIS_ODOMETRY', 'LUBE_DISTANCE', 0.0)       # Metres between lubes (0 = off)
+
+    def check_bins(self):
+        """Start a joint's histogram afresh if its limits or BINS changed"""
+        for hist in self.histograms:
+            row = self.conn.execute("SELECT MIN(low), MAX(high), MAX(bin) FROM axis_bins WHERE joint = ?",
+                                    (hist.joint,)).fetchone()
+            if row[0] is None:
+                continue
+            # Stored bins must sit on the current grid
+            low, high = hist.edges(row[2])
+            if row[2] >= hist.bins or abs(row[1] - round(high, 3)) > 1e-3 or row[0] < round(hist.low, 3) - 1e-3:
+                print(f"Warning: Joint {hist.joint} limits or bins changed - position histogram restarted")
+                with self.conn:
+                    self.conn.execute("DELETE FROM axis_bins WHERE joint = ?", (hist.joint,))
+
+    def sample(self):
+        now = time.monotonic()
+        self.samples[self.count] = [self.h[f"joint{joint}_pos"] for joint in self.JOINTS]
+        self.times[self.count] = now
+        self.count += 1
+        if self.count == BATCH:
+            self.process()
+
+    def process(self):
+        """Fold the buffered samples into the histograms"""
+        n, self.count = self.count, 0
+        if not n:
+            return
+        pos, times = self.samples[:n], self.times[:n]
+        if self.last_pos is None:
+            self.last_pos, self.last_time = pos[0].copy(), times[0]
+        steps = np.diff(np.vstack((self.last_pos, pos)), axis=0)
+        dt = np.diff(np.concatenate(([self.last_time], times)))
+        self.last_pos, self.last_time = pos[-1].copy(), times[-1]
+        moving = np.abs(steps) >= self.MIN_SPEED * dt[:, None]
+        for k, hist in enumerate(self.histograms):
+            mask = moving[:, k]
+            reversals = hist.reversals.sum()
+            hist.add(pos[mask, k], steps[mask, k], dt[mask])
+            self.pending[k] += (np.abs(steps[mask, k]).sum() / UNITS_PER_METER,
+                                hist.reversals.sum() - reversals, dt[mask].sum())
+
+    def flush(self):
+        """Hand the pending totals and bins to the writer thread"""
+        self.writer.submit(self.pending.copy(), [hist.take_rows() for hist in self.histograms])
+        self.pending[:] = 0
+
+    def publish(self):
+        totals, unsaved = self.writer.stored()
+        for k, joint in enumerate(self.JOINTS):
+            distance, reversals, lube_distance = totals[joint]
+            distance += unsaved[k][0] + self.pending[k][0]
+            self.h[f"joint{joint}_distance"] = distance
+            self.h[f"joint{joint}_reversals"] = int(reversals + unsaved[k][1] + self.pending[k][1])
+            due = self.LUBE_DISTANCE > 0 and distance - lube_distance >= self.LUBE_DISTANCE
+            if due and joint not in self.lube_warned:
+                print(f"Warning: Joint {joint} has travelled {distance - lube_distance:.0f} m since the last lube")
+                self.lube_warned.add(joint)
+            elif not due:
+                self.lube_warned.discard(joint)
+            self.h[f"joint{joint}_lube_due"] = due
+
+    def update(self):
+        self.heartbeat.beat()
+        self.sample()
+        now = time.monotonic()
+        if now - self.last_flush >= self.FLUSH_INTERVAL:
+            self.process()
+            self.flush()
+            self.last_flush = now
+        if self.count == 0:
+            self.publish()
+
+    def shutdown(self):
+        self.process()
+        self.flush()
+        self.writer.stop()
+
+def handle_sigterm(signum, frame):
+    # LinuxCNC stops userspace components with SIGTERM - flush like Ctrl-C
+    raise KeyboardInterrupt
+
+def report(conn, joints, top):
+    for joint, distance, reversals, moving_time, lube_distance, lube_ts in conn.execute(
+            "SELECT joint, distance, reversals, moving_time, lube_distance, lube_ts FROM axis_odometry ORDER BY joint"):
+        if joints and joint not in joints:
+            continue
+        lubed = time.strftime('%Y-%m-%d', time.localtime(lube_ts)) if lube_ts else 'never'
+        print(f"Joint {joint}: {distance / 1000:.2f} km, {reversals} reversals, moving {moving_time / 3600:.1f} h, "
+              f"{distance - lube_distance:.0f} m since lube ({lubed})")
+        rows = conn.execute("""SELECT low, high, moving_time, distance, reversals FROM axis_bins
+                               WHERE joint = ? ORDER BY distance DESC LIMIT ?""", (joint, top)).fetchall()
+        peak = rows[0][3] if rows else 0
+        for low, high, bin_time, bin_distance, bin_reversals in rows:
+            bar = '#' * int(30 * bin_distance / peak) if peak else ''
+            print(f"  {low:9.1f} .. {high:9.1f}  {bin_distance:10.1f} m  {bin_reversals:8d} rev  "
+                  f"{bin_time / 3600:7.2f} h  {bar}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Joint travel, reversals and position histogram")
+    parser.add_argument('--db', default=None, help="Timers database (default logs/machine_timers.db)")
+    sub = parser.add_subparsers(dest='cmd')
+    rep = sub.add_parser('report', help="Totals and the busiest bins per joint")
+    rep.add_argument('--joint', type=int, action='append')
+    rep.add_argument('--top', type=int, default=10)
+    lube = sub.add_parser('lube', help="Record a lube of a joint")
+    lube.add_argument('joint', type=int)
+    exp = sub.add_parser('export', help="Write the per-bin totals as CSV")
+    exp.add_argument('csv')
+    args = parser.parse_args()
+
+    if args.cmd is None:
+        odometry = AxisOdometry()
+        signal.signal(signal.SIGTERM, handle_sigterm)
+        try:
+            while True:
+                odometry.update()
+                time.sleep(odometry.SAMPLE_INTERVAL)
+        except KeyboardInterrupt:
+            odometry.shutdown()
+            raise SystemExit
+
+    conn = timers_db.connect(args.db or timers_db.default_db_path())
+    if args.cmd == 'report':
+        report(conn, args.joint, args.top)
+    elif args.cmd == 'lube':
+        with conn:
+            updated = conn.execute("UPDATE axis_odometry SET lube_distance = distance, lube_ts = ? WHERE joint = ?",
+                                   (int(time.time()), args.joint)).rowcount
+        if not updated:
+            print(f"No odometry recorded for joint {args.joint}")
+            sys.exit(1)
+        print(f"Lube of joint {args.joint} recorded")
+    else:
+        with open(args.csv, 'w') as out:
+            out.write("joint,low,high,moving_time,distance_m,reversals\n")
+            for row in conn.execute("""SELECT joint, low, high, moving_time, distance, reversals FROM axis_bins
+                                       ORDER BY joint, bin"""):
+                out.write(','.join(str(value) for value in row) + '\n')
+        print(f"Wrote {args.csv}")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
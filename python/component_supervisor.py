@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+
+import hal
+import time
+import logging
+from ini_config import get_config
+from heartbeat import Heartbeat
+
+# Set up logging - stall records are kept here for later analysis
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename='logs/supervisor.log'
+)
+logger = logging.getLogger('supervisor')
+
+DEFAULT_COMPONENTS = 'machine_enable work_area vfd_control tool_release vacuum machine_timers'
+
+class WatchedComponent:
+    """Stall tracking for one component's last_update pin"""
+    def __init__(self, name):
+        self.name = name
+        self.stalled = False
+        self.stall_start = 0
+        self.stall_count = 0
+        self.missing = False
+
+class ComponentSupervisor:
+    def __init__(self):
+        self.h = hal.component("supervisor")
+        self.config = get_config()
+        self.load_parameters()
+
+        # Per component output pins - AND/OR these with the component outputs in HAL
+        # so a frozen process falls back to its safe state
+        self.components = []
+        for name in self.COMPONENTS:
+            self.h.newpin(f"{name}_ok", hal.HAL_BIT, hal.HAL_OUT)          # Component updating in time
+            self.h.newpin(f"{name}_stalled", hal.HAL_BIT, hal.HAL_OUT)     # Inverse of _ok, for OR gates
+            self.h.newpin(f"{name}_stall_time", hal.HAL_FLOAT, hal.HAL_OUT) # Current/last stall length (seconds)
+            self.h[f"{name}_ok"] = True
+            self.h[f"{name}_stalled"] = False
+            self.h[f"{name}_stall_time"] = 0.0
+            self.components.append(WatchedComponent(name))
+
+        # Summary output pins
+        self.h.newpin("fault", hal.HAL_BIT, hal.HAL_OUT)         # Any component stalled (operator LED)
+        self.h.newpin("stall_count", hal.HAL_S32, hal.HAL_OUT)   # Stalls since start
+        self.h.fault = False
+        self.h.stall_count = 0
+
+        # The supervisor publishes its own heartbeat for an external (realtime) watchdog
+        self.heartbeat = Heartbeat(self.h)
+
+        # Operator messages go through the LinuxCNC error channel when available
+        try:
+            import linuxcnc
+            self.command = linuxcnc.command()
+        except Exception as e:
+            print(f"Warning: linuxcnc module unavailable, operator messages disabled: {e}")
+            self.command = None
+
+        print(f"Supervisor watching {', '.join(self.COMPONENTS)} (window {self.WINDOW:.2f}s)")
+        logger.info(f"Supervisor started - window={self.WINDOW}s components={self.COMPONENTS}")
+        self.h.ready()
+
+    def load_parameters(self):
+        """Load the watch list and deadline from the [SUPERVISOR] INI section"""
+        self.WINDOW = self.config.get_float('SUPERVISOR', 'WINDOW', 1.0)  # Max seconds between updates
+        self.COMPONENTS = self.config.get_str('SUPERVISOR', 'COMPONENTS', DEFAULT_COMPONENTS).split()
+
+    def operator_message(self, text):
+        """Show a message in the GUI and keep a copy in the log"""
+        print(text)
+        if self.command is not None:
+            try:
+                self.command.error_msg(text)
+            except Exception as e:
+                print(f"Warning: Failed to send operator message: {e}")
+
+    def check_component(self, comp, now):
+        """Compare a component's last_update with the deadline"""
+        try:
+            last_update = hal.get_value(f"{comp.name}.last_update")
+            comp.missing = False
+        except Exception:
+            # Component not loaded (yet) - treat as stalled but only report once
+            if not comp.missing:
+                logger.warning(f"{comp.name}: last_update pin not found")
+            comp.missing = True
+            last_update = 0.0
+
+        age = now - last_update
+        if age > self.WINDOW:
+            if not comp.stalled:
+                comp.stalled = True
+                comp.stall_start = last_update if last_update > 0 else now
+                comp.stall_count += 1
+                self.h.stall_count += 1
+                logger.error(f"STALL_START component={comp.name} age={age:.3f}")
+                self.operator_message(f"Component {comp.name} stopped responding ({age:.1f}s) - outputs safed")
+            self.h[f"{comp.name}_stall_time"] = now - comp.stall_start
+        elif comp.stalled:
+            duration = last_update - comp.stall_start
+            comp.stalled = False
+            self.h[f"{comp.name}_stall_time"] = duration
+            logger.warning(f"STALL_END component={comp.name} duration={duration:.3f} count={comp.stall_count}")
+            print(f"  Action: {comp.name} recovered after {duration:.2f}s stall")
+
+        self.h[f"{comp.name}_ok"] = not comp.stalled
+        self.h[f"{comp.name}_stalled"] = comp.stalled
+        return comp.stalled
+
+    def update(self):
+        self.heartbeat.beat()
+
+        if self.config.reload_if_changed():
+            self.WINDOW = self.config.get_float('SUPERVISOR', 'WINDOW', 1.0)
+
+        now = time.monotonic()
+        any_stalled = False
+        for comp in self.components:
+            if self.check_component(comp, now):
+                any_stalled = True
+        self.h.fault = any_stalled
+
+def main():
+    supervisor = ComponentSupervisor()
+    # Check several times per window so a missed deadline is caught promptly
+    period = min(0.05, supervisor.WINDOW / 4)
+
+    try:
+        while True:
+            supervisor.update()
+            time.sleep(period)
+
+    except KeyboardInterrupt:
+        logger.info("Supervisor stopped")
+        raise SystemExit
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Append-only binary event journal for machine_timers.
+#
+# Events are written once, as fixed-size records, to segment files in
+# logs/journal/. The active segment is fsynced every [JOURNAL]FSYNC_INTERVAL
+# seconds and rotated by size or age; closed segments are gzipped. The SQLite
+# timers database is fed from the journal by ingest(), which remembers how far
+# it got (accumulated_times key 'journal_seq').
+#
+#   python3 python/event_journal.py tail [-n N]
+#   python3 python/event_journal.py query [--since 'YYYY-MM-DD HH:MM'] [--until ...] [--type SPINDLE_STOP]
+#   python3 python/event_journal.py replay          Print every record in order
+#   python3 python/event_journal.py ingest [DB]     Catch the database up with the journal
+#
+# Segments are read record by record, so queries never load a whole segment.
+# Records are fixed size and appended in time order, so a query seeks straight
+# to start_seq and binary searches the timestamps for --since.
+
+import os
+import gzip
+import glob
+import time
+import zlib
+import struct
+import argparse
+from collections import deque
+from datetime import datetime
+from ini_config import get_config
+
+MAGIC = b'RVJ1'
+HEADER = struct.Struct('<4sH')             # Magic, record size
+RECORD = struct.Struct('<IdBxhhf')         # seq, epoch ts, type, tool, from tool, duration
+CRC = struct.Struct('<I')
+RECORD_SIZE = RECORD.size + CRC.size
+
+EVENT_TYPES = {
+    'SPINDLE_START': 1,
+    'SPINDLE_STOP': 2,
+    'TOOL_CHANGE': 3,
+}
+EVENT_NAMES = {code: name for name, code in EVENT_TYPES.items()}
+
+def default_journal_dir():
+    return os.path.join(os.environ.get('LINUXCNC_CONFIG_DIR', ''), 'logs', 'journal')
+
+def pack(seq, ts, event_type, tool=0, from_tool=0, duration=0.0):
+    body = RECORD.pack(seq, ts, EVENT_TYPES[event_type], tool or 0, from_tool or 0, duration or 0.0)
+    return body + CRC.pack(zlib.crc32(body))
+
+def unpack(data):
+    """Record dict, or None for a torn/corrupt record"""
+    body, (crc,) = data[:RECORD.size], CRC.unpack(data[RECORD.size:])
+    if zlib.crc32(body) != crc:
+        return None
+    seq, ts, code, tool, from_tool, duration = RECORD.unpack(body)
+    return {'seq': seq, 'ts': ts, 'type': EVENT_NAMES.get(code, f"TYPE_{code}"),
+            'tool': tool, 'from_tool': from_tool, 'duration': duration}
+
+def describe(record):
+    """The details text machine_timers has always logged for an event"""
+    if record['type'] == 'SPINDLE_START':
+        return f"Tool: {record['tool']}"
+    if record['type'] == 'SPINDLE_STOP':
+        return f"Duration: {record['duration']:.1f}s, Tool: {record['tool']}"
+    if record['type'] == 'TOOL_CHANGE':
+        return f"From: {record['from_tool']}, To: {record['tool']}, Duration: {record['duration']:.1f}s"
+    return ''
+
+def segment_name(first_seq, ts):
+    return f"events-{first_seq:010d}-{time.strftime('%Y%m%d%H%M%S', time.localtime(ts))}.bin"
+
+def segment_first_seq(path):
+    return int(os.path.basename(path).split('-')[1])
+
+def segment_opened(path):
+    """Creation time encoded in the segment name"""
+    stamp = os.path.basename(path).split('-')[2].split('.')[0]
+    return time.mktime(time.strptime(stamp, '%Y%m%d%H%M%S'))
+
+def list_segments(journal_dir):
+    """Segment paths in sequence order (compressed and active)"""
+    paths = glob.glob(os.path.join(journal_dir, 'events-*.bin')) + \
+            glob.glob(os.path.join(journal_dir, 'events-*.bin.gz'))
+    return sorted(paths, key=segment_first_seq)
+
+def record_count(path):
+    """Whole records in a segment, from its (uncompressed) size"""
+    if path.endswith('.gz'):
+        # Uncompressed size mod 2^32 is the gzip trailer's last field
+        with open(path, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            size = struct.unpack('<I', f.read(4))[0]
+    else:
+        size = os.path.getsize(path)
+    return max(0, (size - HEADER.size) // RECORD_SIZE)
+
+def read_record(f, index):
+    """Record at a position in an open segment, or None past the end or torn"""
+    f.seek(HEADER.size + index * RECORD_SIZE)
+    data = f.read(RECORD_SIZE)
+    return unpack(data) if len(data) == RECORD_SIZE else None
+
+def first_since(f, count, since):
+    """Index of the first record with ts >= since (binary search)"""
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        record = read_record(f, middle)
+        # A torn record can only be the tail, so treat it as past 'since'
+        if record is None or record['ts'] >= since:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+def read_segment(path, start=0, since=None):
+    """Yield the records of one segment from record index 'start' (and ts >= since),
+    stopping at a torn tail
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        magic, size = HEADER.unpack(header)
+        if magic != MAGIC or size != RECORD_SIZE:
+            print(f"Warning: {path} is not a journal segment")
+            return
+        if since is not None:
+            start = max(start, first_since(f, record_count(path), since))
+        f.seek(HEADER.size + start * RECORD_SIZE)
+        while True:
+            data = f.read(RECORD_SIZE)
+            if len(data) < RECORD_SIZE:
+                return
+            record = unpack(data)
+            if record is None:
+                return
+            yield record
+
+def iter_records(journal_dir=None, start_seq=0, since=None, until=None, types=None):
+    """Stream records with seq >= start_seq, optionally filtered by time and type"""
+    segments = list_segments(journal_dir or default_journal_dir())
+    for i, path in enumerate(segments):
+        if i + 1 < len(segments):
+            following = segments[i + 1]
+            # Skip segments that end before start_seq
+            if segment_first_seq(following) <= start_seq:
+                continue
+            # or before 'since': the next segment was opened at or after this one's last
+            # record (names have whole local seconds - allow for a DST shift)
+            if since is not None and segment_opened(following) + 3601 <= since:
+                continue
+        # Sequence numbers are consecutive from the first one in the name
+        start = max(0, start_seq - segment_first_seq(path))
+        for record in read_segment(path, start, since):
+            if until is not None and record['ts'] >= until:
+                return
+            if types and record['type'] not in types:
+                continue
+            yield record
+
+class JournalWriter:
+    """Appends records to the active segment. Not thread safe - owned by one thread."""
+
+    def __init__(self, journal_dir=None):
+        self.journal_dir = journal_dir or default_journal_dir()
+        os.makedirs(self.journal_dir, exist_ok=True)
+        config = get_config()
+        self.MAX_SEGMENT_BYTES = config.get_int('JOURNAL', 'MAX_SEGMENT_KB', 1024) * 1024
+        self.MAX_SEGMENT_AGE = config.get_float('JOURNAL', 'MAX_SEGMENT_HOURS', 24.0) * 3600
+        self.FSYNC_INTERVAL = config.get_float('JOURNAL', 'FSYNC_INTERVAL', 5.0)
+
+        self.file = None
+        self.path = None
+        self.opened_at = 0
+        self.last_fsync = time.monotonic()
+        self.dirty = False
+        self.next_seq = 1
+        self.recover()
+
+    def recover(self):
+        """Find the next sequence number, trim a torn tail and reopen the active segment"""
+        segments = list_segments(self.journal_dir)
+        for path in segments:
+            if path.endswith('.bin') and path != segments[-1]:
+                self.compress(path)  # Left uncompressed by an earlier crash
+        if not segments:
+            return
+        last = segments[-1]
+        if last.endswith('.gz'):
+            for record in read_segment(last):
+                self.next_seq = record['seq'] + 1
+            return
+        good = 0
+        for record in read_segment(last):
+            self.next_seq = record['seq'] + 1
+            good += 1
+        size = os.path.getsize(last)
+        end = HEADER.size + good * RECORD_SIZE
+        if size < HEADER.size:
+            with open(last, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, RECORD_SIZE))
+        elif size != end:
+            print(f"Warning: Trimming torn journal tail in {last}")
+            with open(last, 'r+b') as f:
+                f.truncate(end)
+        self.path = last
+        self.file = open(last, 'ab')
+        self.opened_at = segment_opened(last)
+
+    def open_segment(self, ts):
+        self.path = os.path.join(self.journal_dir, segment_name(self.next_seq, ts))
+        self.file = open(self.path, 'ab')
+        self.file.write(HEADER.pack(MAGIC, RECORD_SIZE))
+        self.opened_at = ts
+
+    def rotate(self):
+        """Close the active segment and compress it"""
+        if self.file is None:
+            return
+        self.sync()
+        self.file.close()
+        self.file = None
+        self.compress(self.path)
+
+    def compress(self, path):
+        try:
+            with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+                while True:
+                    chunk = src.read(1 << 16)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            os.unlink(path)
+        except OSError as e:
+            print(f"Warning: Failed to compress journal segment {path}: {e}")
+
+    def append(self, ts, event_type, tool=0, from_tool=0, duration=0.0):
+        """Write one record and return its sequence number"""
+        if self.file is not None and (self.file.tell() >= self.MAX_SEGMENT_BYTES or
+                                      ts - self.opened_at >= self.MAX_SEGMENT_AGE):
+            self.rotate()
+        if self.file is None:
+            self.open_segment(ts)
+        seq = self.next_seq
+        self.file.write(pack(seq, ts, event_type, tool, from_tool, duration))
+        self.next_seq += 1
+        self.dirty = True
+        return seq
+
+    def sync(self, force=True):
+        """Flush and fsync the active segment (at most every FSYNC_INTERVAL unless forced)"""
+        if self.file is None or not self.dirty:
+            return
+        if not force and time.monotonic() - self.last_fsync < self.FSYNC_INTERVAL:
+            self.file.flush()
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.dirty = False
+        self.last_fsync = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+def ingest(conn, journal_dir=None):
+    """Insert journal records the database has not seen yet. Returns the number ingested."""
+    import timers_db
+    row = conn.execute("SELECT value FROM accumulated_times WHERE key = 'journal_seq'").fetchone()
+    last_seq = int(row[0]) if row else 0
+    count = 0
+    with conn:
+        for record in iter_records(journal_dir, start_seq=last_seq + 1):
+            timers_db.insert_event(conn, record['ts'], record['type'], describe(record),
+                                   record['duration'] if record['type'] != 'SPINDLE_START' else None,
+                                   record['tool'])
+            last_seq = record['seq']
+            count += 1
+        if count:
+            conn.execute("INSERT OR REPLACE INTO accumulated_times (key, value) VALUES ('journal_seq', ?)",
+                         (last_seq,))
+    return count
+
+def format_record(record):
+    when = datetime.fromtimestamp(record['ts']).strftime('%Y-%m-%d %H:%M:%S')
+    return f"{record['seq']:8d}  {when} - {record['type']}: {describe(record)}"
+
+def parse_time(text):
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"Bad time {text}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Read the machine_timers event journal")
+    parser.add_argument('--dir', default=None, help="Journal directory (default logs/journal)")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    tail = sub.add_parser('tail', help="Last records")
+    tail.add_argument('-n', type=int, default=20)
+    query = sub.add_parser('query', help="Records in a time range")
+    query.add_argument('--since', type=parse_time)
+    query.add_argument('--until', type=parse_time)
+    query.add_argument('--type', action='append', choices=sorted(EVENT_TYPES))
+    sub.add_parser('replay', help="Every record in order")
+    ingest_cmd = sub.add_parser('ingest', help="Feed new records into the timers database")
+    ingest_cmd.add_argument('db', nargs='?')
+    args = parser.parse_args()
+
+    if args.cmd == 'tail':
+        for record in deque(iter_records(args.dir), maxlen=args.n):
+            print(format_record(record))
+    elif args.cmd == 'query':
+        for record in iter_records(args.dir, since=args.since, until=args.until, types=args.type):
+            print(format_record(record))
+    elif args.cmd == 'replay':
+        for record in iter_records(args.dir):
+            print(format_record(record))
+    else:
+        import timers_db
+        conn = timers_db.connect(args.db or timers_db.default_db_path())
+        print(f"Ingested {ingest(conn, args.dir)} records")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
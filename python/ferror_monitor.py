@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Following error trend monitor.
+#
+# components/ferror_stats.comp keeps per-regime statistics of each joint's
+# f-error in the servo thread (without it, the same statistics are kept here
+# from the 100ms samples). Every TREND_INTERVAL the worst regime level of each
+# joint - the running 99th percentile of f-error over the trip limit - feeds a
+# level + slope EWMA. When the level, or its projection TREND_HORIZON seconds
+# ahead, reaches WARN_FRACTION of the trip the warning pin goes on and the
+# event is logged. With FEED_STEP set, a running program's feed override is
+# stepped down so the job finishes instead of faulting, and restored when the
+# program ends.
+
+import hal
+import time
+import logging
+from heartbeat import Heartbeat
+from ini_config import get_config
+
+# Set up logging - warnings, feed changes and a per-program summary
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename='logs/ferror_monitor.log'
+)
+logger = logging.getLogger('ferror_monitor')
+
+REGIMES = ('still', 'slow', 'fast', 'accel')
+
+class ServoStats:
+    """Statistics kept by a ferror_stats instance in the servo thread"""
+
+    def __init__(self, name):
+        self.name = name
+        hal.get_value(f"{name}.samples-0")   # Raises if the instance is not loaded
+
+    def update(self):
+        pass
+
+    def regimes(self):
+        """[(level, peak, ewma, samples)] per regime"""
+        return [(hal.get_value(f"{self.name}.level-{i}"), hal.get_value(f"{self.name}.peak-{i}"),
+                 hal.get_value(f"{self.name}.ewma-{i}"), hal.get_value(f"{self.name}.samples-{i}"))
+                for i in range(len(REGIMES))]
+
+class PolledStats:
+    """Fallback when ferror_stats is not loaded: the same statistics from this loop's samples"""
+
+    def __init__(self, joint, config):
+        self.joint = joint
+        self.MAX_FERROR = config.get_float(f"JOINT_{joint}", 'FERROR', 1.0)
+        self.MIN_FERROR = config.get_float(f"JOINT_{joint}", 'MIN_FERROR', self.MAX_FERROR)
+        self.MAX_VEL = config.get_float(f"JOINT_{joint}", 'MAX_VELOCITY', 0.0)
+        self.STILL_VEL = config.get_float('FERROR_MONITOR', 'STILL_VEL', 0.5)
+        self.FAST_FRACTION = config.get_float('FERROR_MONITOR', 'FAST_FRACTION', 0.5)
+        self.ACCEL = config.get_float('FERROR_MONITOR', 'ACCEL', 100.0)
+        self.QUANTILE = config.get_float('FERROR_MONITOR', 'QUANTILE', 0.99)
+        self.alpha = 0.1     # 100ms samples: a time constant of about a second
+        self.step = 0.05
+        self.stats = [[0.0, 0.0, 0.0, 0] for _ in REGIMES]   # level, peak, ewma, samples
+        self.last_vel = 0.0
+        self.last_time = None
+
+    def update(self):
+        now = time.monotonic()
+        ferror = abs(hal.get_value(f"joint.{self.joint}.f-error"))
+        vel = hal.get_value(f"joint.{self.joint}.vel-cmd")
+        accel = abs(vel - self.last_vel) / (now - self.last_time) if self.last_time else 0.0
+        self.last_vel, self.last_time = vel, now
+
+        limit = self.MAX_FERROR * abs(vel) / self.MAX_VEL if self.MAX_VEL > 0 else self.MAX_FERROR
+        ratio = ferror / max(limit, self.MIN_FERROR)
+        if accel >= self.ACCEL:
+            stats = self.stats[3]
+        elif abs(vel) < self.STILL_VEL:
+            stats = self.stats[0]
+        elif abs(vel) >= self.FAST_FRACTION * self.MAX_VEL:
+            stats = self.stats[2]
+        else:
+            stats = self.stats[1]
+
+        scale = self.step * max(stats[0], 0.001)
+        stats[0] = max(0.0, stats[0] + (scale * self.QUANTILE if ratio > stats[0] else -scale * (1 - self.QUANTILE)))
+        stats[1] = max(stats[1], ratio)
+        stats[2] += self.alpha * (ferror - stats[2])
+        stats[3] += 1
+
+    def regimes(self):
+        return [tuple(stats) for stats in self.stats]
+
+class Trend:
+    """Level and slope EWMA (Holt) of one joint's worst regime level"""
+
+    def __init__(self, alpha=0.3, beta=0.1):
+        self.alpha = alpha
+        self.beta = beta
+        self.level = None
+        self.slope = 0.0          # Per second
+
+    def add(self, value, dt):
+        if self.level is None:
+            self.level = value
+            return
+        level = self.alpha * value + (1 - self.alpha) * (self.level + self.slope * dt)
+        self.slope = self.beta * (level - self.level) / dt + (1 - self.beta) * self.slope
+        self.level = level
+
+    def projected(self, horizon):
+        return self.level + max(self.slope, 0.0) * horizon
+
+class FerrorMonitor:
+    def __init__(self):
+        self.h = hal.component("ferror_monitor")
+        self.config = get_config()
+        self.load_parameters()
+
+        # Input pins
+        self.h.newpin("program_running", hal.HAL_BIT, hal.HAL_IN)   # halui.program.is-running
+        self.h.newpin("program_paused", hal.HAL_BIT, hal.HAL_IN)    # halui.program.is-paused (is-running is False while paused)
+        self.h.newpin("feed_override", hal.HAL_FLOAT, hal.HAL_IN)   # halui.feed-override.value
+
+        # Output pins
+        self.h.newpin("warning", hal.HAL_BIT, hal.HAL_OUT)          # A joint is trending towards a following error fault
+        self.h.newpin("feed_reduced", hal.HAL_BIT, hal.HAL_OUT)     # Feed override lowered by this component
+        self.h.newpin("feed_counts", hal.HAL_S32, hal.HAL_OUT)      # halui.feed-override.counts (relative, scale 0.01)
+        for joint in self.JOINTS:
+            self.h.newpin(f"joint{joint}_level", hal.HAL_FLOAT, hal.HAL_OUT)   # Worst regime level (1.0 = trip)
+            self.h.newpin(f"joint{joint}_trend", hal.HAL_FLOAT, hal.HAL_OUT)   # Level projected TREND_HORIZON ahead
+
+        # State tracking
+        self.stats = {joint: PolledStats(joint, self.config) for joint in self.JOINTS}
+        self.trends = {joint: Trend() for joint in self.JOINTS}
+        self.attach_deadline = time.monotonic() + 30.0
+        self.pending = list(self.JOINTS) if self.STATS else []
+        self.last_trend = time.monotonic()
+        self.warned = set()
+        self.reduced_counts = 0        # Override percent taken off, given back at program end
+        self.last_reduce = 0
+        self.last_program_active = False
+
+        # Initialize outputs
+        self.h.warning = False
+        self.h.feed_reduced = False
+        self.h.feed_counts = 0
+
+        # Liveness pins watched by component_supervisor.py
+        self.heartbeat = Heartbeat(self.h)
+
+        self.h.ready()
+
+    def load_parameters(self):
+        """Load thresholds from the cached INI config"""
+        self.JOINTS = [int(j) for j in self.config.get_str('FERROR_MONITOR', 'JOINTS', '0 1 2').split()]
+        self.STATS = self.config.get_str('FERROR_MONITOR', 'STATS', 'ferror-stats')               # ferror_stats instance prefix (empty = poll only)
+        self.WARN_FRACTION = self.config.get_float('FERROR_MONITOR', 'WARN_FRACTION', 0.6)       # Warn at this fraction of the trip limit
+        self.TREND_INTERVAL = self.config.get_float('FERROR_MONITOR', 'TREND_INTERVAL', 10.0)    # Seconds between trend samples
+        self.TREND_HORIZON = self.config.get_float('FERROR_MONITOR', 'TREND_HORIZON', 300.0)     # Seconds ahead for the projection
+        self.MIN_SAMPLES = self.config.get_int('FERROR_MONITOR', 'MIN_SAMPLES', 1000)            # Regime samples before its level counts
+        self.FEED_STEP = self.config.get_float('FERROR_MONITOR', 'FEED_STEP', 0.0)               # Override taken off per step (0 = off)
+        self.MIN_FEED = self.config.get_float('FERROR_MONITOR', 'MIN_FEED', 0.5)                 # Never reduce the override below this
+        self.FEED_HOLD = self.config.get_float('FERROR_MONITOR', 'FEED_HOLD', 30.0)              # Seconds between steps while warning
+
+    def attach_stats(self):
+        """Switch joints to servo-thread statistics as ferror_stats appears; give up after 30s"""
+        for joint in list(self.pending):
+            try:
+                self.stats[joint] = ServoStats(f"{self.STATS}.{joint}")
+                self.pending.remove(joint)
+                print(f"Ferror Monitor: joint {joint} using servo-thread statistics from {self.STATS}.{joint}")
+            except Exception as e:
+                if time.monotonic() > self.attach_deadline:
+                    print(f"Ferror Monitor: {self.STATS}.{joint} unavailable ({e}), sampling joint {joint} at 100ms")
+                    self.pending.remove(joint)
+
+    def worst_level(self, joint):
+        """(level, regime) of the worst regime with enough samples"""
+        level, regime = 0.0, None
+        for i, (value, _, _, samples) in enumerate(self.stats[joint].regimes()):
+            if samples >= self.MIN_SAMPLES and value > level:
+                level, regime = value, REGIMES[i]
+        return level, regime
+
+    def update_trends(self, now):
+        dt = now - self.last_trend
+        self.last_trend = now
+        warning = False
+        for joint in self.JOINTS:
+            level, regime = self.worst_level(joint)
+            trend = self.trends[joint]
+            trend.add(level, dt)
+            projected = trend.projected(self.TREND_HORIZON)
+            self.h[f"joint{joint}_level"] = level
+            self.h[f"joint{joint}_trend"] = projected
+
+            # Clears at 80% of the warning level so it does not chatter
+            limit = self.WARN_FRACTION if joint not in self.warned else self.WARN_FRACTION * 0.8
+            if max(level, projected) >= limit:
+                if joint not in self.warned:
+                    logger.warning(f"FERROR_TREND joint={joint} regime={regime} level={level:.3f} "
+                                   f"projected={projected:.3f} slope={trend.slope * 60:.4f}/min")
+                    print(f"Warning: Joint {joint} following error at {level * 100:.0f}% of the trip limit "
+                          f"({regime}), {projected * 100:.0f}% projected in {self.TREND_HORIZON:.0f}s")
+                    self.warned.add(joint)
+                warning = True
+            elif joint in self.warned:
+                logger.info(f"FERROR_TREND_CLEAR joint={joint} level={level:.3f} projected={projected:.3f}")
+                self.warned.discard(joint)
+        self.h.warning = warning
+
+    def update_feed(self, now):
+        """Step the feed override down while warning; give it back when the program ends"""
+        if self.FEED_STEP <= 0:
+            return
+        if not self.program_active():
+            if self.reduced_counts:
+                self.h.feed_counts += self.reduced_counts
+                logger.info(f"FEED_RESTORED +{self.reduced_counts}%")
+                print(f"  Action: Feed override restored (+{self.reduced_counts}%)")
+                self.reduced_counts = 0
+                self.h.feed_reduced = False
+            return
+        if not self.h.program_running or not self.h.warning or now - self.last_reduce < self.FEED_HOLD:
+            return
+        current = self.h.feed_override
+        counts = min(round(current * self.FEED_STEP * 100), round((current - self.MIN_FEED) * 100))
+        if counts <= 0:
+            return
+        self.h.feed_counts -= counts
+        self.reduced_counts += counts
+        self.last_reduce = now
+        self.h.feed_reduced = True
+        logger.warning(f"FEED_REDUCED -{counts}% override={current - counts / 100:.2f}")
+        print(f"  Action: Feed override reduced by {counts}% to keep the following error below the trip")
+
+    def program_active(self):
+        """Running or paused - a feed hold does not end the program"""
+        return self.h.program_running or self.h.program_paused
+
+    def log_summary(self):
+        """Regime levels as the program ends, with the peaks since start"""
+        for joint in self.JOINTS:
+            parts = [f"{name}={level:.3f}/{peak:.3f}" for name, (level, peak, _, samples)
+                     in zip(REGIMES, self.stats[joint].regimes()) if samples]
+            logger.info(f"PROGRAM_END joint={joint} level/peak since start " + ' '.join(parts))
+
+    def update(self):
+        self.heartbeat.beat()
+        now = time.monotonic()
+        if self.pending:
+            self.attach_stats()
+        for stats in self.stats.values():
+            stats.update()
+        if now - self.last_trend >= self.TREND_INTERVAL:
+            self.update_trends(now)
+        active = self.program_active()
+        if self.last_program_active and not active:
+            self.log_summary()
+        self.last_program_active = active
+        self.update_feed(now)
+
+def main():
+    monitor = FerrorMonitor()
+    logger.info(f"Ferror monitor started for joints {monitor.JOINTS}")
+
+    try:
+        while True:
+            monitor.update()
+            time.sleep(0.1)  # 100ms update rate
+
+    except KeyboardInterrupt:
+        logger.info("Ferror monitor stopped")
+        raise SystemExit
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Fleet database merged from several machines' timer data.
+#
+# Copy each machine's logs/machine_timers.db (or its logs/journal directory)
+# here by any means - USB stick, rsync, a share - and sync it into one fleet
+# database. Every sync copies only rows past that machine's high-water marks,
+# so syncing the same or a newer copy again is cheap and never duplicates.
+#
+#   python3 python/fleet_aggregate.py sync NAME PATH     PATH = machine_timers.db or a journal directory
+#   python3 python/fleet_aggregate.py status
+#   python3 python/fleet_aggregate.py report [--by day|machine] [--since DATE] [--until DATE] [--csv FILE]
+#   python3 python/fleet_aggregate.py tools [--machine NAME]
+#
+# Databases older than the current schema are migrated in a temporary copy;
+# the source file is only ever opened read-only.
+
+import os
+import re
+import csv
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime
+import timers_db
+from event_journal import iter_records, describe
+from oee_analytics import oee
+
+FLEET_SCHEMA_VERSION = 1
+FROM_TOOL = re.compile(r'From:\s*(-?\d+)')
+
+FLEET_SCHEMA = """
+CREATE TABLE IF NOT EXISTS machines (
+    machine TEXT PRIMARY KEY,
+    source TEXT,
+    schema_version INTEGER,
+    last_sync REAL
+);
+CREATE TABLE IF NOT EXISTS marks (
+    machine TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (machine, name)
+);
+CREATE TABLE IF NOT EXISTS events (
+    machine TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    src_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    event_type TEXT NOT NULL,
+    details TEXT,
+    duration REAL,
+    tool INTEGER,
+    from_tool INTEGER,
+    PRIMARY KEY (machine, origin, src_id)
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE TABLE IF NOT EXISTS tool_times (
+    machine TEXT NOT NULL,
+    tool_number INTEGER NOT NULL,
+    total_time REAL NOT NULL,
+    updated_at INTEGER,
+    PRIMARY KEY (machine, tool_number)
+);
+CREATE TABLE IF NOT EXISTS rollup_daily (
+    machine TEXT NOT NULL,
+    day TEXT NOT NULL,
+    spindle_time REAL NOT NULL DEFAULT 0,
+    spindle_starts INTEGER NOT NULL DEFAULT 0,
+    tool_changes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (machine, day)
+);
+CREATE TABLE IF NOT EXISTS state_hourly (
+    machine TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    tool INTEGER NOT NULL,
+    program TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (machine, hour, state, tool, program)
+);
+CREATE TABLE IF NOT EXISTS program_runs (
+    machine TEXT NOT NULL,
+    src_id INTEGER NOT NULL,
+    program TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    wall_time REAL NOT NULL,
+    cutting_time REAL NOT NULL,
+    tool_change_time REAL NOT NULL,
+    pause_time REAL NOT NULL,
+    tools TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (machine, src_id)
+);
+"""
+
+def default_fleet_path():
+    return os.path.join(os.environ.get('LINUXCNC_CONFIG_DIR', ''), 'logs', 'fleet.db')
+
+def connect_fleet(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    if conn.execute("PRAGMA user_version").fetchone()[0] < FLEET_SCHEMA_VERSION:
+        with conn:
+            conn.executescript(FLEET_SCHEMA)
+            conn.execute(f"PRAGMA user_version = {FLEET_SCHEMA_VERSION}")
+    return conn
+
+def get_mark(conn, machine, name, default=0):
+    row = conn.execute("SELECT value FROM marks WHERE machine = ? AND name = ?", (machine, name)).fetchone()
+    return row[0] if row else default
+
+def set_mark(conn, machine, name, value):
+    conn.execute("INSERT OR REPLACE INTO marks (machine, name, value) VALUES (?, ?, ?)", (machine, name, value))
+
+def open_source(path, workdir):
+    """Read-only connection to a machine database at the current schema.
+    Older databases are migrated in a copy under workdir.
+    """
+    src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    version = src.execute("PRAGMA user_version").fetchone()[0]
+    if version >= timers_db.SCHEMA_VERSION:
+        return src, version
+    src.close()
+    copy = os.path.join(workdir, 'machine_timers.db')
+    shutil.copyfile(path, copy)
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            shutil.copyfile(path + suffix, copy + suffix)
+    timers_db.connect(copy).close()
+    return sqlite3.connect(f"file:{copy}?mode=ro", uri=True), version
+
+def sync_database(conn, machine, path):
+    """Copy new rows from a machine_timers.db. Returns {table: rows copied}."""
+    counts = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        src, version = open_source(path, workdir)
+        try:
+            with conn:
+                # Events: append-only, by id
+                mark = int(get_mark(conn, machine, 'events_id'))
+                first = src.execute("SELECT MIN(id) FROM events WHERE id > ?", (mark,)).fetchone()[0]
+                if mark and first is not None and first > mark + 1:
+                    print(f"Warning: {machine}: events {mark + 1}-{first - 1} were compacted before this sync")
+                rows = src.execute("""SELECT id, ts, event_type, details, duration, tool FROM events
+                                      WHERE id > ? ORDER BY id""", (mark,)).fetchall()
+                conn.executemany("""INSERT OR IGNORE INTO events
+                                    (machine, origin, src_id, ts, event_type, details, duration, tool, from_tool)
+                                    VALUES (?, 'db', ?, ?, ?, ?, ?, ?, ?)""",
+                                 [(machine,) + row + (from_tool(row[3]),) for row in rows])
+                if rows:
+                    set_mark(conn, machine, 'events_id', rows[-1][0])
+                counts['events'] = len(rows)
+
+                # Tool times: absolute totals, by updated_at. >= re-reads the
+                # mark second, which a later write in that second may have changed
+                mark = get_mark(conn, machine, 'tool_times_updated', -1)
+                rows = src.execute("""SELECT tool_number, total_time, updated_at FROM tool_times
+                                      WHERE updated_at >= ?""", (mark,)).fetchall()
+                conn.executemany("INSERT OR REPLACE INTO tool_times VALUES (?, ?, ?, ?)",
+                                 [(machine,) + row for row in rows])
+                if rows:
+                    set_mark(conn, machine, 'tool_times_updated', max(row[2] for row in rows))
+                counts['tool_times'] = len(rows)
+
+                # Daily rollups: absolute per day; the last synced day may have grown
+                mark = get_mark(conn, machine, 'rollup_day', 0)
+                since = datetime.fromtimestamp(mark).strftime('%Y-%m-%d') if mark else ''
+                rows = src.execute("""SELECT day, spindle_time, spindle_starts, tool_changes FROM rollup_daily
+                                      WHERE day >= ?""", (since,)).fetchall()
+                conn.executemany("INSERT OR REPLACE INTO rollup_daily VALUES (?, ?, ?, ?, ?)",
+                                 [(machine,) + row for row in rows])
+                if rows:
+                    set_mark(conn, machine, 'rollup_day',
+                             datetime.strptime(max(row[0] for row in rows), '%Y-%m-%d').timestamp())
+                counts['rollup_daily'] = len(rows)
+
+                # State hours: absolute per hour; the last synced hour may have grown
+                mark = int(get_mark(conn, machine, 'state_hour', 0))
+                rows = src.execute("""SELECT hour, state, tool, program, seconds FROM state_hourly
+                                      WHERE hour >= ?""", (mark,)).fetchall()
+                conn.executemany("INSERT OR REPLACE INTO state_hourly VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(machine,) + row for row in rows])
+                if rows:
+                    set_mark(conn, machine, 'state_hour', max(row[0] for row in rows))
+                counts['state_hourly'] = len(rows)
+
+                # Program runs: append-only, by id
+                mark = int(get_mark(conn, machine, 'program_runs_id'))
+                rows = src.execute("""SELECT id, program, file_hash, start, end, wall_time, cutting_time,
+                                      tool_change_time, pause_time, tools, result FROM program_runs
+                                      WHERE id > ? ORDER BY id""", (mark,)).fetchall()
+                conn.executemany("INSERT OR IGNORE INTO program_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 [(machine,) + row for row in rows])
+                if rows:
+                    set_mark(conn, machine, 'program_runs_id', rows[-1][0])
+                counts['program_runs'] = len(rows)
+
+                record_machine(conn, machine, path, version)
+        finally:
+            src.close()
+    return counts
+
+def sync_journal(conn, machine, journal_dir):
+    """Copy new records from exported journal segments. Returns {table: rows copied}."""
+    mark = int(get_mark(conn, machine, 'journal_seq'))
+    count = 0
+    with conn:
+        batch = []
+        for record in iter_records(journal_dir, start_seq=mark + 1):
+            batch.append((machine, record['seq'], int(record['ts']), record['type'], describe(record),
+                          record['duration'] if record['type'] != 'SPINDLE_START' else None,
+                          record['tool'], record['from_tool'] if record['type'] == 'TOOL_CHANGE' else None))
+            mark = record['seq']
+        conn.executemany("""INSERT OR IGNORE INTO events
+                            (machine, origin, src_id, ts, event_type, details, duration, tool, from_tool)
+                            VALUES (?, 'journal', ?, ?, ?, ?, ?, ?, ?)""", batch)
+        count = len(batch)
+        if batch:
+            set_mark(conn, machine, 'journal_seq', mark)
+        record_machine(conn, machine, journal_dir, None)
+    return {'events': count}
+
+def from_tool(details):
+    match = FROM_TOOL.search(details or '')
+    return int(match.group(1)) if match else None
+
+def record_machine(conn, machine, source, version):
+    conn.execute("INSERT OR REPLACE INTO machines (machine, source, schema_version, last_sync) VALUES (?, ?, ?, ?)",
+                 (machine, os.path.abspath(source), version, time.time()))
+    origins = {row[0] for row in conn.execute("SELECT DISTINCT origin FROM events WHERE machine = ?", (machine,))}
+    if len(origins) > 1:
+        print(f"Warning: {machine} has events from both a database and a journal - sync one source per machine")
+
+def time_filter(column, since, until):
+    where, params = [], []
+    if since is not None:
+        where.append(f"{column} >= ?")
+        params.append(since)
+    if until is not None:
+        where.append(f"{column} < ?")
+        params.append(until)
+    return where, params
+
+def utilization(conn, by='day', since=None, until=None):
+    """Rows of (machine, group, spindle h, starts, tool changes, planned h, spindle fraction).
+    Machines synced from a database use its daily rollups (kept past retention);
+    journal-only machines are summed from their events.
+    """
+    totals = {}
+    day_since = datetime.fromtimestamp(since).strftime('%Y-%m-%d') if since is not None else None
+    day_until = datetime.fromtimestamp(until).strftime('%Y-%m-%d') if until is not None else None
+    where, params = time_filter('day', day_since, day_until)
+    group = "day" if by == 'day' else "'all'"
+    sql = f"SELECT machine, {group}, SUM(spindle_time), SUM(spindle_starts), SUM(tool_changes) FROM rollup_daily"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    for machine, key, spindle, starts, changes in conn.execute(sql + f" GROUP BY machine, {group}", params):
+        totals[(machine, key)] = [spindle or 0.0, starts, changes, {}]
+    with_rollups = {machine for machine, _ in totals}
+
+    where, params = time_filter('ts', since, until)
+    where.append("event_type IN ('SPINDLE_START', 'SPINDLE_STOP', 'TOOL_CHANGE')")
+    group = "date(ts, 'unixepoch', 'localtime')" if by == 'day' else "'all'"
+    for machine, key, spindle, starts, changes in conn.execute(f"""
+            SELECT machine, {group},
+                   SUM(CASE WHEN event_type = 'SPINDLE_STOP' THEN duration ELSE 0 END),
+                   SUM(event_type = 'SPINDLE_START'), SUM(event_type = 'TOOL_CHANGE')
+            FROM events WHERE {' AND '.join(where)} GROUP BY machine, {group}""", params):
+        if machine not in with_rollups:
+            totals[(machine, key)] = [spindle or 0.0, starts, changes, {}]
+
+    # Planned time comes from the state hours where machines record them
+    where, params = time_filter('hour', since, until)
+    group = "date(hour, 'unixepoch', 'localtime')" if by == 'day' else "'all'"
+    sql = f"SELECT machine, {group}, state, SUM(seconds) FROM state_hourly"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    for machine, key, state, seconds in conn.execute(sql + f" GROUP BY machine, {group}, state", params):
+        totals.setdefault((machine, key), [0.0, 0, 0, {}])[3][state] = seconds
+
+    rows = []
+    for (machine, key), (spindle, starts, changes, states) in sorted(totals.items()):
+        figures = oee(states) if states else None
+        rows.append({'machine': machine, 'group': key, 'spindle_hours': spindle / 3600,
+                     'spindle_starts': starts, 'tool_changes': changes,
+                     'planned_hours': figures['planned'] / 3600 if figures else None,
+                     'spindle_fraction': figures['spindle'] if figures else None})
+    return rows
+
+def tool_report(conn, machine=None):
+    """{(machine, tool): seconds} - tool_times where synced from a database, else TOOL_CHANGE events"""
+    totals = {}
+    params = (machine,) if machine else ()
+    machine_filter = "AND machine = ?" if machine else ""
+    for name, tool, seconds in conn.execute(f"""SELECT machine, from_tool, SUM(duration) FROM events
+                                               WHERE event_type = 'TOOL_CHANGE' AND from_tool IS NOT NULL
+                                               {machine_filter} GROUP BY machine, from_tool""", params):
+        totals[(name, tool)] = seconds or 0.0
+    with_totals = set()
+    for name, tool, seconds in conn.execute(f"SELECT machine, tool_number, total_time FROM tool_times WHERE 1 {machine_filter}",
+                                            params):
+        if name not in with_totals:
+            # tool_times includes time before the first event was kept - prefer it for the whole machine
+            for key in [key for key in totals if key[0] == name]:
+                del totals[key]
+            with_totals.add(name)
+        totals[(name, tool)] = seconds
+    return totals
+
+def parse_time(text):
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"Bad time {text}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge several machines' timer data into one fleet database")
+    parser.add_argument('--fleet', default=None, help="Fleet database (default logs/fleet.db)")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    sync = sub.add_parser('sync', help="Copy new rows from a machine database or journal directory")
+    sync.add_argument('machine')
+    sync.add_argument('path')
+    sub.add_parser('status', help="Machines and their high-water marks")
+    report = sub.add_parser('report', help="Spindle utilization per machine")
+    report.add_argument('--by', choices=('day', 'machine'), default='day')
+    report.add_argument('--since', type=parse_time)
+    report.add_argument('--until', type=parse_time)
+    report.add_argument('--csv', metavar='FILE')
+    tools = sub.add_parser('tools', help="Tool time per machine")
+    tools.add_argument('--machine')
+    args = parser.parse_args()
+
+    conn = connect_fleet(args.fleet or default_fleet_path())
+    if args.cmd == 'sync':
+        if os.path.isdir(args.path):
+            counts = sync_journal(conn, args.machine, args.path)
+        else:
+            counts = sync_database(conn, args.machine, args.path)
+        print(f"{args.machine}: " + ', '.join(f"{count} {table}" for table, count in counts.items()))
+    elif args.cmd == 'status':
+        for machine, source, version, last_sync in conn.execute("SELECT * FROM machines ORDER BY machine"):
+            when = time.strftime('%Y-%m-%d %H:%M', time.localtime(last_sync))
+            print(f"{machine:<16} synced {when}  schema {version if version is not None else 'journal'}  {source}")
+            for name, value in conn.execute("SELECT name, value FROM marks WHERE machine = ? ORDER BY name", (machine,)):
+                print(f"    {name:<20} {value:g}")
+    elif args.cmd == 'report':
+        rows = utilization(conn, 'day' if args.by == 'day' else 'all', args.since, args.until)
+        print(f"{'machine':<16}{args.by:<12}{'spindle':>10}{'starts':>8}{'changes':>9}{'planned':>10}{'spindle%':>10}")
+        for row in rows:
+            planned = f"{row['planned_hours']:9.2f}h" if row['planned_hours'] is not None else f"{'-':>10}"
+            fraction = f"{row['spindle_fraction']:10.1%}" if row['spindle_fraction'] is not None else f"{'-':>10}"
+            print(f"{row['machine']:<16}{row['group']:<12}{row['spindle_hours']:9.2f}h{row['spindle_starts']:8d}"
+                  f"{row['tool_changes']:9d}{planned}{fraction}")
+        if args.csv:
+            with open(args.csv, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ['machine'])
+                writer.writeheader()
+                writer.writerows(rows)
+            print(f"Wrote {args.csv}")
+    else:
+        for (machine, tool), seconds in sorted(tool_report(conn, args.machine).items()):
+            print(f"{machine:<16} T{tool:<4} {seconds / 3600:9.2f} h")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Servo-rate HAL signal capture into a memory-mapped ring buffer.
+#
+# Replaces docs/monitor_following_error.sh, which forked halcmd five times a
+# second. The realtime sampler component reads [HAL_SAMPLER]PINS every servo
+# period; halsampler streams the samples to this script, which keeps every
+# DECIMATION'th one in logs/hal_samples.ring. The ring holds the last
+# RING_SAMPLES samples, so it can run for hours and still show the spike.
+#
+#   python3 python/hal_sampler.py record [--seconds S] [--pins PIN ...] [--decimation N]
+#   python3 python/hal_sampler.py stats            Peak/RMS per channel
+#   python3 python/hal_sampler.py export FILE.csv [--last N]
+#
+# Ring file layout (little endian):
+#   header   magic 'RVS1', version u16, channels u16, capacity u32, decimation u32,
+#            servo period f64 (s), samples written u64
+#   names    channels x 48 bytes, NUL padded
+#   records  capacity x (sample number u64, channels x f64)
+# Record i is at index written % capacity; load() returns them oldest first.
+
+import os
+import sys
+import mmap
+import struct
+import argparse
+import subprocess
+from ini_config import get_config
+
+MAGIC = b'RVS1'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIdQ')
+WRITTEN_OFFSET = HEADER.size - 8
+NAME_SIZE = 48
+DEFAULT_PINS = 'joint.1.f-error joint.1.motor-pos-cmd joint.1.motor-pos-fb pid.y.output pid.y.errorI'
+
+def default_ring_path():
+    return os.path.join(os.environ.get('LINUXCNC_CONFIG_DIR', ''), 'logs', 'hal_samples.ring')
+
+def record_struct(channels):
+    return struct.Struct('<Q' + 'd' * channels)
+
+def data_offset(channels):
+    return HEADER.size + channels * NAME_SIZE
+
+class RingWriter:
+    """Fixed-size ring of samples in a memory-mapped file"""
+
+    def __init__(self, path, names, capacity, decimation, period):
+        self.names = names
+        self.capacity = capacity
+        self.record = record_struct(len(names))
+        self.offset = data_offset(len(names))
+        size = self.offset + capacity * self.record.size
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        self.file = open(path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), size)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, len(names), capacity, decimation, period, 0)
+        for i, name in enumerate(names):
+            self.map[HEADER.size + i * NAME_SIZE:HEADER.size + (i + 1) * NAME_SIZE] = \
+                name.encode()[:NAME_SIZE].ljust(NAME_SIZE, b'\0')
+        self.written = 0
+
+    def append(self, sample, values):
+        index = self.written % self.capacity
+        self.record.pack_into(self.map, self.offset + index * self.record.size, sample, *values)
+        self.written += 1
+        # Count last, so a reader never sees a record before it is complete
+        struct.pack_into('<Q', self.map, WRITTEN_OFFSET, self.written)
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+def read_header(data):
+    magic, version, channels, capacity, decimation, period, written = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a hal_sampler ring file")
+    names = [data[HEADER.size + i * NAME_SIZE:HEADER.size + (i + 1) * NAME_SIZE].rstrip(b'\0').decode()
+             for i in range(channels)]
+    return {'channels': channels, 'capacity': capacity, 'decimation': decimation,
+            'period': period, 'written': written, 'names': names}
+
+def read_ring_header(path):
+    with open(path, 'rb') as f:
+        head = f.read(HEADER.size)
+        return read_header(head + f.read(data_offset(HEADER.unpack(head)[2]) - HEADER.size))
+
+def iter_samples(path, last=None):
+    """Yield (sample number, values) oldest first without NumPy"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    header = read_header(data)
+    record = record_struct(header['channels'])
+    offset = data_offset(header['channels'])
+    count = min(header['written'], header['capacity'])
+    if last is not None:
+        count = min(count, last)
+    first = header['written'] - count
+    for n in range(first, header['written']):
+        sample, *values = record.unpack_from(data, offset + (n % header['capacity']) * record.size)
+        yield sample, values
+
+def load(path=None):
+    """Load a ring with NumPy: returns (header, time in seconds, {name: array}), oldest first"""
+    import numpy as np
+    path = path or default_ring_path()
+    header = read_ring_header(path)
+    dtype = np.dtype([('sample', '<u8')] + [(f"c{i}", '<f8') for i in range(header['channels'])])
+    data = np.memmap(path, dtype=dtype, mode='r', offset=data_offset(header['channels']),
+                     shape=(header['capacity'],))
+    written, capacity = header['written'], header['capacity']
+    if written <= capacity:
+        ordered = np.array(data[:written])
+    else:
+        start = written % capacity
+        ordered = np.concatenate((data[start:], data[:start]))
+    t = ordered['sample'].astype(np.float64) * header['period']
+    channels = {name: ordered[f"c{i}"] for i, name in enumerate(header['names'])}
+    return header, t, channels
+
+def halcmd(*args, check=True):
+    result = subprocess.run(('halcmd',) + args, capture_output=True, text=True)
+    if check and result.returncode != 0:
+        raise RuntimeError(f"halcmd {' '.join(args)}: {result.stderr.strip() or result.stdout.strip()}")
+    return result.stdout
+
+def linked_signal(pin):
+    """Signal a pin is linked to, or None"""
+    tokens = halcmd('-s', 'show', 'pin', pin).split()
+    if pin not in tokens:
+        raise RuntimeError(f"HAL pin {pin} does not exist")
+    for arrow in ('==>', '<==', '<=>'):
+        if arrow in tokens:
+            return tokens[tokens.index(arrow) + 1]
+    return None
+
+class Sampler:
+    """Loads the realtime sampler on the servo thread and links it to the pins"""
+
+    def __init__(self, pins, depth=4096):
+        self.pins = pins
+        self.depth = depth
+        self.created = []
+
+    def start(self):
+        halcmd('loadrt', 'sampler', f"depth={self.depth}", f"cfg={'f' * len(self.pins)}")
+        halcmd('addf', 'sampler.0', 'servo-thread')
+        for i, pin in enumerate(self.pins):
+            signal = linked_signal(pin)
+            if signal is None:
+                signal = 'sampler-' + pin.replace('.', '-')
+                halcmd('net', signal, pin)
+                self.created.append(signal)
+            halcmd('net', signal, f"sampler.0.pin.{i}")
+        return subprocess.Popen(['halsampler', '-c', '0', '-t'], stdout=subprocess.PIPE, text=True, bufsize=1 << 16)
+
+    def stop(self):
+        halcmd('unloadrt', 'sampler', check=False)
+        for signal in self.created:
+            halcmd('delsig', signal, check=False)
+
+def capture(ring_path, pins, decimation=1, capacity=600000, period=0.001, done=None):
+    """Sample pins into a new ring until done(sample number) is true or Ctrl-C.
+    Returns the number of samples kept.
+    """
+    ring = RingWriter(ring_path, pins, capacity, decimation, period)
+    sampler = Sampler(pins)
+    proc = None
+    try:
+        proc = sampler.start()
+        for line in proc.stdout:
+            fields = line.split()
+            if len(fields) != len(pins) + 1:
+                continue
+            sample = int(fields[0])
+            if sample % decimation == 0:
+                ring.append(sample, [float(value) for value in fields[1:]])
+            if done is not None and done(sample):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if proc is not None:
+            proc.terminate()
+        sampler.stop()
+        ring.close()
+    return ring.written
+
+def record(args):
+    config = get_config()
+    pins = args.pins or config.get_str('HAL_SAMPLER', 'PINS', DEFAULT_PINS).split()
+    decimation = max(1, args.decimation or config.get_int('HAL_SAMPLER', 'DECIMATION', 1))
+    capacity = config.get_int('HAL_SAMPLER', 'RING_SAMPLES', 600000)
+    period = config.get_float('EMCMOT', 'SERVO_PERIOD', 1000000) * 1e-9
+    limit = int(args.seconds / period) if args.seconds else None
+
+    print(f"Sampling {', '.join(pins)} every {decimation} servo period(s) into {args.ring}")
+    count = capture(args.ring, pins, decimation, capacity, period,
+                    (lambda sample: sample >= limit) if limit is not None else None)
+    print(f"Captured {count} samples")
+
+def stats(args):
+    peaks, sums, count = None, None, 0
+    names = read_ring_header(args.ring)['names']
+    for _, values in iter_samples(args.ring):
+        if peaks is None:
+            peaks, sums = [0.0] * len(values), [0.0] * len(values)
+        for i, value in enumerate(values):
+            peaks[i] = max(peaks[i], abs(value))
+            sums[i] += value * value
+        count += 1
+    if not count:
+        print("Ring is empty")
+        return
+    for name, peak, total in zip(names, peaks, sums):
+        print(f"{name:<28} peak {peak:12.6f}  rms {(total / count) ** 0.5:12.6f}")
+    print(f"{count} samples")
+
+def export(args):
+    header = read_ring_header(args.ring)
+    with open(args.csv, 'w') as out:
+        out.write(','.join(['time'] + header['names']) + '\n')
+        for sample, values in iter_samples(args.ring, args.last):
+            out.write(f"{sample * header['period']:.6f}," + ','.join(f"{value:.9g}" for value in values) + '\n')
+    print(f"Wrote {args.csv}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture HAL pins at servo rate into a ring buffer")
+    parser.add_argument('--ring', default=default_ring_path(), help="Ring file (default logs/hal_samples.ring)")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    rec = sub.add_parser('record', help="Capture until Ctrl-C or --seconds")
+    rec.add_argument('--seconds', type=float)
+    rec.add_argument('--pins', nargs='+')
+    rec.add_argument('--decimation', type=int)
+    sub.add_parser('stats', help="Peak and RMS of each channel")
+    exp = sub.add_parser('export', help="Write the ring as CSV")
+    exp.add_argument('csv')
+    exp.add_argument('--last', type=int, help="Only the last N samples")
+    args = parser.parse_args()
+
+    try:
+        {'record': record, 'stats': stats, 'export': export}[args.cmd](args)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
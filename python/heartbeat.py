@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+
+import hal
+import time
+
+class Heartbeat:
+    """Liveness pins for a Python HAL component.
+
+    Adds two output pins to the component:
+    - heartbeat:   toggles on every update loop
+    - last_update: time.monotonic() of the last update (seconds)
+
+    CLOCK_MONOTONIC is system wide on Linux, so component_supervisor.py can
+    compare last_update against its own clock to detect a stalled loop.
+    Create before h.ready() and call beat() once per update.
+    """
+
+    def __init__(self, h):
+        self.h = h
+        self.h.newpin("heartbeat", hal.HAL_BIT, hal.HAL_OUT)
+        self.h.newpin("last_update", hal.HAL_FLOAT, hal.HAL_OUT)
+        self.h.heartbeat = False
+        self.beat()
+
+    def beat(self):
+        self.h.heartbeat = not self.h.heartbeat
+        self.h.last_update = time.monotonic()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+
+import os
+import time
+
+DEFAULT_INI_NAME = 'Rover13s.ini'
+
+def find_ini_file():
+    """Locate the machine INI file.
+    LinuxCNC exports INI_FILE_NAME to every process it starts (loadusr
+    components, milltask and therefore remap.py). Fall back to the config
+    directory and finally to the directory above this script.
+    """
+    ini_file = os.environ.get('INI_FILE_NAME', '')
+    if ini_file and os.path.isfile(ini_file):
+        return os.path.abspath(ini_file)
+
+    candidates = []
+    config_dir = os.environ.get('LINUXCNC_CONFIG_DIR', '')
+    if config_dir:
+        candidates.append(os.path.join(config_dir, DEFAULT_INI_NAME))
+    candidates.append(os.path.join(os.getcwd(), DEFAULT_INI_NAME))
+    candidates.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', DEFAULT_INI_NAME))
+
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return os.path.abspath(candidate)
+    return None
+
+class IniConfig:
+    """Parsed, in-memory copy of the machine INI file.
+
+    Follows LinuxCNC semantics:
+    - Lines starting with '#' or ';' are comments
+    - '#INCLUDE file' is expanded in place, relative to the including file
+    - A section may appear more than once; its keys are merged
+    - Duplicate keys are kept in order: find() returns the first value,
+      findall() returns all of them (HALFILE, REMAP, ...)
+    """
+
+    MAX_INCLUDE_DEPTH = 10
+
+    def __init__(self, path=None, check_interval=1.0):
+        self.path = path or find_ini_file()
+        self.check_interval = check_interval  # Minimum seconds between file stat checks
+        self.sections = {}   # section -> {key: [values]}
+        self.files = {}      # path -> mtime of the INI and every included file
+        self.last_check = 0
+        self.load()
+
+    def load(self):
+        """(Re)parse the INI file and all includes"""
+        sections = {}
+        files = {}
+        if self.path:
+            try:
+                self._parse_file(self.path, sections, files, 0)
+            except Exception as e:
+                print(f"Warning: Failed to parse INI file {self.path}: {e}")
+                return False
+        else:
+            print("Warning: INI file not found, using built-in defaults")
+        self.sections = sections
+        self.files = files
+        self.last_check = time.monotonic()
+        return True
+
+    def _parse_file(self, path, sections, files, depth):
+        if depth > self.MAX_INCLUDE_DEPTH:
+            raise ValueError(f"#INCLUDE nested too deep at {path}")
+
+        files[path] = os.path.getmtime(path)
+        section = None
+        with open(path, 'r') as f:
+            for raw_line in f:
+                line = raw_line.strip()
+                if not line:
+                    continue
+
+                if line.startswith('#INCLUDE'):
+                    include = os.path.expanduser(line[len('#INCLUDE'):].strip())
+                    if not os.path.isabs(include):
+                        include = os.path.join(os.path.dirname(path), include)
+                    self._parse_file(os.path.abspath(include), sections, files, depth + 1)
+                    continue
+
+                if line[0] in '#;':
+                    continue
+
+                if line.startswith('[') and line.endswith(']'):
+                    section = line[1:-1].strip()
+                    sections.setdefault(section, {})
+                    continue
+
+                if section is None or '=' not in line:
+                    continue
+
+                key, value = line.split('=', 1)
+                sections[section].setdefault(key.strip(), []).append(value.strip())
+
+    def reload_if_changed(self):
+        """Reload the INI if it or any included file changed on disk.
+        Cheap enough to call from a 100ms update loop: files are only
+        stat'ed once every check_interval seconds.
+        Returns True when a reload happened.
+        """
+        now = time.monotonic()
+        if now - self.last_check < self.check_interval:
+            return False
+        self.last_check = now
+
+        changed = False
+        for path, mtime in self.files.items():
+            try:
+                if os.path.getmtime(path) != mtime:
+                    changed = True
+                    break
+            except OSError:
+                changed = True
+                break
+
+        if changed:
+            print(f"INI file changed, reloading {self.path}")
+            return self.load()
+        return False
+
+    def has_section(self, section):
+        return section in self.sections
+
+    def find(self, section, key, default=None):
+        """Return the first value for key in section, or default"""
+        values = self.sections.get(section, {}).get(key)
+        if not values:
+            return default
+        return values[0]
+
+    def findall(self, section, key):
+        """Return every value for key in section, in file order"""
+        return list(self.sections.get(section, {}).get(key, []))
+
+    def get_str(self, section, key, default=''):
+        return self.find(section, key, default)
+
+    def get_float(self, section, key, default=0.0):
+        value = self.find(section, key)
+        if value is None:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            print(f"Warning: [{section}]{key} = '{value}' is not a number, using {default}")
+            return default
+
+    def get_int(self, section, key, default=0):
+        value = self.find(section, key)
+        if value is None:
+            return default
+        try:
+            return int(float(value))
+        except ValueError:
+            print(f"Warning: [{section}]{key} = '{value}' is not an integer, using {default}")
+            return default
+
+    def get_bool(self, section, key, default=False):
+        value = self.find(section, key)
+        if value is None:
+            return default
+        value = value.lower()
+        if value in ('1', 'true', 'yes', 'on'):
+            return True
+        if value in ('0', 'false', 'no', 'off'):
+            return False
+        print(f"Warning: [{section}]{key} = '{value}' is not a boolean, using {default}")
+        return default
+
+# One parsed copy per process, shared by every component and remap.py
+_config = None
+
+def get_config():
+    """Return the process-wide IniConfig, parsing the INI on first use"""
+    global _config
+    if _config is None:
+        _config = IniConfig()
+    return _config
+
+def main():
+    """Print the parsed INI, or a single value: ini_config.py SECTION KEY"""
+    import sys
+    config = get_config()
+    print(f"INI file: {config.path}")
+    if len(sys.argv) == 3:
+        for value in config.findall(sys.argv[1], sys.argv[2]):
+            print(value)
+        return
+    for section, keys in config.sections.items():
+        print(f"[{section}]")
+        for key, values in keys.items():
+            for value in values:
+                print(f"{key} = {value}")
+
+if __name__ == "__main__":
+    main()
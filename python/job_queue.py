@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Headless job queue for LinuxCNC.
+#
+#   python3 python/job_queue.py serve                  Run the daemon
+#   python3 python/job_queue.py add "RV Louvers/6ft-leftTop.ngc" --repeat 4 --offset G55
+#   python3 python/job_queue.py status | list | confirm | pause | resume | clear
+#   python3 python/job_queue.py remove JOB_ID
+#
+# Programs are relative to [DISPLAY]PROGRAM_PREFIX. The queue is kept in
+# logs/job_queue.json so it survives restarts. After each run the daemon
+# waits for the operator to confirm part removal before starting the next.
+
+import os
+import sys
+import json
+import time
+import socket
+import socketserver
+import threading
+import argparse
+import re
+from enum import Enum
+from ini_config import get_config
+
+WORK_OFFSETS = ('G54', 'G55', 'G56', 'G57', 'G58', 'G59', 'G59.1', 'G59.2', 'G59.3')
+
+class QueueState(Enum):
+    IDLE = 0           # Nothing to do, or queue paused
+    STARTING = 1       # Program opened and started, waiting for the interpreter
+    RUNNING = 2        # Program running
+    WAIT_REMOVAL = 3   # Run finished, waiting for operator confirm
+    ERROR = 4          # Run failed - queue paused until resumed
+
+def first_tool(path):
+    """Return the first T word in a program (tool to have ready), or None"""
+    pattern = re.compile(r'\bT\s*(\d+)', re.IGNORECASE)
+    try:
+        with open(path, 'r', errors='replace') as f:
+            for line in f:
+                code = line.split(';', 1)[0]
+                code = re.sub(r'\([^)]*\)', '', code)
+                match = pattern.search(code)
+                if match:
+                    return int(match.group(1))
+    except OSError:
+        pass
+    return None
+
+class JobStore:
+    """Persistent list of jobs, saved atomically on every change"""
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = []
+        self.next_id = 1
+        self.paused = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.jobs = data.get('jobs', [])
+            self.next_id = data.get('next_id', len(self.jobs) + 1)
+            self.paused = data.get('paused', False)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Warning: Failed to load job queue {self.path}: {e}")
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'jobs': self.jobs, 'next_id': self.next_id, 'paused': self.paused}, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def add(self, program, repeat=1, offset='G54'):
+        job = {'id': self.next_id, 'program': program, 'repeat': repeat, 'done': 0,
+               'offset': offset, 'status': 'queued', 'added': time.time()}
+        self.next_id += 1
+        self.jobs.append(job)
+        self.save()
+        return job
+
+    def remove(self, job_id):
+        before = len(self.jobs)
+        self.jobs = [job for job in self.jobs if job['id'] != job_id or job['status'] == 'running']
+        self.save()
+        return len(self.jobs) != before
+
+    def clear(self):
+        self.jobs = [job for job in self.jobs if job['status'] == 'running']
+        self.save()
+
+    def next_job(self):
+        for job in self.jobs:
+            if job['status'] in ('queued', 'running') and job['done'] < job['repeat']:
+                return job
+        return None
+
+class JobQueueDaemon:
+    """Starts queued programs through linuxcnc.command and follows them with linuxcnc.stat.
+    Pass linuxcnc_module to run against a simulated stand-in.
+    """
+
+    def __init__(self, linuxcnc_module=None):
+        if linuxcnc_module is None:
+            import linuxcnc as linuxcnc_module
+        self.lc = linuxcnc_module
+        self.stat = self.lc.stat()
+        self.command = self.lc.command()
+        self.error_channel = self.lc.error_channel()
+
+        self.config = get_config()
+        self.program_prefix = self.config.get_str('DISPLAY', 'PROGRAM_PREFIX', 'ngc')
+        self.socket_path = self.config.get_str('JOB_QUEUE', 'SOCKET', '/tmp/rover13s-jobq.sock')
+        self.confirm_removal = self.config.get_bool('JOB_QUEUE', 'CONFIRM_REMOVAL', True)
+        self.store = JobStore(self.config.get_str('JOB_QUEUE', 'QUEUE_FILE', 'logs/job_queue.json'))
+
+        self.lock = threading.Lock()
+        self.state = QueueState.IDLE
+        self.current = None
+        self.run_errors = []
+        self.run_serial = 0
+        self.run_path = None
+        self.state_time = time.monotonic()
+        self.last_tool = None
+        self.message = ''
+
+        # A job left 'running' by a crash is rerun from the start
+        for job in self.store.jobs:
+            if job['status'] == 'running':
+                job['status'] = 'queued'
+        self.store.save()
+
+    # --- Queue control (called from the socket thread) ---
+
+    def handle_request(self, request):
+        cmd = request.get('cmd')
+        with self.lock:
+            if cmd == 'status':
+                return self.status()
+            if cmd == 'list':
+                return {'ok': True, 'jobs': self.store.jobs}
+            if cmd == 'add':
+                program = request.get('program', '')
+                offset = request.get('offset', 'G54').upper()
+                repeat = int(request.get('repeat', 1))
+                if offset not in WORK_OFFSETS:
+                    return {'ok': False, 'error': f"Unknown work offset {offset}"}
+                if repeat < 1:
+                    return {'ok': False, 'error': "Repeat count must be at least 1"}
+                if not os.path.isfile(self.program_path(program)):
+                    return {'ok': False, 'error': f"Program not found: {self.program_path(program)}"}
+                return {'ok': True, 'job': self.store.add(program, repeat, offset)}
+            if cmd == 'remove':
+                return {'ok': self.store.remove(int(request.get('id', 0)))}
+            if cmd == 'clear':
+                self.store.clear()
+                return {'ok': True}
+            if cmd == 'confirm':
+                if self.state != QueueState.WAIT_REMOVAL:
+                    return {'ok': False, 'error': "Not waiting for part removal"}
+                self.set_state(QueueState.IDLE, "Part removal confirmed")
+                return {'ok': True}
+            if cmd == 'pause':
+                self.store.paused = True
+                self.store.save()
+                return {'ok': True}
+            if cmd == 'resume':
+                self.store.paused = False
+                self.store.save()
+                if self.state == QueueState.ERROR:
+                    self.set_state(QueueState.IDLE, "Queue resumed after error")
+                return {'ok': True}
+        return {'ok': False, 'error': f"Unknown command {cmd}"}
+
+    def status(self):
+        job = self.current or self.store.next_job()
+        next_tool = first_tool(self.program_path(job['program'])) if job else None
+        return {'ok': True, 'state': self.state.name, 'paused': self.store.paused,
+                'message': self.message, 'job': job, 'tool_in_spindle': self.last_tool,
+                'next_tool': next_tool, 'queued': sum(1 for j in self.store.jobs if j['status'] == 'queued')}
+
+    # --- Daemon loop ---
+
+    def program_path(self, program):
+        if os.path.isabs(program):
+            return program
+        return os.path.join(self.program_prefix, program)
+
+    def set_state(self, state, message):
+        print(f"Job queue: {state.name} - {message}")
+        self.state = state
+        self.state_time = time.monotonic()
+        self.message = message
+
+    def machine_ready(self):
+        """Machine on, homed, interpreter idle"""
+        s = self.stat
+        return (s.task_state == self.lc.STATE_ON and
+                s.interp_state == self.lc.INTERP_IDLE and
+                all(s.homed[i] for i in range(s.joints)))
+
+    def start_job(self, job):
+        """Select the work offset in MDI, then open and run the program"""
+        path = self.program_path(job['program'])
+        self.command.mode(self.lc.MODE_MDI)
+        self.command.wait_complete()
+        # Programs that select their own G5x override this offset
+        self.command.mdi(job['offset'])
+        self.command.wait_complete()
+        self.command.mode(self.lc.MODE_AUTO)
+        self.command.wait_complete()
+        self.command.program_open(path)
+        self.command.auto(self.lc.AUTO_RUN, 0)
+        self.run_serial = self.command.serial   # Task echoes this once it has taken the run
+        self.run_path = os.path.realpath(path)
+
+        job['status'] = 'running'
+        job['started'] = time.time()
+        job['start_tool'] = self.stat.tool_in_spindle
+        self.store.save()
+        self.current = job
+        self.run_errors = []
+        self.set_state(QueueState.STARTING, f"Job {job['id']} run {job['done'] + 1}/{job['repeat']}: {job['program']} ({job['offset']})")
+
+    def finish_job(self, ok):
+        job = self.current
+        job['end_tool'] = self.last_tool
+        if ok:
+            job['done'] += 1
+            job['status'] = 'done' if job['done'] >= job['repeat'] else 'queued'
+            message = f"Job {job['id']} run {job['done']}/{job['repeat']} complete (T{self.last_tool} in spindle)"
+            self.set_state(QueueState.WAIT_REMOVAL if self.confirm_removal else QueueState.IDLE, message)
+        else:
+            job['status'] = 'queued'
+            self.store.paused = True
+            self.set_state(QueueState.ERROR, f"Job {job['id']} failed: {'; '.join(self.run_errors) or 'aborted'}")
+        self.store.save()
+        self.current = None
+
+    def run_completed(self):
+        """Task has taken the run command for this job's program and is idle again with the machine on"""
+        s = self.stat
+        return (s.echo_serial_number >= self.run_serial and
+                s.state != self.lc.RCS_ERROR and
+                s.task_state == self.lc.STATE_ON and
+                os.path.realpath(s.file) == self.run_path)
+
+    def poll_errors(self):
+        while True:
+            error = self.error_channel.poll()
+            if not error:
+                return
+            kind, text = error
+            if kind in (self.lc.NML_ERROR, self.lc.OPERATOR_ERROR):
+                self.run_errors.append(text)
+
+    def update(self):
+        self.stat.poll()
+        with self.lock:
+            self.last_tool = self.stat.tool_in_spindle
+            if self.state in (QueueState.STARTING, QueueState.RUNNING):
+                self.poll_errors()
+
+            if self.state == QueueState.IDLE:
+                job = self.store.next_job()
+                if job and not self.store.paused and self.machine_ready():
+                    self.start_job(job)
+
+            elif self.state == QueueState.STARTING:
+                if self.stat.interp_state != self.lc.INTERP_IDLE:
+                    self.set_state(QueueState.RUNNING, self.message)
+                elif self.run_errors:
+                    self.finish_job(False)
+                elif self.run_completed():
+                    # Short program: started and finished between two polls
+                    self.finish_job(True)
+                elif time.monotonic() - self.state_time > 5.0:
+                    self.finish_job(False)
+
+            elif self.state == QueueState.RUNNING:
+                if self.stat.interp_state == self.lc.INTERP_IDLE:
+                    # Aborts and E-stops leave the machine off or report an error
+                    ok = not self.run_errors and self.stat.task_state == self.lc.STATE_ON
+                    self.finish_job(ok)
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """One JSON request per line, one JSON response per line"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.daemon.handle_request(json.loads(line))
+            except Exception as e:
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write((json.dumps(response) + '\n').encode())
+
+class QueueServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve():
+    daemon = JobQueueDaemon()
+    if os.path.exists(daemon.socket_path):
+        os.unlink(daemon.socket_path)
+    server = QueueServer(daemon.socket_path, RequestHandler)
+    server.daemon = daemon
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Job queue listening on {daemon.socket_path}")
+
+    try:
+        while True:
+            daemon.update()
+            time.sleep(0.2)
+
+    except KeyboardInterrupt:
+        server.shutdown()
+        os.unlink(daemon.socket_path)
+        raise SystemExit
+
+def send(request, socket_path=None):
+    """Send one request to a running daemon and return the response"""
+    socket_path = socket_path or get_config().get_str('JOB_QUEUE', 'SOCKET', '/tmp/rover13s-jobq.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + '\n').encode())
+        with sock.makefile('r') as f:
+            return json.loads(f.readline())
+
+def main():
+    parser = argparse.ArgumentParser(description="Rover13s job queue")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    sub.add_parser('serve', help="Run the queue daemon")
+    add = sub.add_parser('add', help="Queue a program")
+    add.add_argument('program', help="Path relative to PROGRAM_PREFIX")
+    add.add_argument('--repeat', type=int, default=1)
+    add.add_argument('--offset', default='G54', help="Work offset, G54-G59.3")
+    remove = sub.add_parser('remove', help="Remove a queued job")
+    remove.add_argument('id', type=int)
+    for name in ('status', 'list', 'confirm', 'pause', 'resume', 'clear'):
+        sub.add_parser(name)
+    args = parser.parse_args()
+
+    if args.cmd == 'serve':
+        serve()
+        return
+
+    request = vars(args)
+    try:
+        response = send(request)
+    except OSError as e:
+        print(f"Job queue daemon not reachable: {e}")
+        sys.exit(1)
+    print(json.dumps(response, indent=2))
+    if not response.get('ok'):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
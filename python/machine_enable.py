@@ -3,6 +3,9 @@
 
 import hal
 import time
+from heartbeat import Heartbeat
+from ini_config import get_config
+from trip_resume import capture_trip, snapshot
 
 class MachineEnable:
     def __init__(self):
@@ -11,8 +14,14 @@ class MachineEnable:
         # Input pins
         self.h.newpin("estop_ok", hal.HAL_BIT, hal.HAL_IN)       # E-stop chain status
         self.h.newpin("estop_pcells", hal.HAL_BIT, hal.HAL_IN)   # E-stop PCells
+        self.h.newpin("left_pcells", hal.HAL_BIT, hal.HAL_IN)    # Pendulum: left station PCells zone intact
+        self.h.newpin("right_pcells", hal.HAL_BIT, hal.HAL_IN)   # Pendulum: right station PCells zone intact
         self.h.newpin("machine_btn_on", hal.HAL_BIT, hal.HAL_IN)       # Machine button state
         self.h.newpin("work_area_setup", hal.HAL_BIT, hal.HAL_IN) 	# Work area setup state (from work_area component)
+        self.h.newpin("pendulum_mode", hal.HAL_BIT, hal.HAL_IN)        # Dual-station mode selected
+        self.h.newpin("left_setup", hal.HAL_BIT, hal.HAL_IN)           # Pendulum: left station being loaded
+        self.h.newpin("right_setup", hal.HAL_BIT, hal.HAL_IN)          # Pendulum: right station being loaded
+        self.h.newpin("gantry_pos", hal.HAL_FLOAT, hal.HAL_IN)         # Position along the table (joint pos-fb)
         
         # Output pins
         self.h.newpin("enable_machine", hal.HAL_BIT, hal.HAL_OUT)      # Machine enable output
@@ -21,15 +30,94 @@ class MachineEnable:
         # State tracking
         self.machine_enabled_state = False
         self.pcells_latched = False  # Track if PCells are latched
+        self.pcells_tolerated = False  # PCells broken at a station being loaded (pendulum)
+        
+        # Pendulum station geometry (loaded from the [PENDULUM] section of the INI)
+        self.config = get_config()
+        self.load_parameters()
         
         # Initialize outputs
         self.h.enable_machine = False    # Start with machine disabled
         self.h.enable_axes = False       # Start with axes disabled
         
+        # Liveness pins watched by component_supervisor.py
+        self.heartbeat = Heartbeat(self.h)
+        
+        # Program state is captured on a trip for trip_resume.py
+        try:
+            import linuxcnc
+            self.stat = linuxcnc.stat()
+        except Exception as e:
+            print(f"Warning: linuxcnc module unavailable, trip capture disabled: {e}")
+            self.stat = None
+        self.last_running = None  # Latest snapshot taken while a program ran
+        
         print("Machine Enable initialized with PCells latch = False")
         self.h.ready()
     
+    def load_parameters(self):
+        """Load the pendulum station split from the cached INI config"""
+        self.SPLIT_POSITION = self.config.get_float('PENDULUM', 'SPLIT_POSITION', 820.0)  # Boundary between stations
+        self.CLEARANCE = self.config.get_float('PENDULUM', 'CLEARANCE', 150.0)            # Gantry keep-out past the split
+        self.LEFT_BELOW_SPLIT = self.config.get_bool('PENDULUM', 'LEFT_BELOW_SPLIT', True)
+    
+    def gantry_clear_of_loading(self):
+        """True if the gantry is outside every station being loaded"""
+        pos = self.h.gantry_pos
+        below_limit = self.SPLIT_POSITION - self.CLEARANCE   # Must stay below this to clear the upper station
+        above_limit = self.SPLIT_POSITION + self.CLEARANCE   # Must stay above this to clear the lower station
+        lower_setup = self.h.left_setup if self.LEFT_BELOW_SPLIT else self.h.right_setup
+        upper_setup = self.h.right_setup if self.LEFT_BELOW_SPLIT else self.h.left_setup
+        if lower_setup and pos < above_limit:
+            return False
+        if upper_setup and pos > below_limit:
+            return False
+        return True
+    
+    def break_tolerated(self):
+        """Pendulum: True if every broken PCells zone belongs to a station in setup.
+        A break on the combined chain that no zone reports is never tolerated.
+        """
+        left_broken = not self.h.left_pcells
+        right_broken = not self.h.right_pcells
+        if not (left_broken or right_broken):
+            return False
+        if left_broken and not self.h.left_setup:
+            return False
+        if right_broken and not self.h.right_setup:
+            return False
+        return True
+    
+    def capture_trip(self, reason):
+        """Save the interrupted program state so it can be resumed with trip_resume.py"""
+        if self.stat is None:
+            return
+        try:
+            state = capture_trip(self.stat, reason, self.last_running)
+            print(f"  Action: {reason} trip captured - {state['file']} line {state['motion_line']}, T{state['tool']}")
+        except Exception as e:
+            print(f"Warning: Failed to capture trip state: {e}")
+    
+    def track_program(self):
+        """Keep a recent snapshot in case the trip aborts the program before it is captured"""
+        if self.stat is None or not self.machine_enabled_state:
+            return
+        try:
+            state = snapshot(self.stat)
+            self.last_running = state if state['program_running'] else None
+        except Exception as e:
+            print(f"Warning: Failed to read program state: {e}")
+            self.stat = None
+    
     def update(self):
+        self.heartbeat.beat()
+        
+        # Pick up INI edits without restarting the component
+        if self.config.reload_if_changed():
+            self.load_parameters()
+        
+        self.track_program()
+        
         # Check machine enable and safety conditions
         machine_btn_on = self.h.machine_btn_on
         
@@ -43,9 +131,25 @@ class MachineEnable:
                 print("  Action: PCells latch reset (entering setup mode)")
             self.pcells_latched = False
         elif machine_btn_on and self.machine_enabled_state:  # Only check PCells if machine is running
-            if not self.h.estop_pcells:  # PCells just tripped
+            # Pendulum: an operator loading one station may break that station's
+            # PCells zone as long as the gantry stays clear of every station in setup
+            station_loading = self.h.pendulum_mode and (self.h.left_setup or self.h.right_setup)
+            gantry_clear = self.gantry_clear_of_loading() if station_loading else True
+            
+            if station_loading and not gantry_clear:
+                if not self.pcells_latched:
+                    print(f"  Action: Gantry entered a station being loaded (pos={self.h.gantry_pos:.1f}) - tripped and latched")
                 self.pcells_latched = True
-                print("  Action: PCells tripped and latched")
+            elif not self.h.estop_pcells or (station_loading and not (self.h.left_pcells and self.h.right_pcells)):
+                if station_loading and self.break_tolerated():
+                    if not self.pcells_tolerated:
+                        print("  Action: PCells broken at loading station - gantry clear, not latched")
+                    self.pcells_tolerated = True
+                else:
+                    self.pcells_latched = True
+                    print("  Action: PCells tripped and latched")
+            else:
+                self.pcells_tolerated = False
         
         # Use latched state for safety check
         safety_ok = self.h.estop_ok and not self.pcells_latched
@@ -73,6 +177,8 @@ class MachineEnable:
         else:
             if self.machine_enabled_state:
                 print(f"  Action: Machine disabled - safety_ok: {safety_ok}, machine_btn_on: {machine_btn_on}")
+                if not safety_ok:
+                    self.capture_trip("PCells" if self.pcells_latched else "E-stop")
             self.machine_enabled_state = False
             self.h.enable_machine = False
             self.h.enable_axes = False
@@ -2,14 +2,193 @@
 
 import hal
 import time
+from heartbeat import Heartbeat
 import os
-from datetime import datetime
+import queue
+import signal
+import threading
 import sqlite3
+import timers_db
+from event_journal import JournalWriter, ingest
+from oee_analytics import classify, StateTracker
+from program_runs import RunTracker
+from ini_config import get_config
 # Firestore imports commented out for now
 # import firebase_admin
 # from firebase_admin import credentials, firestore
 # from google.cloud import firestore as firestore_types
 
+class TimersWriter(threading.Thread):
+    """Background writer for the event journal and timers database.
+    The HAL loop only queues writes. Events are appended to the journal
+    (event_journal.py) and fed into SQLite from there; tool and accumulated
+    times go straight to the single WAL-mode connection, in one transaction
+    per flush.
+    """
+    def __init__(self, db_path, journal_dir, flush_interval=1.0, retention_days=0):
+        super().__init__(name="timers-writer", daemon=True)
+        self.db_path = db_path
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.last_compact = 0
+        self.pending = queue.Queue()
+        self.stopping = threading.Event()
+        self.retry = []          # Writes kept from a failed flush, oldest first
+        self.failures = 0        # Consecutive failed flushes
+        self.retry_at = 0
+    
+    def submit(self, op, *args):
+        """Queue a write - never blocks"""
+        self.pending.put((op, args))
+    
+    def stop(self):
+        """Flush everything queued and stop the thread"""
+        self.stopping.set()
+        self.join(timeout=10.0)
+    
+    def run(self):
+        self.conn = timers_db.connect(self.db_path)
+        self.journal = JournalWriter(self.journal_dir)
+        while not self.stopping.wait(self.flush_interval):
+            self.flush()
+            self.compact_if_due()
+        self.flush()
+        self.journal.close()
+        self.conn.close()
+    
+    def flush(self):
+        batch = self.retry
+        while True:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        # After a failure wait out the backoff, but always try once more when stopping
+        if self.failures and time.monotonic() < self.retry_at and not self.stopping.is_set():
+            self.retry = batch
+            return
+        # Events go to the journal first and database writes are one transaction;
+        # whatever has not completed is kept, so a retry never applies a write twice
+        events = [args for op, args in batch if op == 'event']
+        writes = [(op, args) for op, args in batch if op != 'event']
+        try:
+            while events:
+                self.event(*events[0])
+                events.pop(0)
+            with self.conn:  # One transaction for the whole batch
+                for op, args in writes:
+                    getattr(self, op)(*args)
+            writes = []
+            self.journal.sync(force=self.stopping.is_set())
+            # Catch the database up with the journal (also after a crash)
+            ingest(self.conn, self.journal_dir)
+            if self.failures:
+                print(f"Machine Timers: write recovered after {self.failures} failed attempts")
+            self.failures = 0
+        except Exception as e:
+            self.failures += 1
+            delay = min(60.0, self.flush_interval * 2 ** self.failures)
+            self.retry_at = time.monotonic() + delay
+            kept = len(events) + len(writes)
+            if self.stopping.is_set():
+                print(f"Warning: Failed to write {kept} timer records at shutdown - lost: {e}")
+            else:
+                print(f"Warning: Failed to write {kept} timer records, retrying in {delay:.1f}s: {e}")
+        self.retry = [('event', args) for args in events] + writes
+    
+    def compact_if_due(self):
+        """Drop raw events past the retention period once a day (rollups keep the totals)"""
+        if self.retention_days <= 0:
+            return
+        if self.last_compact and time.monotonic() - self.last_compact < 86400:
+            return
+        self.last_compact = time.monotonic()
+        try:
+            removed = timers_db.compact(self.conn, self.retention_days)
+            if removed:
+                print(f"Machine Timers: removed {removed} events older than {self.retention_days:g} days")
+        except Exception as e:
+            print(f"Warning: Failed to compact timers database: {e}")
+    
+    def event(self, ts, event_type, tool, from_tool, duration):
+        self.journal.append(ts, event_type, tool, from_tool, duration)
+    
+    def accumulated(self, key, value):
+        self.conn.execute("""INSERT OR REPLACE INTO accumulated_times (key, value)
+                            VALUES (?, ?)""", (key, value))
+    
+    def tool_time(self, tool_number, duration):
+        timers_db.add_tool_time(self.conn, tool_number, duration)
+    
+    def state_time(self, hour, state, tool, program, seconds):
+        timers_db.add_state_time(self.conn, hour, state, tool, program, seconds)
+    
+    def state_interval(self, start, end, state, tool, program):
+        timers_db.add_state_interval(self.conn, start, end, state, tool, program)
+    
+    def program_run(self, run):
+        timers_db.add_program_run(self.conn, run)
+
+EDGE_KINDS = {1: 'SPINDLE_START', 2: 'SPINDLE_STOP', 3: 'TOOL_CHANGE'}
+U32 = 0xFFFFFFFF
+
+class ServoEdges:
+    """Spindle and tool edges latched in the servo thread by components/edge_timer.comp.
+    Times are servo periods counted from a time.monotonic() origin, so they are
+    exact to the period however late the HAL loop polls.
+    """
+    RING = 8
+    
+    def __init__(self, name):
+        self.name = name
+        self.period = self.get('period-ns') * 1e-9
+        if self.period <= 0:
+            raise ValueError(f"{name} has not run in the servo thread yet")
+        self.count = self.get('edge-count')
+        self.ticks = self.get('ticks')
+        self.now = time.monotonic()
+    
+    def get(self, pin):
+        return hal.get_value(f"{self.name}.{pin}")
+    
+    def poll(self, spindle_on, tool):
+        """Return (now, [(time, kind, tool), ...]) for the edges since the last poll"""
+        # Count first: every edge it covers has a tick at or before the tick read next
+        count = self.get('edge-count')
+        ticks = self.get('ticks')
+        self.now += ((ticks - self.ticks) & U32) * self.period
+        self.ticks = ticks
+        new = (count - self.count) & U32
+        if new > self.RING:
+            print(f"Warning: Machine Timers missed {new - self.RING} spindle/tool edges")
+            new = self.RING
+        edges = []
+        for n in range(new, 0, -1):
+            i = ((count - n) & U32) % self.RING
+            age = ((ticks - self.get(f"edge-tick-{i}")) & U32) * self.period
+            edges.append((self.now - age, EDGE_KINDS.get(self.get(f"edge-kind-{i}")), self.get(f"edge-tool-{i}")))
+        self.count = count
+        return self.now, edges
+
+class PolledEdges:
+    """Fallback when edge_timer is not loaded: edges seen by this loop, on the monotonic clock"""
+    
+    def __init__(self):
+        self.spindle_on = False
+        self.tool = 0
+    
+    def poll(self, spindle_on, tool):
+        now = time.monotonic()
+        edges = []
+        if spindle_on != self.spindle_on:
+            edges.append((now, 'SPINDLE_START' if spindle_on else 'SPINDLE_STOP', tool))
+            self.spindle_on = spindle_on
+        if tool != self.tool:
+            edges.append((now, 'TOOL_CHANGE', tool))
+            self.tool = tool
+        return now, edges
+
 class MachineTimers:
     def __init__(self):
         self.h = hal.component("machine_timers")
@@ -18,16 +197,21 @@ class MachineTimers:
         self.h.newpin("spindle_on", hal.HAL_BIT, hal.HAL_IN)        # Spindle running state
         self.h.newpin("machine_running", hal.HAL_BIT, hal.HAL_IN)    # Machine running state
         self.h.newpin("current_tool", hal.HAL_S32, hal.HAL_IN)       # Current tool number
+        self.h.newpin("work_area_setup", hal.HAL_BIT, hal.HAL_IN)    # Work area in setup mode
+        self.h.newpin("vfd_fault", hal.HAL_BIT, hal.HAL_IN)          # vfd_control.fault_active
+        self.h.newpin("tool_changing", hal.HAL_BIT, hal.HAL_IN)      # Tool change in progress (remap_m6, motion.digital-out-20)
+        self.h.newpin("program_running", hal.HAL_BIT, hal.HAL_IN)    # halui.program.is-running
+        self.h.newpin("program_paused", hal.HAL_BIT, hal.HAL_IN)     # halui.program.is-paused
         
         # Output pins for total times (in seconds)
         self.h.newpin("total_machine_time", hal.HAL_FLOAT, hal.HAL_OUT)
         self.h.newpin("total_spindle_time", hal.HAL_FLOAT, hal.HAL_OUT)
         self.h.newpin("current_tool_time", hal.HAL_FLOAT, hal.HAL_OUT)
         
-        # State variables
-        self.start_time = time.time()
-        self.spindle_start_time = 0
-        self.tool_start_time = 0
+        # State variables (time.monotonic() seconds - wall clock steps do not skew totals)
+        self.start_time = time.monotonic()
+        self.spindle_start_time = None
+        self.tool_start_time = None
         self.last_tool = 0
         
         # Initialize outputs
@@ -46,6 +230,35 @@ class MachineTimers:
         # Load accumulated times from database
         self.load_accumulated_times()
         
+        # All further writes go through the background writer
+        config = get_config()
+        flush_interval = config.get_float('MACHINE_TIMERS', 'FLUSH_INTERVAL', 1.0)
+        retention_days = config.get_float('MACHINE_TIMERS', 'RETENTION_DAYS', 365)
+        self.writer = TimersWriter(self.db_path, os.path.join(self.log_dir, 'journal'),
+                                   flush_interval, retention_days)
+        self.writer.start()
+        
+        # Edges come from edge_timer once it is loaded (rover-custom.hal loads after this component)
+        self.edges = PolledEdges()
+        self.edge_timer = config.get_str('MACHINE_TIMERS', 'EDGE_TIMER', 'edge-timer.0')
+        self.attach_deadline = time.monotonic() + 30.0
+        
+        # Machine state classification for oee_analytics.py
+        self.state_tracker = StateTracker(self.writer.submit, config.get_float('OEE', 'FLUSH_INTERVAL', 60.0))
+        self.run_tracker = RunTracker(self.writer.submit)
+        self.program_file = ''
+        self.read_line = 0
+        self.program_error = False
+        self.last_program_poll = 0
+        try:
+            import linuxcnc
+            self.linuxcnc = linuxcnc
+            self.stat = linuxcnc.stat()
+            self.errors = linuxcnc.error_channel()
+        except Exception as e:
+            print(f"Warning: linuxcnc module unavailable, states recorded without program names: {e}")
+            self.stat = None
+        
         # Firestore initialization commented out for now
         # try:
         #     # Get the config directory from the environment
@@ -69,28 +282,16 @@ class MachineTimers:
         #     print(f"Warning: Failed to initialize Firestore: {e}")
         #     self.firestore_enabled = False
         
+        # Liveness pins watched by component_supervisor.py
+        self.heartbeat = Heartbeat(self.h)
+        
         print("Machine Timers initialized")
         self.h.ready()
     
     def init_database(self):
-        """Initialize SQLite database with required tables"""
+        """Create the database or migrate it to the current schema (see timers_db.py)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            
-            # Create events table
-            c.execute('''CREATE TABLE IF NOT EXISTS events
-                        (timestamp TEXT, event_type TEXT, details TEXT)''')
-            
-            # Create accumulated_times table
-            c.execute('''CREATE TABLE IF NOT EXISTS accumulated_times
-                        (key TEXT PRIMARY KEY, value REAL)''')
-            
-            # Create tool_times table
-            c.execute('''CREATE TABLE IF NOT EXISTS tool_times
-                        (tool_number INTEGER, total_time REAL)''')
-            
-            conn.commit()
+            conn = timers_db.connect(self.db_path)
             conn.close()
             print(f"Database initialized at {self.db_path}")
         except Exception as e:
@@ -103,7 +304,6 @@ class MachineTimers:
             c = conn.cursor()
             
             # Load total spindle time
-            c.execute("SELECT value FROM accumulated_times WHERE key = 'total_spindle_time'")
             result = c.execute("SELECT value FROM accumulated_times WHERE key = 'total_spindle_time'").fetchone()
             if result:
                 self.h.total_spindle_time = float(result[0])
@@ -113,99 +313,137 @@ class MachineTimers:
             print(f"Warning: Failed to load accumulated times: {e}")
     
     def save_accumulated_times(self):
-        """Save accumulated times to database"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            
-            # Save total spindle time
-            c.execute("""INSERT OR REPLACE INTO accumulated_times (key, value)
-                        VALUES ('total_spindle_time', ?)""", (self.h.total_spindle_time,))
-            
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"Warning: Failed to save accumulated times: {e}")
+        """Queue the accumulated times for saving"""
+        self.writer.submit('accumulated', 'total_spindle_time', self.h.total_spindle_time)
     
-    def log_event(self, event_type, details=""):
-        """Log timing events to file and database"""
-        timestamp = datetime.now()
-        
-        # Log to file
-        log_file = os.path.join(self.log_dir, f"machine_timers_{timestamp.strftime('%Y%m%d')}.log")
-        with open(log_file, "a") as f:
-            f.write(f"{timestamp.strftime('%Y-%m-%d %H:%M:%S')} - {event_type}: {details}\n")
-        
-        # Log to database
+    def log_event(self, event_type, tool=0, duration=0.0, from_tool=0, ts=None):
+        """Queue a timing event for the journal"""
+        self.writer.submit('event', time.time() if ts is None else ts, event_type, tool, from_tool, duration)
+    
+    def update_tool_time(self, tool_number, duration):
+        """Queue accumulated time for a specific tool"""
+        self.writer.submit('tool_time', tool_number, duration)
+    
+    def poll_program(self, now, force=False):
+        """Path of the program running in auto mode ('' when idle or in MDI), polled once a second
+        (4 times a second during a run, to catch the read line reaching the end; or now if forced)"""
+        interval = 0.25 if self.run_tracker.run is not None else 1.0
+        if self.stat is None or (not force and now - self.last_program_poll < interval):
+            return self.program_file
+        self.last_program_poll = now
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            
-            c.execute("""INSERT INTO events (timestamp, event_type, details)
-                        VALUES (?, ?, ?)""", 
-                        (timestamp.strftime('%Y-%m-%d %H:%M:%S'), event_type, details))
-            
-            conn.commit()
-            conn.close()
+            self.stat.poll()
+            running = (self.stat.interp_state != self.linuxcnc.INTERP_IDLE and
+                       self.stat.task_mode == self.linuxcnc.MODE_AUTO)
+            self.program_file = self.stat.file if running else ''
+            self.read_line = self.stat.read_line
+            # Only ever set here - update_run() clears it once passed on
+            error = self.errors.poll()
+            while error:
+                if error[0] in (self.linuxcnc.NML_ERROR, self.linuxcnc.OPERATOR_ERROR):
+                    self.program_error = True
+                error = self.errors.poll()
         except Exception as e:
-            print(f"Warning: Failed to log event to database: {e}")
+            print(f"Warning: Failed to read program state: {e}")
+            self.stat = None
+        return self.program_file
     
-    def update_tool_time(self, tool_number, duration):
-        """Update accumulated time for a specific tool"""
+    def update_state(self, now):
+        state = classify(self.h.machine_running, self.h.vfd_fault, self.h.work_area_setup,
+                         self.h.tool_changing, self.h.spindle_on)
+        self.state_tracker.update(now, state, self.h.current_tool, os.path.basename(self.poll_program(now)))
+    
+    def update_run(self, now):
+        # The program name is read as soon as a run starts, the last line and
+        # any error as soon as it stops
+        active = self.run_tracker.run is not None
+        running = self.h.program_running or self.h.program_paused
+        program = self.poll_program(now, force=active != running)
+        self.run_tracker.update(now, self.h.program_running, self.h.program_paused, self.h.spindle_on,
+                                self.h.tool_changing, self.h.current_tool, self.h.machine_running,
+                                program, self.read_line, self.program_error)
+        self.program_error = False
+    
+    def attach_edge_timer(self):
+        """Switch to servo-thread edges when edge_timer appears; give up after 30s"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            
-            # Get current tool time
-            c.execute("SELECT total_time FROM tool_times WHERE tool_number = ?", (tool_number,))
-            result = c.execute("SELECT total_time FROM tool_times WHERE tool_number = ?", (tool_number,)).fetchone()
-            
-            current_time = float(result[0]) if result else 0.0
-            new_time = current_time + duration
-            
-            # Update tool time
-            c.execute("""INSERT OR REPLACE INTO tool_times (tool_number, total_time)
-                        VALUES (?, ?)""", (tool_number, new_time))
-            
-            conn.commit()
-            conn.close()
+            self.edges = ServoEdges(self.edge_timer)
+            print(f"Machine Timers: using servo-thread edge timestamps from {self.edge_timer}")
+            self.edge_timer = ''
         except Exception as e:
-            print(f"Warning: Failed to update tool time: {e}")
+            if time.monotonic() > self.attach_deadline:
+                print(f"Machine Timers: {self.edge_timer} unavailable ({e}), timing edges at the 100ms poll")
+                self.edge_timer = ''
+    
+    def process_edges(self):
+        """Account the spindle and tool edges since the last call; returns the edge clock time"""
+        now, edges = self.edges.poll(self.h.spindle_on, self.h.current_tool)
+        wall_offset = time.time() - now
+        for t, kind, tool in edges:
+            self.handle_edge(t, kind, tool, wall_offset)
+        return now
+    
+    def handle_edge(self, t, kind, tool, wall_offset):
+        if kind == 'SPINDLE_START':
+            if self.spindle_start_time is None:
+                self.spindle_start_time = t
+                self.log_event("SPINDLE_START", tool, ts=t + wall_offset)
+        elif kind == 'SPINDLE_STOP':
+            if self.spindle_start_time is not None:
+                spindle_duration = t - self.spindle_start_time
+                self.h.total_spindle_time += spindle_duration
+                self.spindle_start_time = None
+                self.log_event("SPINDLE_STOP", tool, spindle_duration, ts=t + wall_offset)
+                self.save_accumulated_times()
+        elif kind == 'TOOL_CHANGE' and tool != self.last_tool:
+            if self.tool_start_time is not None:
+                tool_duration = t - self.tool_start_time
+                self.log_event("TOOL_CHANGE", tool, tool_duration, self.last_tool, ts=t + wall_offset)
+                self.update_tool_time(self.last_tool, tool_duration)
+            self.tool_start_time = t
+            self.last_tool = tool
+    
+    def shutdown(self):
+        """Record the running spindle/tool time and flush pending writes"""
+        now = self.process_edges()
+        self.state_tracker.stop(time.time())
+        self.run_tracker.stop(time.time())
+        if self.spindle_start_time is not None:
+            spindle_duration = now - self.spindle_start_time
+            self.h.total_spindle_time += spindle_duration
+            self.spindle_start_time = None
+            self.log_event("SPINDLE_STOP", self.h.current_tool, spindle_duration)
+        if self.tool_start_time is not None and self.last_tool:
+            self.update_tool_time(self.last_tool, now - self.tool_start_time)
+        self.save_accumulated_times()
+        self.writer.stop()
+        print("Machine Timers stopped - pending writes flushed")
     
     def update(self):
-        current_time = time.time()
+        self.heartbeat.beat()
+        
+        if self.edge_timer:
+            self.attach_edge_timer()
+        
+        now = self.process_edges()
         
         # Update total machine time
-        self.h.total_machine_time = current_time - self.start_time
-        
-        # Update spindle time
-        if self.h.spindle_on:
-            if self.spindle_start_time == 0:
-                self.spindle_start_time = current_time
-                self.log_event("SPINDLE_START", f"Tool: {self.h.current_tool}")
-        else:
-            if self.spindle_start_time != 0:
-                spindle_duration = current_time - self.spindle_start_time
-                self.h.total_spindle_time += spindle_duration
-                self.spindle_start_time = 0
-                self.log_event("SPINDLE_STOP", f"Duration: {spindle_duration:.1f}s, Tool: {self.h.current_tool}")
-                self.save_accumulated_times()
+        self.h.total_machine_time = now - self.start_time
         
-        # Update tool time
-        if self.h.current_tool != self.last_tool:
-            if self.tool_start_time != 0:
-                tool_duration = current_time - self.tool_start_time
-                self.log_event("TOOL_CHANGE", 
-                             f"From: {self.last_tool}, To: {self.h.current_tool}, Duration: {tool_duration:.1f}s")
-                self.update_tool_time(self.last_tool, tool_duration)
-            
-            self.tool_start_time = current_time
-            self.last_tool = self.h.current_tool
+        if self.tool_start_time is not None:
+            self.h.current_tool_time = now - self.tool_start_time
         
-        self.h.current_tool_time = current_time - self.tool_start_time
+        current_time = time.time()
+        self.update_state(current_time)
+        self.update_run(current_time)
+
+def handle_sigterm(signum, frame):
+    # LinuxCNC stops userspace components with SIGTERM - shut down like Ctrl-C
+    raise KeyboardInterrupt
 
 def main():
     timers = MachineTimers()
+    signal.signal(signal.SIGTERM, handle_sigterm)
     
     try:
         while True:
@@ -213,6 +451,7 @@ def main():
             time.sleep(0.1)  # 100ms update rate
             
     except KeyboardInterrupt:
+        timers.shutdown()
         raise SystemExit
 
 if __name__ == "__main__":
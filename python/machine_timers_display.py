@@ -6,7 +6,6 @@ from gi.repository import Gtk, GLib
 import os
 import sqlite3
 import time
-from datetime import datetime
 
 class MachineTimersDisplay(Gtk.Window):
     def __init__(self):
@@ -16,6 +15,29 @@ class MachineTimersDisplay(Gtk.Window):
         # Get the config directory
         self.config_dir = os.environ.get('LINUXCNC_CONFIG_DIR', '')
         self.db_path = os.path.join(self.config_dir, 'logs', 'machine_timers.db')
+        self.conn = None            # Read-only connection, opened once
+        self.first_event_ts = None  # Start of machine time (read once)
+        self.tool_cursor = -1       # Highest tool_times.updated_at already shown
+        self.tool_rows = {}         # Tool number -> list store row
+        self.tool_totals = {}       # Tool number -> total_time shown
+        self.shown = {}             # Label -> text currently displayed
+        
+        # Live values come from the telemetry bus snapshot, else straight from the
+        # machine_timers pins when HAL is running
+        self.telemetry = None
+        try:
+            from telemetry_bus import TelemetryReader, DEFAULT_PATH
+            from ini_config import get_config
+            self.telemetry = TelemetryReader(get_config().get_str('TELEMETRY', 'PATH', DEFAULT_PATH))
+        except Exception:
+            pass
+        try:
+            import hal
+            self.hal = hal
+        except ImportError:
+            if self.telemetry is None:
+                print("Warning: hal module unavailable, showing saved values only")
+            self.hal = None
         
         # Create main container
         self.box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
@@ -117,6 +139,7 @@ class MachineTimersDisplay(Gtk.Window):
         
         # Create list store
         self.tool_store = Gtk.ListStore(int, str)  # Tool number, Total time
+        self.tool_store.set_sort_column_id(0, Gtk.SortType.ASCENDING)
         self.tool_history.set_model(self.tool_store)
         
         # Add columns
@@ -134,63 +157,85 @@ class MachineTimersDisplay(Gtk.Window):
         minutes, seconds = divmod(remainder, 60)
         return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
     
+    def set_label(self, label, text):
+        """Only touch the widget when its text changes"""
+        if self.shown.get(label) != text:
+            label.set_text(text)
+            self.shown[label] = text
+    
+    def get_connection(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            row = self.conn.execute("SELECT value FROM accumulated_times WHERE key = 'first_event_ts'").fetchone()
+            self.first_event_ts = row[0] if row else None
+        return self.conn
+    
+    def read_pin(self, name):
+        """Value of a machine_timers pin, or None without HAL"""
+        if self.telemetry is not None:
+            try:
+                if self.telemetry.age() > 2.0:
+                    self.telemetry.reopen_if_replaced()
+                value = self.telemetry.get(f"machine_timers.{name}")
+                if self.telemetry.age() <= 2.0 and value == value:   # Fresh and not NaN
+                    return value
+            except Exception:
+                pass
+        if self.hal is None:
+            return None
+        try:
+            return self.hal.get_value(f"machine_timers.{name}")
+        except Exception:
+            return None
+    
     def load_tool_history(self):
-        """Load tool history from database"""
+        """Fetch tool_times rows changed since the last call and update only those rows"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            
-            # Get all tool times
-            c.execute("SELECT tool_number, total_time FROM tool_times ORDER BY tool_number")
-            rows = c.fetchall()
-            
-            # Clear existing data
-            self.tool_store.clear()
-            
-            # Add tool times to list store
-            for tool_number, total_time in rows:
+            # updated_at is whole seconds: re-read the cursor's second, so a write in the
+            # same second as the last read is not missed, and skip rows already shown
+            rows = self.get_connection().execute(
+                "SELECT tool_number, total_time, updated_at FROM tool_times WHERE updated_at >= ?",
+                (self.tool_cursor,)).fetchall()
+            for tool_number, total_time, updated_at in rows:
+                self.tool_cursor = max(self.tool_cursor, updated_at or 0)
+                if self.tool_totals.get(tool_number) == total_time:
+                    continue
+                self.tool_totals[tool_number] = total_time
                 time_str = self.format_time(total_time)
-                self.tool_store.append([tool_number, time_str])
-            
-            conn.close()
+                if tool_number in self.tool_rows:
+                    self.tool_store.set_value(self.tool_rows[tool_number], 1, time_str)
+                else:
+                    self.tool_rows[tool_number] = self.tool_store.append([tool_number, time_str])
         except Exception as e:
             print(f"Warning: Failed to load tool history: {e}")
+            self.conn = None
     
     def update_times(self):
         """Update all time displays"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            
-            # Get total machine time (time since first event)
-            c.execute("SELECT MIN(timestamp) FROM events")
-            first_event = c.fetchone()[0]
-            if first_event:
-                first_time = datetime.strptime(first_event, "%Y-%m-%d %H:%M:%S")
-                machine_time = (datetime.now() - first_time).total_seconds()
-                self.total_machine_time.set_text(self.format_time(machine_time))
+            conn = self.get_connection()
             
-            # Get total spindle time
-            c.execute("SELECT value FROM accumulated_times WHERE key = 'total_spindle_time'")
-            result = c.fetchone()
-            if result:
-                self.total_spindle_time.set_text(self.format_time(result[0]))
+            # Total machine time (time since first event - kept when old events are compacted)
+            if self.first_event_ts:
+                self.set_label(self.total_machine_time, self.format_time(time.time() - self.first_event_ts))
             
-            # Get current tool and time
-            c.execute("SELECT tool_number, total_time FROM tool_times ORDER BY tool_number DESC LIMIT 1")
-            result = c.fetchone()
-            if result:
-                self.current_tool.set_text(str(result[0]))
-                self.current_tool_time.set_text(self.format_time(result[1]))
+            # Spindle time and current tool are live HAL values; fall back to the saved total
+            spindle_time = self.read_pin("total_spindle_time")
+            if spindle_time is None:
+                result = conn.execute("SELECT value FROM accumulated_times WHERE key = 'total_spindle_time'").fetchone()
+                spindle_time = result[0] if result else 0.0
+            self.set_label(self.total_spindle_time, self.format_time(spindle_time))
             
-            conn.close()
+            current_tool = self.read_pin("current_tool")
+            if current_tool is not None:
+                self.set_label(self.current_tool, str(int(current_tool)))
+                self.set_label(self.current_tool_time, self.format_time(self.read_pin("current_tool_time") or 0.0))
             
-            # Reload tool history periodically
-            if int(time.time()) % 30 == 0:  # Every 30 seconds
-                self.load_tool_history()
+            self.load_tool_history()
             
         except Exception as e:
             print(f"Warning: Failed to update times: {e}")
+            self.conn = None
         
         return True  # Keep the timer running
 
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Prometheus metrics for the machine timers, VFD, vacuum, tool release and
+# component health.
+#
+# A snapshot of the HAL pins and the timers database is taken every
+# [METRICS]INTERVAL seconds and rendered once. HTTP scrapes of
+# http://127.0.0.1:[METRICS]PORT/metrics and the node-exporter textfile both
+# get that cached text, so scraping never touches HAL or SQLite.
+#
+#   python3 python/metrics_exporter.py --once    Print one snapshot and exit
+
+import os
+import sys
+import hal
+import time
+import signal
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ini_config import get_config
+
+DEFAULT_COMPONENTS = 'machine_enable work_area vfd_control tool_release vacuum machine_timers'
+
+# (metric, type, help, HAL pin)
+PIN_METRICS = (
+    ('rover_machine_time_seconds', 'gauge', "Time since machine_timers started", 'machine_timers.total_machine_time'),
+    ('rover_spindle_time_seconds_total', 'counter', "Accumulated spindle run time", 'machine_timers.total_spindle_time'),
+    ('rover_current_tool', 'gauge', "Tool in spindle", 'machine_timers.current_tool'),
+    ('rover_current_tool_time_seconds', 'gauge', "Time since the last tool change", 'machine_timers.current_tool_time'),
+    ('rover_spindle_on', 'gauge', "Spindle running", 'machine_timers.spindle_on'),
+    ('rover_machine_on', 'gauge', "Machine on", 'machine_timers.machine_running'),
+    ('rover_vfd_fault', 'gauge', "VFD fault active", 'vfd_control.fault_active'),
+    ('rover_vfd_speed_rpm', 'gauge', "Commanded VFD speed", 'vfd_control.vfd_speed'),
+    ('rover_spindle_at_speed', 'gauge', "Spindle at commanded speed", 'vfd_control.spindle_at_speed'),
+    ('rover_vacuum_ok', 'gauge', "Vacuum level OK", 'vacuum.vacuum_ok'),
+    ('rover_vacuum_suction_on', 'gauge', "Vacuum pump on", 'vacuum.suction_on'),
+    ('rover_vacuum_low', 'gauge', "Low vacuum warning", 'vacuum.low_vacuum'),
+    ('rover_vacuum_hold', 'gauge', "Feed hold for vacuum loss active", 'vacuum.vacuum_hold'),
+    ('rover_vacuum_dip_seconds', 'gauge', "Current or last vacuum dip", 'vacuum.dip_time'),
+    ('rover_tool_release_cycles_total', 'counter', "Tool release cycles", 'tool_release.cycle_count'),
+    ('rover_tool_release_error', 'gauge', "Tool release error active", 'tool_release.error_active'),
+    ('rover_tool_release_seconds', 'gauge', "Last release command to released", 'tool_release.release_time'),
+    ('rover_tool_release_p90_seconds', 'gauge', "90th percentile release time", 'tool_release.release_time_p90'),
+    ('rover_tool_lock_seconds', 'gauge', "Last lock command to locked", 'tool_release.lock_time'),
+    ('rover_tool_lock_p50_seconds', 'gauge', "Median lock time", 'tool_release.lock_time_p50'),
+    ('rover_tool_lock_p90_seconds', 'gauge', "90th percentile lock time", 'tool_release.lock_time_p90'),
+    ('rover_tool_lock_trend_seconds', 'gauge', "Projected lock time", 'tool_release.lock_time_trend'),
+    ('rover_tool_lock_warning', 'gauge', "Lock time trending towards the timeout", 'tool_release.lock_time_warning'),
+    ('rover_supervisor_fault', 'gauge', "Any component stalled", 'supervisor.fault'),
+    ('rover_supervisor_stalls_total', 'counter', "Component stalls since start", 'supervisor.stall_count'),
+)
+
+def format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Snapshot:
+    """Collects and renders one set of metrics"""
+
+    def __init__(self):
+        self.families = {}   # metric -> (type, help, [(labels, value)])
+
+    def add(self, metric, kind, help_text, value, **labels):
+        family = self.families.setdefault(metric, (kind, help_text, []))
+        family[2].append((labels, value))
+
+    def render(self):
+        lines = []
+        for metric, (kind, help_text, samples) in self.families.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{metric}{{{label_text}}} {format_value(value)}" if label_text
+                             else f"{metric} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+class MetricsExporter:
+    def __init__(self):
+        config = get_config()
+        self.PORT = config.get_int('METRICS', 'PORT', 9105)
+        self.INTERVAL = config.get_float('METRICS', 'INTERVAL', 5.0)       # Seconds between snapshots
+        self.DB_INTERVAL = config.get_float('METRICS', 'DB_INTERVAL', 60.0) # Seconds between tool time reads
+        self.TEXTFILE = config.get_str('METRICS', 'TEXTFILE', '')            # node-exporter textfile (empty = off)
+        self.COMPONENTS = config.get_str('SUPERVISOR', 'COMPONENTS', DEFAULT_COMPONENTS).split()
+        self.db_path = os.path.join(os.environ.get('LINUXCNC_CONFIG_DIR', ''), 'logs', 'machine_timers.db')
+
+        self.text = b''          # Latest rendered snapshot, replaced whole
+        self.tool_times = []
+        self.last_db_read = 0
+        self.missing = set()
+
+    def read_pin(self, name):
+        try:
+            value = hal.get_value(name)
+            self.missing.discard(name)
+            return value
+        except Exception:
+            if name not in self.missing:
+                print(f"Warning: Metrics exporter cannot read {name}")
+                self.missing.add(name)
+            return None
+
+    def read_tool_times(self):
+        """Per-tool totals, read at most every DB_INTERVAL"""
+        if self.last_db_read and time.monotonic() - self.last_db_read < self.DB_INTERVAL:
+            return
+        self.last_db_read = time.monotonic()
+        try:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            try:
+                self.tool_times = conn.execute(
+                    "SELECT tool_number, total_time FROM tool_times ORDER BY tool_number").fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Warning: Failed to read tool times: {e}")
+
+    def collect(self):
+        snap = Snapshot()
+        for metric, kind, help_text, pin in PIN_METRICS:
+            value = self.read_pin(pin)
+            if value is not None:
+                snap.add(metric, kind, help_text, value)
+
+        self.read_tool_times()
+        for tool, total in self.tool_times:
+            snap.add('rover_tool_time_seconds_total', 'counter', "Accumulated time per tool", total, tool=tool)
+
+        now = time.monotonic()
+        for name in self.COMPONENTS:
+            last_update = self.read_pin(f"{name}.last_update")
+            snap.add('rover_component_up', 'gauge', "Component pins present", last_update is not None, component=name)
+            if last_update is not None:
+                snap.add('rover_component_heartbeat_age_seconds', 'gauge', "Time since the component's last update",
+                         round(now - last_update, 4), component=name)
+            stalled = self.read_pin(f"supervisor.{name}_stalled")
+            if stalled is not None:
+                snap.add('rover_component_stalled', 'gauge', "Component stalled (supervisor)", stalled, component=name)
+                snap.add('rover_component_stall_seconds', 'gauge', "Current or last stall length",
+                         self.read_pin(f"supervisor.{name}_stall_time") or 0.0, component=name)
+
+        snap.add('rover_exporter_snapshot_timestamp_seconds', 'gauge', "Wall time of this snapshot", round(time.time(), 3))
+        return snap.render()
+
+    def refresh(self):
+        try:
+            text = self.collect()
+        except Exception as e:
+            print(f"Warning: Failed to collect metrics: {e}")
+            return
+        self.text = text.encode()
+        if self.TEXTFILE:
+            try:
+                tmp = self.TEXTFILE + '.tmp'
+                with open(tmp, 'w') as f:
+                    f.write(text)
+                os.replace(tmp, self.TEXTFILE)   # node-exporter never sees a partial file
+            except OSError as e:
+                print(f"Warning: Failed to write metrics textfile: {e}")
+
+    def make_handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = exporter.text
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # One line per scrape would flood the console
+
+        return Handler
+
+    def serve(self):
+        """Serve the cached text on localhost in a background thread"""
+        try:
+            self.server = ThreadingHTTPServer(('127.0.0.1', self.PORT), self.make_handler())
+        except OSError as e:
+            print(f"Warning: Metrics exporter cannot listen on port {self.PORT}: {e}")
+            self.server = None
+            return
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f"Metrics exporter serving http://127.0.0.1:{self.PORT}/metrics"
+              + (f" and {self.TEXTFILE}" if self.TEXTFILE else ''))
+
+def handle_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+def main():
+    if '--once' in sys.argv:
+        h = hal.component("metrics_exporter_once")
+        h.ready()
+        sys.stdout.write(MetricsExporter().collect())
+        return
+
+    h = hal.component("metrics_exporter")
+    exporter = MetricsExporter()
+    exporter.refresh()
+    exporter.serve()
+    h.ready()
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    try:
+        while True:
+            time.sleep(exporter.INTERVAL)
+            exporter.refresh()
+
+    except KeyboardInterrupt:
+        if exporter.server is not None:
+            exporter.server.shutdown()
+        raise SystemExit
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Modal-state checkpoint index for fast run-from-line.
+#
+# LinuxCNC's run-from-line scans the whole program up to the start line to
+# rebuild modal state. This indexer does a light pass over the program once and
+# stores a checkpoint every [NGC_INDEX]INTERVAL blocks in a sidecar file
+# (<program>.idx). A resume program is then built by seeking to the nearest
+# checkpoint, scanning the few blocks up to the start line and writing a
+# preamble that restores units, plane, offsets, tool, spindle and position.
+#
+#   python3 python/ngc_index.py build FILE
+#   python3 python/ngc_index.py state FILE LINE
+#   python3 python/ngc_index.py resume FILE LINE [-o OUTPUT]
+#
+# The index is rebuilt only when the program's hash changes. Lines inside
+# O-word blocks and canned cycles cannot be resumed this way, nor can lines
+# after a parameter assignment or after an executed O-word block or call -
+# their effect on the modal state is only known at run time.
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+from ini_config import get_config
+
+INDEX_VERSION = 2
+
+WORD = re.compile(r'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+)|\[|#)')
+OWORD = re.compile(r'^O\s*(<[^>]*>|\d+)\s*(SUB|ENDSUB|IF|ELSEIF|ELSE|ENDIF|WHILE|ENDWHILE|DO|REPEAT|ENDREPEAT|CALL|RETURN|BREAK|CONTINUE)?')
+OPEN_BLOCKS = ('SUB', 'IF', 'WHILE', 'DO', 'REPEAT')
+CLOSE_BLOCKS = ('ENDSUB', 'ENDIF', 'ENDWHILE', 'ENDREPEAT')
+CANNED_CYCLES = ('G73', 'G76', 'G81', 'G82', 'G83', 'G84', 'G85', 'G86', 'G87', 'G88', 'G89')
+
+# G code -> modal group name
+MODAL_GROUPS = {}
+for _code in ('G0', 'G1', 'G2', 'G3', 'G33', 'G38.2', 'G80') + CANNED_CYCLES:
+    MODAL_GROUPS[_code] = 'motion'
+for _group, _codes in (('plane', ('G17', 'G18', 'G19')),
+                       ('units', ('G20', 'G21')),
+                       ('distance', ('G90', 'G91')),
+                       ('arc_distance', ('G90.1', 'G91.1')),
+                       ('feed_mode', ('G93', 'G94', 'G95')),
+                       ('cutter_comp', ('G40', 'G41', 'G42', 'G41.1', 'G42.1')),
+                       ('path', ('G61', 'G61.1', 'G64')),
+                       ('coord_system', ('G54', 'G55', 'G56', 'G57', 'G58', 'G59', 'G59.1', 'G59.2', 'G59.3'))):
+    for _code in _codes:
+        MODAL_GROUPS[_code] = _group
+
+def initial_state():
+    """Modal state at program start ([RS274NGC]RS274NGC_STARTUP_CODE defaults)"""
+    return {
+        'motion': 'G0', 'plane': 'G17', 'units': 'G21', 'distance': 'G90',
+        'arc_distance': 'G91.1', 'feed_mode': 'G94', 'cutter_comp': 'G40',
+        'path': 'G64', 'path_p': 0.025, 'coord_system': 'G54',
+        'tool': None,        # Tool loaded by the last M6
+        'selected': None,    # Last T word
+        'tool_length': None, # H word of the active G43, 0 for G49
+        'feed': None, 'speed': None, 'spindle': 'M5',
+        'x': None, 'y': None, 'z': None,  # Last programmed position (work coordinates)
+    }
+
+def parse_block(text):
+    """Strip comments and return (upper case code, list of (letter, value)).
+    value is None for words given by an expression or parameter.
+    """
+    code = re.sub(r'\([^)]*\)', '', text).split(';', 1)[0].strip().upper()
+    if code.startswith('/'):
+        code = code[1:]
+    code = re.sub(r'^N\s*\d+\s*', '', code)
+    words = []
+    for letter, value in WORD.findall(code):
+        words.append((letter, None if value in ('[', '#') else float(value)))
+    return code, words
+
+def oword_step(stack, code):
+    """Track O-word nesting for one block. Returns (event, keyword) with event
+    'open', 'close' or 'other' for O-word blocks, None for ordinary blocks.
+    Both the indexer and state_at() scan with this, so they agree on which
+    blocks update the modal state (only those outside every O-word block).
+    """
+    oword = OWORD.match(code)
+    if not oword:
+        return None, None
+    name, keyword = oword.group(1), oword.group(2)
+    # 'Oxxx while' closes a matching 'Oxxx do', otherwise it opens a loop
+    closes_do = keyword == 'WHILE' and stack and stack[-1] == (name, 'DO')
+    if keyword in OPEN_BLOCKS and not closes_do:
+        stack.append((name, keyword))
+        return 'open', keyword
+    if (keyword in CLOSE_BLOCKS or closes_do) and stack:
+        stack.pop()
+        return 'close', keyword
+    return 'other', keyword
+
+def format_g(value):
+    return f"G{value:g}"
+
+def apply_block(state, words, code):
+    """Update state with one block. Returns the G codes seen."""
+    gcodes = [format_g(v) for letter, v in words if letter == 'G' and v is not None]
+    mcodes = [int(v) for letter, v in words if letter == 'M' and v is not None]
+    for g in gcodes:
+        group = MODAL_GROUPS.get(g)
+        if group:
+            state[group] = g
+        if g == 'G49':
+            state['tool_length'] = 0
+    # G53, G28/G30 and G92 leave the work position unknown; G4 and G10 words are not moves
+    position_unknown = any(g in ('G53', 'G28', 'G30', 'G92') for g in gcodes)
+    not_a_move = any(g in ('G4', 'G10') for g in gcodes)
+
+    for letter, value in words:
+        if letter == 'F':
+            state['feed'] = value
+        elif letter == 'S':
+            state['speed'] = value
+        elif letter == 'T':
+            state['selected'] = None if value is None else int(value)
+        elif letter == 'P' and 'G64' in gcodes:
+            state['path_p'] = value
+        elif letter == 'H' and 'G43' in gcodes:
+            state['tool_length'] = None if value is None else int(value)
+
+    if 'G43' in gcodes and not any(letter == 'H' for letter, _ in words):
+        state['tool_length'] = state['tool']
+
+    for m in mcodes:
+        if m == 6:
+            state['tool'] = state['selected']
+        elif m in (3, 4, 5):
+            state['spindle'] = f"M{m}"
+
+    for letter, value in words:
+        axis = letter.lower()
+        if letter not in 'XYZ' or not_a_move:
+            continue
+        if position_unknown or value is None:
+            state[axis] = None
+        elif state['distance'] == 'G91':
+            state[axis] = None if state[axis] is None else state[axis] + value
+        else:
+            state[axis] = value
+    # Canned cycles end at the retract plane
+    if state['motion'] in CANNED_CYCLES and any(letter in 'XYZ' for letter, _ in words):
+        state['z'] = None
+    return gcodes
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def index_path(program):
+    return program + '.idx'
+
+def build_index(program, interval=None):
+    """Scan the program once and write the sidecar index"""
+    if interval is None:
+        interval = get_config().get_int('NGC_INDEX', 'INTERVAL', 500)
+    state = initial_state()
+    checkpoints = []
+    subs = []
+    blocked = []           # [start_line, end_line] ranges inside O-word blocks
+    stack = []             # Open O-word blocks as (name, keyword)
+    block_start = 0
+    sub_start = None
+    first_param_line = None
+    first_exec_line = None # First executed O-word block or call outside a sub definition
+    offset = 0
+    blocks = 0
+    last_checkpoint = 0
+    line_no = 0
+
+    with open(program, 'rb') as f:
+        for raw in f:
+            line_no += 1
+            text = raw.decode('utf-8', 'replace')
+            code, words = parse_block(text)
+
+            # Checkpoint only where the linear scan is exact
+            if code and not stack and (not checkpoints or blocks - last_checkpoint >= interval) and \
+                    state['motion'] not in CANNED_CYCLES and state['cutter_comp'] == 'G40':
+                checkpoints.append({'line': line_no, 'offset': offset, 'state': dict(state)})
+                last_checkpoint = blocks
+
+            event, keyword = oword_step(stack, code)
+            if event == 'open':
+                if len(stack) == 1:
+                    block_start = line_no
+                    if keyword != 'SUB' and first_exec_line is None:
+                        first_exec_line = line_no
+                if keyword == 'SUB':
+                    sub_start = offset
+            elif event == 'close':
+                if keyword == 'ENDSUB' and sub_start is not None:
+                    subs.append([sub_start, offset + len(raw)])
+                    sub_start = None
+                if not stack:
+                    blocked.append([block_start, line_no])
+            elif event == 'other':
+                if not stack and first_exec_line is None:
+                    first_exec_line = line_no
+            elif code:
+                if first_param_line is None and re.match(r'^#\S*\s*=', code):
+                    first_param_line = line_no
+                if not stack:
+                    apply_block(state, words, code)
+                blocks += 1
+            offset += len(raw)
+
+    index = {
+        'version': INDEX_VERSION,
+        'hash': file_hash(program),
+        'interval': interval,
+        'lines': line_no,
+        'first_param_line': first_param_line,
+        'first_exec_line': first_exec_line,
+        'blocked': blocked,
+        'subs': subs,
+        'checkpoints': checkpoints,
+    }
+    tmp = index_path(program) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp, index_path(program))
+    return index
+
+def load_index(program, interval=None):
+    """Return the index for a program, rebuilding it if the program changed"""
+    if interval is None:
+        interval = get_config().get_int('NGC_INDEX', 'INTERVAL', 500)
+    try:
+        with open(index_path(program), 'r') as f:
+            index = json.load(f)
+        if index.get('version') == INDEX_VERSION and index.get('interval') == interval and \
+                index.get('hash') == file_hash(program):
+            return index
+    except (OSError, ValueError):
+        pass
+    return build_index(program, interval)
+
+def state_at(program, line, index=None):
+    """Modal state before executing 'line' (1-based) and the byte offset of that line"""
+    index = index or load_index(program)
+    if line < 1 or line > index['lines']:
+        raise ValueError(f"Line {line} outside program (1-{index['lines']})")
+    for start, end in index['blocked']:
+        if start <= line <= end:
+            raise ValueError(f"Line {line} is inside an O-word block (lines {start}-{end})")
+    if index['first_exec_line'] is not None and index['first_exec_line'] < line:
+        raise ValueError(f"An O-word block or call runs before line {line} (line {index['first_exec_line']}) "
+                         "- its modal state is unknown, use the full run-from-line")
+
+    checkpoint = None
+    for cp in index['checkpoints']:
+        if cp['line'] > line:
+            break
+        checkpoint = cp
+    if checkpoint is None:
+        checkpoint = {'line': 1, 'offset': 0, 'state': initial_state()}
+
+    state = dict(checkpoint['state'])
+    offset = checkpoint['offset']
+    stack = []             # Checkpoints are only taken outside O-word blocks
+    with open(program, 'rb') as f:
+        f.seek(offset)
+        for line_no in range(checkpoint['line'], line):
+            raw = f.readline()
+            offset += len(raw)
+            code, words = parse_block(raw.decode('utf-8', 'replace'))
+            event, _ = oword_step(stack, code)
+            if event is None and code and not stack:
+                apply_block(state, words, code)
+    return state, offset
+
+def preamble(state, setup=True):
+    """G code that recreates 'state'. With setup=False the tool, spindle and
+    approach moves are left out (trip_resume.py has already done them).
+    """
+    config = get_config()
+    safe_z = config.get_float('NGC_INDEX', 'SAFE_Z', 0.0)
+    approach_feed = config.get_float('NGC_INDEX', 'APPROACH_FEED', 500.0)
+    spinup = config.get_float('NGC_INDEX', 'SPINUP_TIME', 4.0)
+
+    lines = [f"{state['units']} {state['plane']} G90 {state['arc_distance']} {state['feed_mode']} G40 {state['coord_system']}"]
+    if state['path'] == 'G64' and state['path_p'] is not None:
+        lines.append(f"G64 P{state['path_p']:g}")
+    else:
+        lines.append(state['path'])
+    if setup:
+        if state['tool'] is not None:
+            lines.append(f"T{state['tool']} M6")
+        if state['tool_length']:
+            lines.append(f"G43 H{state['tool_length']}")
+        elif state['tool_length'] == 0:
+            lines.append("G49")
+        if state['selected'] is not None and state['selected'] != state['tool']:
+            lines.append(f"T{state['selected']}")
+        if state['spindle'] in ('M3', 'M4') and state['speed'] is not None:
+            lines.append(f"S{state['speed']:g} {state['spindle']}")
+            lines.append(f"G4 P{spinup:g}")
+        lines.append(f"G53 G0 Z{safe_z:g}")
+        if state['x'] is not None and state['y'] is not None:
+            lines.append(f"G0 X{state['x']:g} Y{state['y']:g}")
+        if state['z'] is not None:
+            lines.append(f"G1 Z{state['z']:g} F{approach_feed:g}")
+    motion = state['motion'] if state['motion'] in ('G0', 'G1', 'G2', 'G3') else 'G0'
+    feed = f" F{state['feed']:g}" if state['feed'] is not None else ''
+    lines.append(f"{motion}{feed}")
+    if state['distance'] == 'G91':
+        lines.append("G91")
+    return lines
+
+def write_resume(program, line, output=None, setup=True):
+    """Write a program that continues 'program' from 'line'. Returns the output path."""
+    index = load_index(program)
+    if index['first_param_line'] is not None and index['first_param_line'] < line:
+        raise ValueError(f"Parameters are assigned before line {line} (line {index['first_param_line']}) - use the full run-from-line")
+    state, offset = state_at(program, line, index)
+    if state['motion'] in CANNED_CYCLES:
+        raise ValueError(f"Line {line} continues a canned cycle ({state['motion']}) - resume from the cycle block")
+    if state['cutter_comp'] != 'G40':
+        raise ValueError(f"Cutter compensation ({state['cutter_comp']}) is active at line {line}")
+
+    if output is None:
+        resume_dir = get_config().get_str('NGC_INDEX', 'RESUME_DIR', '/tmp')
+        name = os.path.splitext(os.path.basename(program))[0]
+        output = os.path.join(resume_dir, f"{name}-from-{line}.ngc")
+
+    with open(program, 'rb') as src, open(output, 'wb') as out:
+        out.write(f"(Resume of {os.path.basename(program)} from line {line})\n".encode())
+        # Subroutines defined in the file are still needed after the start line
+        for start, end in index['subs']:
+            if start < offset:
+                src.seek(start)
+                out.write(src.read(end - start))
+        for text in preamble(state, setup):
+            out.write((text + '\n').encode())
+        src.seek(offset)
+        for chunk in iter(lambda: src.read(1 << 20), b''):
+            out.write(chunk)
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpoint index for fast run-from-line")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    build = sub.add_parser('build', help="(Re)build the index")
+    build.add_argument('program')
+    state = sub.add_parser('state', help="Print the modal state at a line")
+    state.add_argument('program')
+    state.add_argument('line', type=int)
+    resume = sub.add_parser('resume', help="Write a program that starts at a line")
+    resume.add_argument('program')
+    resume.add_argument('line', type=int)
+    resume.add_argument('-o', '--output')
+    args = parser.parse_args()
+
+    try:
+        if args.cmd == 'build':
+            index = build_index(args.program)
+            print(f"Indexed {index['lines']} lines, {len(index['checkpoints'])} checkpoints -> {index_path(args.program)}")
+        elif args.cmd == 'state':
+            print(json.dumps(state_at(args.program, args.line)[0], indent=1))
+        else:
+            print(write_resume(args.program, args.line, args.output))
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Machine state and OEE analytics over the timers database.
+#
+# machine_timers classifies every update into one state (see classify()) and
+# feeds a StateTracker, which keeps the state_intervals and state_hourly tables
+# (timers_db.py) up to date. Reports read the hourly totals only, so a year of
+# data is a few thousand rows per state.
+#
+#   python3 python/oee_analytics.py report [--since DATE] [--until DATE] [--by shift|day|tool|program] [--csv FILE]
+#   python3 python/oee_analytics.py intervals [--since DATE] [--until DATE]
+#
+#   planned      = all recorded time - OFF
+#   run          = planned - FAULT - SETUP - TOOL_CHANGE
+#   availability = run / planned
+#   performance  = CUTTING / run
+#   spindle      = CUTTING / planned  (the real spindle-on fraction)
+
+import csv
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+import timers_db
+from ini_config import get_config
+
+# In priority order - the first that applies wins
+STATES = ('OFF', 'FAULT', 'SETUP', 'TOOL_CHANGE', 'CUTTING', 'IDLE')
+
+def classify(machine_on, fault, setup, tool_changing, spindle_on):
+    if not machine_on:
+        return 'OFF'
+    if fault:
+        return 'FAULT'
+    if setup:
+        return 'SETUP'
+    if tool_changing:
+        return 'TOOL_CHANGE'
+    if spindle_on:
+        return 'CUTTING'
+    return 'IDLE'
+
+def hour_of(ts):
+    return (int(ts) // 3600) * 3600
+
+class StateTracker:
+    """Accumulates time per (hour, state, tool, program) and queues it to the
+    timers writer every FLUSH seconds; each finished state interval is queued
+    when the state, tool or program changes.
+    """
+    def __init__(self, submit, flush=60.0):
+        self.submit = submit
+        self.flush_period = flush
+        self.current = None          # (state, tool, program)
+        self.interval_start = 0.0
+        self.last = 0.0
+        self.last_flush = 0.0
+        self.pending = {}
+
+    def update(self, now, state, tool, program):
+        key = (state, tool, program)
+        if self.current is None:
+            self.current, self.interval_start, self.last, self.last_flush = key, now, now, now
+            return
+        self.add_time(self.last, now)
+        self.last = now
+        if key != self.current:
+            self.close_interval(now)
+            self.current, self.interval_start = key, now
+            self.flush()
+        elif now - self.last_flush >= self.flush_period:
+            self.flush()
+
+    def add_time(self, start, end):
+        """Credit start..end to the current key, split at hour boundaries"""
+        while end > start:
+            hour = hour_of(start)
+            part = min(end, hour + 3600) - start
+            pending_key = (hour,) + self.current
+            self.pending[pending_key] = self.pending.get(pending_key, 0.0) + part
+            start += part
+
+    def close_interval(self, now):
+        if now > self.interval_start:
+            self.submit('state_interval', self.interval_start, now, *self.current)
+
+    def flush(self):
+        for (hour, state, tool, program), seconds in self.pending.items():
+            self.submit('state_time', hour, state, tool, program, seconds)
+        self.pending = {}
+        self.last_flush = self.last
+
+    def stop(self, now):
+        """Record the open interval (on shutdown)"""
+        if self.current is None:
+            return
+        self.add_time(self.last, now)
+        self.last = now
+        self.close_interval(now)
+        self.flush()
+        self.current = None
+
+def parse_shifts(text):
+    """'06:00-14:00 14:00-22:00 22:00-06:00' -> [(name, start hour, end hour), ...]"""
+    shifts = []
+    for span in text.split():
+        start, end = span.split('-')
+        shifts.append((span, int(start.split(':')[0]), int(end.split(':')[0])))
+    return shifts
+
+def shift_of(hour_ts, shifts):
+    """Shift label ('YYYY-MM-DD 06:00-14:00') for an hour. A shift that runs past
+    midnight belongs to the day it started.
+    """
+    dt = datetime.fromtimestamp(hour_ts)
+    for name, start, end in shifts:
+        if start < end and start <= dt.hour < end:
+            return f"{dt:%Y-%m-%d} {name}"
+        if start >= end and (dt.hour >= start or dt.hour < end):
+            day = dt - timedelta(days=1) if dt.hour < end else dt
+            return f"{day:%Y-%m-%d} {name}"
+    return f"{dt:%Y-%m-%d} unassigned"
+
+GROUP_SQL = {
+    'total': "'total'",
+    'day': "date(hour, 'unixepoch', 'localtime')",
+    'tool': "tool",
+    'program': "program",
+    'shift': "hour",      # Grouped into shifts in Python
+}
+
+def state_totals(conn, since=None, until=None, by='total', shifts=None):
+    """{group: {state: seconds}} from the hourly totals"""
+    where, params = [], []
+    if since is not None:
+        where.append("hour >= ?")
+        params.append(hour_of(since))
+    if until is not None:
+        where.append("hour < ?")
+        params.append(until)
+    group = GROUP_SQL[by]
+    sql = f"SELECT {group}, state, SUM(seconds) FROM state_hourly"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" GROUP BY {group}, state"
+    totals, labels = {}, {}
+    for key, state, seconds in conn.execute(sql, params):
+        if by == 'shift':
+            if key not in labels:
+                labels[key] = shift_of(key, shifts)
+            key = labels[key]
+        group_totals = totals.setdefault(key, {})
+        group_totals[state] = group_totals.get(state, 0.0) + seconds
+    return totals
+
+def oee(states):
+    """Availability/performance figures for one {state: seconds}"""
+    total = sum(states.values())
+    planned = total - states.get('OFF', 0.0)
+    run = planned - states.get('FAULT', 0.0) - states.get('SETUP', 0.0) - states.get('TOOL_CHANGE', 0.0)
+    cutting = states.get('CUTTING', 0.0)
+    return {
+        'planned': planned,
+        'run': run,
+        'availability': run / planned if planned > 0 else 0.0,
+        'performance': cutting / run if run > 0 else 0.0,
+        'spindle': cutting / planned if planned > 0 else 0.0,
+    }
+
+def report_rows(totals):
+    rows = []
+    for key in sorted(totals, key=str):
+        states = totals[key]
+        figures = oee(states)
+        row = {'group': key}
+        row.update({state.lower(): states.get(state, 0.0) / 3600 for state in STATES})
+        row.update({'planned': figures['planned'] / 3600, 'availability': figures['availability'],
+                    'performance': figures['performance'], 'spindle': figures['spindle']})
+        rows.append(row)
+    return rows
+
+def print_report(rows, by):
+    print(f"{by:<26}" + ''.join(f"{s.lower():>12}" for s in STATES) + f"{'planned':>10}{'avail':>8}{'perf':>8}{'spindle':>8}")
+    for row in rows:
+        print(f"{str(row['group']) or '-':<26}" + ''.join(f"{row[s.lower()]:11.2f}h" for s in STATES) +
+              f"{row['planned']:9.2f}h{row['availability']:8.1%}{row['performance']:8.1%}{row['spindle']:8.1%}")
+
+def write_csv(rows, path):
+    fields = ['group'] + [s.lower() for s in STATES] + ['planned', 'availability', 'performance', 'spindle']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+def parse_time(text):
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"Bad time {text}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Machine state and OEE reports from the timers database")
+    parser.add_argument('--db', default=None, help="Timers database (default logs/machine_timers.db)")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    report = sub.add_parser('report', help="Time per state with availability/performance")
+    report.add_argument('--since', type=parse_time)
+    report.add_argument('--until', type=parse_time)
+    report.add_argument('--by', choices=('total', 'shift', 'day', 'tool', 'program'), default='total')
+    report.add_argument('--csv', metavar='FILE', help="Also write the report as CSV")
+    intervals = sub.add_parser('intervals', help="State timeline")
+    intervals.add_argument('--since', type=parse_time)
+    intervals.add_argument('--until', type=parse_time)
+    args = parser.parse_args()
+
+    conn = timers_db.connect(args.db or timers_db.default_db_path())
+    if args.cmd == 'report':
+        shifts = parse_shifts(get_config().get_str('OEE', 'SHIFTS', '06:00-14:00 14:00-22:00 22:00-06:00'))
+        rows = report_rows(state_totals(conn, args.since, args.until, args.by, shifts))
+        if not rows:
+            print("No state data in range")
+            sys.exit(1)
+        print_report(rows, args.by)
+        if args.csv:
+            write_csv(rows, args.csv)
+            print(f"Wrote {args.csv}")
+    else:
+        since = args.since if args.since is not None else time.time() - 86400
+        until = args.until if args.until is not None else time.time()
+        for start, end, state, tool, program in conn.execute(
+                """SELECT start, end, state, tool, program FROM state_intervals
+                   WHERE start >= ? AND start < ? ORDER BY start""", (since, until)):
+            when = datetime.fromtimestamp(start).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{when}  {end - start:8.1f}s  {state:<12} T{tool:<3} {program}")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
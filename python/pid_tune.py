@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# PID / feed-forward tuning assistant for the servo joints.
+#
+# capture runs a tuning program (ngc/tune_x.ngc, ngc/tune_xy.ngc) while
+# hal_sampler records the joint's command, feedback and PID output every servo
+# period. fit identifies the drive as a first-order velocity response with
+# dead time (drive output -> axis velocity), then simulates the LinuxCNC pid
+# on the captured command for a grid of P, I, FF1 and FF2 around the current
+# [JOINT_n] values - all candidates at once with NumPy - and suggests the set
+# with the lowest peak and RMS following error whose peak stays within
+# [PID_TUNE]MARGIN of FERROR.
+#
+#   python3 python/pid_tune.py capture --joint 1 [--program ngc/tune_xy.ngc] [--yes]
+#   python3 python/pid_tune.py fit --joint 1 [--ring FILE]
+#
+# Suggestions are printed only - copy them into Rover13s.ini after checking.
+
+import os
+import sys
+import argparse
+import numpy as np
+import hal_sampler
+from ini_config import get_config
+
+PID_NAMES = ('pid.x', 'pid.y', 'pid.z')   # pid instance for each joint (Rover13s.hal)
+PROGRAMS = {0: 'ngc/tune_x.ngc', 1: 'ngc/tune_xy.ngc'}
+GAINS = ('P', 'I', 'D', 'FF0', 'FF1', 'FF2', 'BIAS', 'DEADBAND', 'MAX_OUTPUT', 'FERROR')
+
+def joint_pins(joint):
+    pid = PID_NAMES[joint]
+    return [f"joint.{joint}.motor-pos-cmd", f"joint.{joint}.motor-pos-fb", f"{pid}.output"]
+
+def default_ring(joint):
+    return os.path.join(os.environ.get('LINUXCNC_CONFIG_DIR', ''), 'logs', f"pid_tune_j{joint}.ring")
+
+def read_gains(joint):
+    config = get_config()
+    return {name: config.get_float(f"JOINT_{joint}", name, 0.0) for name in GAINS}
+
+def capture(args):
+    import linuxcnc
+    stat = linuxcnc.stat()
+    command = linuxcnc.command()
+    config = get_config()
+    if args.program:
+        program = os.path.abspath(args.program)
+    elif args.joint in PROGRAMS:
+        program = os.path.join(os.environ.get('LINUXCNC_CONFIG_DIR', ''), PROGRAMS[args.joint])
+    else:
+        print(f"No tuning program for joint {args.joint} - use --program")
+        sys.exit(1)
+
+    stat.poll()
+    if stat.task_state != linuxcnc.STATE_ON or stat.interp_state != linuxcnc.INTERP_IDLE:
+        print("Machine must be on and idle")
+        sys.exit(1)
+    if not all(stat.homed[i] for i in range(stat.joints)):
+        print("Home the machine first")
+        sys.exit(1)
+    print(f"Runs {program} with the machine moving - keep clear of the gantry")
+    if not args.yes and input("  Continue? [y/N] ").strip().lower() not in ('y', 'yes'):
+        return
+
+    period = config.get_float('EMCMOT', 'SERVO_PERIOD', 1000000) * 1e-9
+    progress = {'launched': False, 'started': False, 'last_poll': 0}
+
+    def done(sample):
+        # Checked every 200 samples; the sampler FIFO covers the short MDI/AUTO waits
+        if sample - progress['last_poll'] < 200:
+            return False
+        progress['last_poll'] = sample
+        if not progress['launched']:
+            command.mode(linuxcnc.MODE_AUTO)
+            command.wait_complete()
+            command.program_open(program)
+            command.auto(linuxcnc.AUTO_RUN, 0)
+            progress['launched'] = True
+            return False
+        stat.poll()
+        running = stat.interp_state != linuxcnc.INTERP_IDLE
+        if running:
+            progress['started'] = True
+        if stat.task_state != linuxcnc.STATE_ON:
+            print("Warning: Machine turned off during the capture")
+            return True
+        return progress['started'] and not running
+
+    ring = args.ring or default_ring(args.joint)
+    count = hal_sampler.capture(ring, joint_pins(args.joint), 1,
+                                config.get_int('PID_TUNE', 'RING_SAMPLES', 1200000), period, done)
+    print(f"Captured {count} samples into {ring}")
+    print(f"  Next: python3 python/pid_tune.py fit --joint {args.joint}")
+
+def fit_plant(fb, out, T, max_delay=10):
+    """Fit v[k] = a*v[k-1] + b*u[k-1-d]. Returns (a, b, d, residual RMS)."""
+    v = np.diff(fb, prepend=fb[0]) / T
+    v = np.convolve(v, np.ones(5) / 5, mode='same')   # Encoder counts make raw velocity steppy
+    best = None
+    n = len(v)
+    for d in range(max_delay + 1):
+        y = v[d + 1:]
+        X = np.column_stack((v[d:n - 1], out[:n - d - 1]))
+        coef, _, _, _ = np.linalg.lstsq(X, y, rcond=None)
+        residual = np.sqrt(np.mean((X @ coef - y) ** 2))
+        if best is None or residual < best[3]:
+            best = (coef[0], coef[1], d, residual)
+    return best
+
+def simulate(cmd, T, plant, gains, start=None):
+    """Closed-loop following error of the LinuxCNC pid on the captured command.
+    gains maps P, I, D, FF0, FF1, FF2 to arrays (one entry per candidate).
+    Returns (peak |ferror|, RMS ferror, peak |output|) arrays.
+    """
+    a, b, d, _ = plant
+    P, I, D, FF0, FF1, FF2 = (np.asarray(gains[name], dtype=float) for name in ('P', 'I', 'D', 'FF0', 'FF1', 'FF2'))
+    deadband, max_output = gains['DEADBAND'], gains['MAX_OUTPUT'] or np.inf
+    m = P.shape[0]
+    # Backward differences, as the pid component derives command velocity and acceleration
+    vcmd = np.diff(cmd, prepend=cmd[0]) / T
+    acmd = np.diff(vcmd, prepend=vcmd[0]) / T
+    fb = np.full(m, cmd[0] if start is None else start)
+    v = np.zeros(m)
+    integral = np.zeros(m)
+    previous = np.zeros(m)
+    delayed = np.zeros((d + 1, m))
+    peak = np.zeros(m)
+    squares = np.zeros(m)
+    peak_output = np.zeros(m)
+    with np.errstate(over='ignore', invalid='ignore'):
+        for k in range(len(cmd)):
+            error = cmd[k] - fb
+            error = np.where(np.abs(error) > deadband, error - np.sign(error) * deadband, 0.0)
+            integral += error * T
+            output = (P * error + I * integral + D * (error - previous) / T
+                      + FF0 * cmd[k] + FF1 * vcmd[k] + FF2 * acmd[k])
+            previous = error
+            output = np.clip(output, -max_output, max_output)
+            peak_output = np.maximum(peak_output, np.abs(output))
+            delayed[k % (d + 1)] = output
+            v = a * v + b * delayed[(k - d) % (d + 1)]
+            fb = fb + v * T
+            ferror = cmd[k] - fb
+            peak = np.maximum(peak, np.abs(ferror))
+            squares += ferror * ferror
+    rms = np.sqrt(squares / len(cmd))
+    return peak, rms, peak_output
+
+def candidates(current, K, tau):
+    """Grid of gain sets around the current values and the model's ideal feed-forward"""
+    ff1 = 1.0 / K                  # Output per unit/s that holds the commanded velocity
+    ff2 = tau / K                  # Output per unit/s^2 that covers the drive lag
+    P0 = current['P'] or 1.0
+    I0 = current['I'] or P0 / 100
+    grid = np.meshgrid(np.geomspace(P0 / 4, P0 * 4, 9),
+                       np.concatenate(([0.0], np.geomspace(I0 / 4, I0 * 4, 5))),
+                       ff1 * np.array([0.8, 0.9, 1.0, 1.1, 1.2]),
+                       ff2 * np.array([0.0, 0.5, 1.0]), indexing='ij')
+    P, I, FF1, FF2 = (axis.ravel() for axis in grid)
+    gains = {'P': np.append(P, current['P']), 'I': np.append(I, current['I']),
+             'D': np.full(P.size + 1, current['D']), 'FF0': np.full(P.size + 1, current['FF0']),
+             'FF1': np.append(FF1, current['FF1']), 'FF2': np.append(FF2, current['FF2']),
+             'DEADBAND': current['DEADBAND'], 'MAX_OUTPUT': current['MAX_OUTPUT']}
+    return gains
+
+def fit(args):
+    ring = args.ring or default_ring(args.joint)
+    header, t, channels = hal_sampler.load(ring)
+    cmd_pin, fb_pin, out_pin = joint_pins(args.joint)
+    cmd, fb, out = channels[cmd_pin], channels[fb_pin], channels[out_pin]
+    T = header['period'] * header['decimation']
+    current = read_gains(args.joint)
+    margin = get_config().get_float('PID_TUNE', 'MARGIN', 0.25)
+    limit = current['FERROR'] * margin
+
+    plant = fit_plant(fb, out, T)
+    a, b, d, residual = plant
+    if not 0 < a < 1 or b == 0:
+        print(f"Could not identify the drive (a={a:.4f}, b={b:.4g}) - capture with more motion")
+        sys.exit(1)
+    K = b / (1 - a)
+    tau = -T / np.log(a)
+    measured = cmd - fb
+    print(f"Joint {args.joint}: {len(cmd)} samples, {t[-1] - t[0]:.1f}s at {1 / T:.0f} Hz")
+    print(f"  Drive: {K:.3f} units/s per output unit, lag {tau * 1000:.1f} ms, dead time {d * T * 1000:.0f} ms "
+          f"(velocity fit residual {residual:.3f} units/s)")
+    print(f"  Measured ferror: peak {np.abs(measured).max():.4f}  rms {np.sqrt(np.mean(measured ** 2)):.4f}  "
+          f"(FERROR {current['FERROR']:g}, target peak < {limit:.3f})")
+
+    gains = candidates(current, K, tau)
+    peak, rms, peak_output = simulate(cmd, T, plant, gains, fb[0])
+    print(f"  Model with current gains: peak {peak[-1]:.4f}  rms {rms[-1]:.4f}")
+    if not np.isclose(peak[-1], np.abs(measured).max(), rtol=1.0):
+        print("  Warning: the model does not reproduce the measured error well - treat suggestions with care")
+
+    feasible = np.isfinite(peak) & (peak < limit) & (peak_output < (current['MAX_OUTPUT'] or np.inf))
+    if not feasible.any():
+        print("  No candidate keeps the peak within the margin - check the drive and mechanics first")
+        sys.exit(1)
+    # Equal weight on peak and RMS, each relative to the current gains
+    score = np.where(feasible, peak / peak[-1] + rms / rms[-1], np.inf)
+    best = int(np.argmin(score))
+    print(f"  Suggested: peak {peak[best]:.4f}  rms {rms[best]:.4f}  output peak {peak_output[best]:.2f}")
+    print(f"\n[JOINT_{args.joint}]")
+    for name in ('P', 'I', 'FF1', 'FF2'):
+        print(f"{name} = {gains[name][best]:.6g}    # was {current[name]:g}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture a tuning run and suggest PID/feed-forward gains")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    cap = sub.add_parser('capture', help="Run a tuning program while sampling the joint")
+    cap.add_argument('--joint', type=int, required=True, choices=range(len(PID_NAMES)))
+    cap.add_argument('--program')
+    cap.add_argument('--ring')
+    cap.add_argument('--yes', action='store_true', help="Do not ask before moving the machine")
+    fit_cmd = sub.add_parser('fit', help="Identify the drive and suggest gains from a capture")
+    fit_cmd.add_argument('--joint', type=int, required=True, choices=range(len(PID_NAMES)))
+    fit_cmd.add_argument('--ring')
+    args = parser.parse_args()
+
+    if args.cmd == 'capture':
+        capture(args)
+    else:
+        fit(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Per-program run records.
+#
+# machine_timers feeds a RunTracker from halui program-is-running/is-paused.
+# Every run is stored in the program_runs table (timers_db.py) with its wall,
+# cutting (spindle on), tool change and pause time and the tool sequence,
+# keyed by the SHA-256 of the program file so repeated runs of the same nest
+# can be compared even if the file is renamed.
+#
+# A run is 'ended' when the interpreter read the program end (first M2/M30,
+# else the last line), 'aborted' when it stopped before that or an error was
+# reported, and 'interrupted' when the machine went off. Only ended runs count
+# in the stats. The file is hashed and scanned in a thread, off the HAL loop.
+#
+#   python3 python/program_runs.py list [-n N] [--program NAME]
+#   python3 python/program_runs.py stats                 Per-program run time spread
+#   python3 python/program_runs.py slow [--factor 1.2]   Runs slower than the program's median
+#   python3 python/program_runs.py compare FILE SECONDS  Check a cycle-time estimate
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+import threading
+import statistics
+import timers_db
+from ngc_index import file_hash, parse_block
+
+def scan_program(path):
+    """(SHA-256 as file_hash() gives it, line of the program end) in one pass"""
+    h = hashlib.sha256()
+    end_line = None
+    last_code = 0
+    with open(path, 'rb') as f:
+        for line_no, raw in enumerate(f, 1):
+            h.update(raw)
+            if end_line is not None:
+                continue
+            code, words = parse_block(raw.decode('utf-8', 'replace'))
+            if code and code != '%':
+                last_code = line_no
+            if ('M', 2.0) in words or ('M', 30.0) in words:
+                end_line = line_no
+    return h.hexdigest(), end_line or last_code
+
+class RunTracker:
+    """Times one program run at a time from the machine_timers update loop"""
+
+    def __init__(self, submit):
+        self.submit = submit
+        self.run = None
+        self.last = 0.0
+
+    def start(self, now, program, tool):
+        self.run = {'program': program, 'file_hash': '', 'start': now,
+                    'cutting_time': 0.0, 'tool_change_time': 0.0, 'pause_time': 0.0,
+                    'tools': [tool] if tool else [], 'end_line': 0, 'read_line': 0, 'error': False}
+        # Large nest files take a while to hash - keep it off the HAL loop
+        self.scanner = threading.Thread(target=self.scan, args=(self.run,), daemon=True)
+        self.scanner.start()
+        self.last = now
+
+    def scan(self, run):
+        try:
+            run['file_hash'], run['end_line'] = scan_program(run['program'])
+        except OSError as e:
+            print(f"Warning: Failed to hash {run['program']}: {e}")
+
+    def update(self, now, running, paused, spindle_on, tool_changing, tool, machine_on, program='',
+               read_line=0, error=False):
+        """running/paused are halui's is-running/is-paused (running is False while paused).
+        program is '' for MDI, which is not recorded as a run. read_line is
+        stat.read_line; error is True when an error was reported during the run.
+        """
+        if self.run is None:
+            if running and program:
+                self.start(now, program, tool)
+            return
+        self.run['read_line'] = max(self.run['read_line'], read_line)
+        self.run['error'] = self.run['error'] or error
+        dt = now - self.last
+        self.last = now
+        # Time is charged to the state seen at the end of the poll
+        if paused:
+            self.run['pause_time'] += dt
+        elif spindle_on:
+            self.run['cutting_time'] += dt
+        elif tool_changing:
+            self.run['tool_change_time'] += dt
+        if tool and (not self.run['tools'] or self.run['tools'][-1] != tool):
+            self.run['tools'].append(tool)
+        if not running and not paused:
+            self.finish(now, 'ended' if machine_on else 'interrupted')
+
+    def finish(self, now, result):
+        run, self.run = self.run, None
+        run['end'] = now
+        run['wall_time'] = now - run['start']
+        run['result'] = result
+        run['tools'] = ' '.join(str(tool) for tool in run['tools'])
+        if self.scanner.is_alive():
+            # Record once the scan is done, without waiting in the HAL loop
+            threading.Thread(target=self.record, args=(run, self.scanner), daemon=True).start()
+        else:
+            self.record(run, self.scanner)
+
+    def record(self, run, scanner):
+        scanner.join()
+        error, read_line, end_line = run.pop('error'), run.pop('read_line'), run.pop('end_line')
+        # Readahead can reach M2 before an abort - that run still counts as ended
+        if run['result'] == 'ended' and (error or read_line < end_line):
+            run['result'] = 'aborted'
+        self.submit('program_run', run)
+        print(f"Program run: {os.path.basename(run['program'])} {run['wall_time']:.1f}s "
+              f"(cutting {run['cutting_time']:.1f}s, tools {run['tools'] or '-'}, {run['result']})")
+
+    def stop(self, now):
+        """Record a run still open at shutdown"""
+        if self.run is not None:
+            self.finish(now, 'interrupted')
+
+def program_stats(conn):
+    """Per file hash: (program, runs, median/min/max wall time, median cutting time) from ended runs"""
+    runs = {}
+    for program, digest, wall, cutting in conn.execute(
+            """SELECT program, file_hash, wall_time, cutting_time FROM program_runs
+               WHERE result = 'ended' ORDER BY start"""):
+        entry = runs.setdefault(digest, {'program': program, 'wall': [], 'cutting': []})
+        entry['program'] = program  # Latest name
+        entry['wall'].append(wall)
+        entry['cutting'].append(cutting)
+    stats = {}
+    for digest, entry in runs.items():
+        stats[digest] = {'program': entry['program'], 'runs': len(entry['wall']),
+                         'median': statistics.median(entry['wall']),
+                         'min': min(entry['wall']), 'max': max(entry['wall']),
+                         'cutting': statistics.median(entry['cutting'])}
+    return stats
+
+def format_run(row):
+    program, start, wall, cutting, tool_change, pause, tools, result = row
+    when = time.strftime('%Y-%m-%d %H:%M', time.localtime(start))
+    return (f"{when}  {os.path.basename(program):<24} {wall:8.1f}s  cut {cutting:7.1f}s  "
+            f"tc {tool_change:6.1f}s  pause {pause:6.1f}s  {result:<11} T {tools}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Program run records from the timers database")
+    parser.add_argument('--db', default=None, help="Timers database (default logs/machine_timers.db)")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    list_cmd = sub.add_parser('list', help="Latest runs")
+    list_cmd.add_argument('-n', type=int, default=20)
+    list_cmd.add_argument('--program', help="Only runs of this program (file name)")
+    sub.add_parser('stats', help="Run time spread per program")
+    slow = sub.add_parser('slow', help="Runs slower than their program's median")
+    slow.add_argument('--factor', type=float, default=1.2)
+    compare = sub.add_parser('compare', help="Compare a cycle-time estimate with the recorded runs")
+    compare.add_argument('file')
+    compare.add_argument('seconds', type=float)
+    args = parser.parse_args()
+
+    conn = timers_db.connect(args.db or timers_db.default_db_path())
+    columns = "program, start, wall_time, cutting_time, tool_change_time, pause_time, tools, result"
+    if args.cmd == 'list':
+        if args.program:
+            rows = conn.execute(f"""SELECT {columns} FROM program_runs WHERE program = ? OR program LIKE ?
+                                    ORDER BY start DESC LIMIT ?""", (args.program, '%/' + args.program, args.n)).fetchall()
+        else:
+            rows = conn.execute(f"SELECT {columns} FROM program_runs ORDER BY start DESC LIMIT ?", (args.n,)).fetchall()
+        for row in reversed(rows):
+            print(format_run(row))
+    elif args.cmd == 'stats':
+        for digest, s in sorted(program_stats(conn).items(), key=lambda item: item[1]['program']):
+            print(f"{os.path.basename(s['program']):<24} {digest[:12]}  runs {s['runs']:4d}  median {s['median']:8.1f}s  "
+                  f"min {s['min']:8.1f}s  max {s['max']:8.1f}s  cutting {s['cutting']:8.1f}s")
+    elif args.cmd == 'slow':
+        stats = program_stats(conn)
+        for row in conn.execute(f"SELECT {columns}, file_hash FROM program_runs WHERE result = 'ended' ORDER BY start"):
+            s = stats.get(row[-1])
+            if s and s['runs'] > 1 and row[2] > s['median'] * args.factor:
+                print(f"{format_run(row[:-1])}  ({row[2] / s['median']:.2f}x median)")
+    else:
+        digest = file_hash(args.file)
+        s = program_stats(conn).get(digest)
+        if s is None:
+            print(f"No completed runs of {args.file} (hash {digest[:12]})")
+            sys.exit(1)
+        print(f"{args.file}: {s['runs']} runs, median {s['median']:.1f}s (min {s['min']:.1f}s, max {s['max']:.1f}s)")
+        print(f"Estimate {args.seconds:.1f}s is {args.seconds / s['median']:.2f}x the median actual time "
+              f"- scale estimates by {s['median'] / args.seconds:.3f}")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,11 @@ import linuxcnc
 import time  # Add import for sleep function
 import emccanon
 from itertools import count
+from ini_config import get_config
+
+# motion.digital-out-20 is high while remap_m6 runs (machine_timers.tool_changing).
+# iocontrol.0.tool-change only pulses for the final handshake of a remapped M6.
+TOOL_CHANGE_PIN = 20
 
 def get_simple_tools():
     """Dynamically build the simple_tools dictionary from the tool table.
@@ -84,8 +89,11 @@ def get_simple_tools():
     
     return simple_tools
 
-def wait_for_input(stat, index, expected_state=True, timeout=5):
-    """Wait for digital input to reach expected_state within timeout."""
+def wait_for_input(stat, index, expected_state=True, timeout=None):
+    """Wait for digital input to reach expected_state within timeout.
+    Default timeout comes from [TOOL_CHANGE]ACTUATOR_TIMEOUT in the INI."""
+    if timeout is None:
+        timeout = get_config().get_float('TOOL_CHANGE', 'ACTUATOR_TIMEOUT', 5.0)
     start_time = time.time()
     while time.time() - start_time < timeout:
         stat.poll()
@@ -149,6 +157,10 @@ def remap_m6(self, **params):
         yield INTERP_ERROR
 
     try:
+        # Flag the tool change once the moves before it have finished
+        yield INTERP_EXECUTE_FINISH
+        self.execute(f"M64 P{TOOL_CHANGE_PIN}")
+
         # --- Release all outputs first ---
         print(f"Tool change: T{previous_tool} -> T{tool_number}")
         print(f"Current Mode: {mode_names.get(stat.task_mode, 'Unknown')}")  # Get fresh mode info
@@ -294,7 +306,7 @@ def remap_m6(self, **params):
                     self.execute("M65 P13")
                     yield INTERP_EXECUTE_FINISH
                     stat.poll()
-                    if not wait_for_input(stat, 3, True, timeout=5):
+                    if not wait_for_input(stat, 3, True):
                         print("⚠️ Router did not reach down position!")
             else:
                 # Switching to router from non-router tool
@@ -306,7 +318,7 @@ def remap_m6(self, **params):
                 yield INTERP_EXECUTE_FINISH
                 print("Waiting for router to reach down position...")
                 stat.poll()
-                if not wait_for_input(stat, 3, True, timeout=5):
+                if not wait_for_input(stat, 3, True):
                     print("⚠️ Router did not reach down position!")
 
         elif tool_number == 19:  # Saw
@@ -318,7 +330,7 @@ def remap_m6(self, **params):
                 yield INTERP_EXECUTE_FINISH
                 print("Waiting for saw blade to reach down position...")
                 stat.poll()
-                if not wait_for_input(stat, 1, True, timeout=5):
+                if not wait_for_input(stat, 1, True):
                     print("⚠️ Saw blade did not reach down position!")
 
         elif tool_number == 17:
@@ -354,6 +366,8 @@ def remap_m6(self, **params):
         tool_data = next((t for t in stat.tool_table if t.id == tool_number), None)
         if not tool_data:
             print(f"❌ Tool ID {tool_number} not found in tool table.")
+            self.execute(f"M65 P{TOOL_CHANGE_PIN}")
+            yield INTERP_EXECUTE_FINISH
             yield INTERP_ERROR
         else:
             # Use tool's own offsets for tool length compensation (X, Y, Z, diameter)
@@ -367,6 +381,8 @@ def remap_m6(self, **params):
 
             if tool_number <= 0:
                 print(f"Invalid tool number for G10: {tool_number}")
+                self.execute(f"M65 P{TOOL_CHANGE_PIN}")
+                yield INTERP_EXECUTE_FINISH
                 yield INTERP_ERROR
             else:
                 self.execute(g10_cmd)
@@ -377,18 +393,25 @@ def remap_m6(self, **params):
                 emccanon.CHANGE_TOOL(tool_number)
         
         print(f"✅ Tool change to T{tool_number} complete.")
+        self.execute(f"M65 P{TOOL_CHANGE_PIN}")
         # Queue buster: flush readahead so LinuxCNC doesn't report "Queue not empty after toolchange"
         yield INTERP_EXECUTE_FINISH
         yield INTERP_OK
 
     except Exception as e:
         print(f"❌ Error in remap_m6: {e}")
+        self.execute(f"M65 P{TOOL_CHANGE_PIN}")
         yield INTERP_EXECUTE_FINISH
         yield INTERP_ERROR
 
 def remap_m3(self, **params):
     """Handle M3 (spindle on) command"""
     import linuxcnc
+    
+    # Queue buster: stat reflects what motion has executed, not readahead, so
+    # wait for the queue to drain before reading the spindle and tool state
+    if self.task:
+        yield INTERP_EXECUTE_FINISH
     stat = linuxcnc.stat()
     stat.poll()
     
@@ -404,6 +427,26 @@ def remap_m3(self, **params):
         self.execute("M64 P17")
         yield INTERP_EXECUTE_FINISH
     
+    # Router spindle: warm up first if it has been idle, only when starting
+    # from stopped in a program (not MDI)
+    elif (self.task and stat.task_mode == linuxcnc.MODE_AUTO
+          and not stat.spindle[0]['enabled']):
+        try:
+            from warmup_scheduler import WarmupScheduler
+            profile, steps, idle = WarmupScheduler().decide(current_tool)
+        except Exception as e:
+            print(f"Warning: Warm-up check failed: {e}")
+            profile, steps = None, []
+        if profile:
+            requested = self.speed[0]
+            print(f"Spindle warm-up ({profile}) before T{current_tool}")
+            # M3 inside its own remap runs the built-in M3
+            for rpm, seconds in steps:
+                self.execute(f"M3 S{rpm:.0f}")
+                self.execute(f"G4 P{seconds:.1f}")
+            self.execute(f"S{requested:.0f}")
+            yield INTERP_EXECUTE_FINISH
+    
     yield INTERP_OK
 
 def remap_m5(self, **params):
@@ -489,8 +532,10 @@ def motion_prolog(self, **words):
         
         # Material surface is typically at Z=0 in work coordinates
         # Blade is engaged if Z < 0 (below material surface)
-        # You can adjust this threshold if needed (e.g., Z < 0.5 for safety margin)
-        MATERIAL_SURFACE_Z = 0.0  # Z=0 is typically the material surface
+        # Adjust the threshold with [TOOL_CHANGE]MATERIAL_SURFACE_Z (e.g., 0.5 for safety margin)
+        config = get_config()
+        config.reload_if_changed()
+        MATERIAL_SURFACE_Z = config.get_float('TOOL_CHANGE', 'MATERIAL_SURFACE_Z', 0.0)
         blade_engaged = current_z < MATERIAL_SURFACE_Z
         
         if blade_engaged:
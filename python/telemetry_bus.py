@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Shared-memory telemetry snapshot.
+#
+# One publisher reads the machine's HAL pins every [TELEMETRY]INTERVAL and
+# writes them into a fixed-layout file in /dev/shm. Readers in any process
+# (GUIs, scripts, exporters) map the file and read it without HAL, halcmd or
+# SQLite - adding a reader adds no load on HAL.
+#
+# A sequence counter makes each snapshot consistent without locks (seqlock):
+# the publisher makes it odd, writes the values, then makes it even. A reader
+# copies the values between two reads of the counter and retries if it was
+# odd or changed. x86 keeps stores in order, which this relies on.
+#
+#   python3 python/telemetry_bus.py                  Run the publisher (loadusr)
+#   python3 python/telemetry_bus.py show [NAME ...]  Print the current snapshot
+#   python3 python/telemetry_bus.py get NAME         Print one value (for shell scripts)
+#   python3 python/telemetry_bus.py stress [--seconds S] [--no-seqlock]
+#                                                    Two-process torn-read check
+#
+# Layout (little endian, version 1):
+#   header  magic 'RVT1', version u16, count u16, layout crc32 u32, reserved u32,
+#           sequence u64, wall time f64, monotonic time f64 (all 8-byte aligned)
+#   names   count x 48 bytes, NUL padded (HAL pin, signal or parameter name)
+#   values  count x f64 - bits are 0/1, integers exact, NaN when unreadable
+# The layout crc32 covers the names, so a reader can keep name -> index maps
+# for as long as it stays the same.
+
+import os
+import sys
+import mmap
+import time
+import zlib
+import struct
+import signal
+import argparse
+from ini_config import get_config
+
+MAGIC = b'RVT1'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIQdd')
+SEQ = struct.Struct('<Q')
+SEQ_OFFSET = 16
+TIMES = struct.Struct('<dd')
+TIMES_OFFSET = 24
+NAME_SIZE = 48
+DEFAULT_PATH = '/dev/shm/rover_telemetry'
+
+# Published for every machine; [TELEMETRY]PINS adds more
+DEFAULT_PINS = """
+    halui.machine.is-on halui.program.is-running halui.program.is-paused halui.feed-override.value
+    joint.0.pos-fb joint.1.pos-fb joint.2.pos-fb joint.0.f-error joint.1.f-error joint.2.f-error
+    machine_enable.enable_machine machine_enable.enable_axes machine_enable.estop_ok
+    work_area.left_button work_area.right_button work_area.work_area_setup
+    work_area.left_setup work_area.right_setup work_area.left_ready work_area.right_ready
+    vfd_control.vfd_run vfd_control.fault_active vfd_control.vfd_speed vfd_control.spindle_speed_est
+    vfd_control.spindle_at_speed
+    tool_release.tool_locked tool_release.tool_released tool_release.error_active
+    tool_release.lock_time_p90 tool_release.lock_time_warning tool_release.cycle_count
+    vacuum.vacuum_ok vacuum.suction_on vacuum.low_vacuum vacuum.vacuum_hold vacuum.dip_time
+    machine_timers.machine_running machine_timers.spindle_on machine_timers.current_tool
+    machine_timers.current_tool_time machine_timers.total_spindle_time machine_timers.total_machine_time
+    ferror_monitor.warning ferror_monitor.feed_reduced
+    ferror_monitor.joint0_level ferror_monitor.joint1_level ferror_monitor.joint2_level
+    axis_odometry.joint0_distance axis_odometry.joint1_distance axis_odometry.joint2_distance
+    supervisor.fault supervisor.stall_count
+"""
+
+def names_offset():
+    return HEADER.size
+
+def values_offset(count):
+    return HEADER.size + count * NAME_SIZE
+
+def layout_crc(names):
+    return zlib.crc32('\0'.join(names).encode())
+
+class TelemetryWriter:
+    """Owns the snapshot file; publish() replaces all values under the seqlock"""
+
+    def __init__(self, path, names):
+        self.names = names
+        self.values = struct.Struct(f"<{len(names)}d")
+        self.offset = values_offset(len(names))
+        size = self.offset + self.values.size
+        # New file, then rename: readers of a previous layout keep their own mapping
+        tmp = f"{path}.{os.getpid()}"
+        with open(tmp, 'wb') as f:
+            f.truncate(size)
+        self.file = open(tmp, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), size)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, len(names), layout_crc(names), 0, 0, 0.0, 0.0)
+        for i, name in enumerate(names):
+            start = names_offset() + i * NAME_SIZE
+            self.map[start:start + NAME_SIZE] = name.encode()[:NAME_SIZE].ljust(NAME_SIZE, b'\0')
+        self.values.pack_into(self.map, self.offset, *([float('nan')] * len(names)))
+        os.replace(tmp, path)
+        self.seq = 0
+
+    def publish(self, values):
+        self.seq += 1                 # Odd: write in progress
+        SEQ.pack_into(self.map, SEQ_OFFSET, self.seq)
+        self.values.pack_into(self.map, self.offset, *values)
+        TIMES.pack_into(self.map, TIMES_OFFSET, time.time(), time.monotonic())
+        self.seq += 1                 # Even: snapshot complete
+        SEQ.pack_into(self.map, SEQ_OFFSET, self.seq)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+class TelemetryReader:
+    """Maps the snapshot file read-only. snapshot() and get() never block the publisher."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.map = None
+        self.open()
+
+    def open(self):
+        if self.map is not None:
+            self.map.close()
+        with open(self.path, 'rb') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, self.layout = HEADER.unpack_from(self.map, 0)[:4]
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} telemetry file")
+        self.names = [self.map[names_offset() + i * NAME_SIZE:names_offset() + (i + 1) * NAME_SIZE]
+                      .rstrip(b'\0').decode() for i in range(count)]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.offset = values_offset(count)
+        self.values = struct.Struct(f"<{count}d")
+
+    def reopen_if_replaced(self):
+        """Follow a restarted publisher (new file, possibly a new layout). Returns True if reopened."""
+        try:
+            if os.stat(self.path).st_ino == self.inode:
+                return False
+        except OSError:
+            return False
+        self.open()
+        return True
+
+    def read(self, retries=1000):
+        """(values tuple, wall time, monotonic time) from one consistent snapshot"""
+        for _ in range(retries):
+            before = SEQ.unpack_from(self.map, SEQ_OFFSET)[0]
+            if before & 1:
+                time.sleep(0)         # Publisher mid-write - let it finish
+                continue
+            values = self.values.unpack_from(self.map, self.offset)
+            wall, mono = TIMES.unpack_from(self.map, TIMES_OFFSET)
+            if SEQ.unpack_from(self.map, SEQ_OFFSET)[0] == before:
+                return values, wall, mono
+        raise RuntimeError("telemetry publisher kept writing - no consistent snapshot")
+
+    def snapshot(self):
+        """{name: value} from one consistent snapshot"""
+        values, _, _ = self.read()
+        return dict(zip(self.names, values))
+
+    def get(self, name):
+        """One value - an aligned 8-byte read, so it needs no retry"""
+        return struct.unpack_from('<d', self.map, self.offset + self.index[name] * 8)[0]
+
+    def age(self):
+        """Seconds since the last publish (CLOCK_MONOTONIC is system wide)"""
+        return time.monotonic() - TIMES.unpack_from(self.map, TIMES_OFFSET)[1]
+
+    def close(self):
+        self.map.close()
+
+class TelemetryBus:
+    def __init__(self):
+        import hal
+        from heartbeat import Heartbeat
+        self.hal = hal
+        self.h = hal.component("telemetry_bus")
+        config = get_config()
+        self.INTERVAL = config.get_float('TELEMETRY', 'INTERVAL', 0.05)     # Seconds between snapshots
+        self.PATH = config.get_str('TELEMETRY', 'PATH', DEFAULT_PATH)
+        components = config.get_str('SUPERVISOR', 'COMPONENTS', '').split()
+        names = DEFAULT_PINS.split() + config.get_str('TELEMETRY', 'PINS', '').split()
+        names += [f"{name}.last_update" for name in components] + [f"supervisor.{name}_stalled" for name in components]
+        self.names = list(dict.fromkeys(names))   # Fixed order, duplicates dropped
+        self.missing = set()
+        self.writer = TelemetryWriter(self.PATH, self.names)
+        self.heartbeat = Heartbeat(self.h)
+        self.h.ready()
+        print(f"Telemetry bus: {len(self.names)} values every {self.INTERVAL * 1000:.0f}ms in {self.PATH}")
+
+    def read_value(self, name):
+        try:
+            value = float(self.hal.get_value(name))
+            self.missing.discard(name)
+            return value
+        except Exception:
+            if name not in self.missing:
+                print(f"Warning: Telemetry bus cannot read {name}")
+                self.missing.add(name)
+            return float('nan')
+
+    def update(self):
+        self.heartbeat.beat()
+        self.writer.publish([self.read_value(name) for name in self.names])
+
+    def shutdown(self):
+        self.writer.close()
+
+def stress(path, seconds, seqlock=True):
+    """Publish from a child process and read in this one. Every snapshot holds one
+    value repeated, so a mix of values is a torn read. Returns (reads, torn).
+    """
+    names = [f"stress.{i}" for i in range(64)]
+    writer = TelemetryWriter(path, names)
+    writer.publish([0.0] * len(names))   # Replace the initial NaNs, which never compare equal
+    pid = os.fork()
+    if pid == 0:
+        end = time.monotonic() + seconds
+        k = 0
+        while time.monotonic() < end:
+            k += 1
+            if seqlock:
+                writer.publish([float(k)] * len(names))
+            else:
+                writer.values.pack_into(writer.map, writer.offset, *([float(k)] * len(names)))
+        os._exit(0)
+    reader = TelemetryReader(path)
+    reads = torn = 0
+    try:
+        while os.waitpid(pid, os.WNOHANG) == (0, 0):
+            if seqlock:
+                values = reader.read()[0]
+            else:
+                values = reader.values.unpack_from(reader.map, reader.offset)
+            reads += 1
+            if min(values) != max(values):
+                torn += 1
+    finally:
+        reader.close()
+        writer.close()
+        os.unlink(path)
+    return reads, torn
+
+def handle_sigterm(signum, frame):
+    # LinuxCNC stops userspace components with SIGTERM - shut down like Ctrl-C
+    raise KeyboardInterrupt
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-memory telemetry snapshot")
+    parser.add_argument('--path', default=None, help=f"Snapshot file (default [TELEMETRY]PATH or {DEFAULT_PATH})")
+    sub = parser.add_subparsers(dest='cmd')
+    show = sub.add_parser('show', help="Print the snapshot")
+    show.add_argument('names', nargs='*')
+    get = sub.add_parser('get', help="Print one value")
+    get.add_argument('name')
+    check = sub.add_parser('stress', help="Two-process torn-read check on a scratch file")
+    check.add_argument('--seconds', type=float, default=5.0)
+    check.add_argument('--no-seqlock', action='store_true', help="Read and write without the sequence counter")
+    args = parser.parse_args()
+
+    if args.cmd is None:
+        bus = TelemetryBus()
+        signal.signal(signal.SIGTERM, handle_sigterm)
+        try:
+            while True:
+                start = time.monotonic()
+                bus.update()
+                time.sleep(max(0.0, bus.INTERVAL - (time.monotonic() - start)))
+        except KeyboardInterrupt:
+            bus.shutdown()
+            raise SystemExit
+
+    if args.cmd == 'stress':
+        path = args.path or f"{DEFAULT_PATH}_stress.{os.getpid()}"
+        reads, torn = stress(path, args.seconds, not args.no_seqlock)
+        print(f"{reads} snapshots, {torn} torn ({100.0 * torn / max(reads, 1):.2f}%)"
+              f"{' without the seqlock' if args.no_seqlock else ''}")
+        sys.exit(1 if torn and not args.no_seqlock else 0)
+
+    path = args.path or get_config().get_str('TELEMETRY', 'PATH', DEFAULT_PATH)
+    try:
+        reader = TelemetryReader(path)
+        if args.cmd == 'get':
+            print(f"{reader.get(args.name):g}")
+            return
+        snapshot = reader.snapshot()
+        for name in args.names or reader.names:
+            print(f"{name:<40} {snapshot[name]:g}")
+        print(f"Published {reader.age():.3f}s ago")
+    except KeyError as e:
+        print(f"Error: {e.args[0]} is not published")
+        sys.exit(1)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
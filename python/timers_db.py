@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Schema, migration, rollups and retention for logs/machine_timers.db.
+#
+#   python3 python/timers_db.py migrate [DB]    Upgrade an existing database in place
+#   python3 python/timers_db.py compact [DB]    Apply [MACHINE_TIMERS]RETENTION_DAYS now
+#   python3 python/timers_db.py rollup [DB]     Print the daily rollup
+#
+# Schema version 2 (PRAGMA user_version):
+#   events          id, ts (epoch seconds), event_type, details, duration, tool
+#   tool_times      tool_number PRIMARY KEY, total_time, updated_at
+#   accumulated_times key PRIMARY KEY, value (also first_event_ts)
+#   rollup_hourly   hour (epoch of the hour), spindle_time, spindle_starts, tool_changes
+#   rollup_daily    day (YYYY-MM-DD local), same columns
+#
+# Schema version 3 adds the machine state tables used by oee_analytics.py:
+#   state_intervals id, start, end (epoch seconds), state, tool, program
+#   state_hourly    hour, state, tool, program -> seconds
+#
+# Schema version 4 adds program_runs (program_runs.py): one row per program run
+# with file_hash, start, end, wall/cutting/tool change/pause time, tools, result.
+#
+# Schema version 5 adds the joint odometry tables (axis_odometry.py):
+#   axis_odometry   joint PRIMARY KEY, distance (m), reversals, moving_time,
+#                   lube_distance (distance at the last lube), lube_ts, updated_at
+#   axis_bins       joint, bin, low, high -> moving time, distance, reversals
+#
+# Version 0/1 is the original layout with TEXT timestamps and an unkeyed tool_times.
+
+import os
+import re
+import sys
+import time
+import sqlite3
+from datetime import datetime
+from ini_config import get_config
+
+SCHEMA_VERSION = 5
+
+DURATION = re.compile(r'Duration:\s*([\d.]+)s')
+TOOL = re.compile(r'(?:Tool|To):\s*(-?\d+)')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    event_type TEXT NOT NULL,
+    details TEXT,
+    duration REAL,
+    tool INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_type_ts ON events (event_type, ts);
+CREATE TABLE IF NOT EXISTS accumulated_times (key TEXT PRIMARY KEY, value REAL);
+CREATE TABLE IF NOT EXISTS tool_times (
+    tool_number INTEGER PRIMARY KEY,
+    total_time REAL NOT NULL DEFAULT 0,
+    updated_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS rollup_hourly (
+    hour INTEGER PRIMARY KEY,
+    spindle_time REAL NOT NULL DEFAULT 0,
+    spindle_starts INTEGER NOT NULL DEFAULT 0,
+    tool_changes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rollup_daily (
+    day TEXT PRIMARY KEY,
+    spindle_time REAL NOT NULL DEFAULT 0,
+    spindle_starts INTEGER NOT NULL DEFAULT 0,
+    tool_changes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS state_intervals (
+    id INTEGER PRIMARY KEY,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    state TEXT NOT NULL,
+    tool INTEGER NOT NULL DEFAULT 0,
+    program TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS state_intervals_start ON state_intervals (start);
+CREATE TABLE IF NOT EXISTS state_hourly (
+    hour INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    tool INTEGER NOT NULL DEFAULT 0,
+    program TEXT NOT NULL DEFAULT '',
+    seconds REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, state, tool, program)
+);
+CREATE TABLE IF NOT EXISTS program_runs (
+    id INTEGER PRIMARY KEY,
+    program TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    wall_time REAL NOT NULL,
+    cutting_time REAL NOT NULL DEFAULT 0,
+    tool_change_time REAL NOT NULL DEFAULT 0,
+    pause_time REAL NOT NULL DEFAULT 0,
+    tools TEXT NOT NULL DEFAULT '',
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS program_runs_start ON program_runs (start);
+CREATE INDEX IF NOT EXISTS program_runs_hash ON program_runs (file_hash, start);
+CREATE TABLE IF NOT EXISTS axis_odometry (
+    joint INTEGER PRIMARY KEY,
+    distance REAL NOT NULL DEFAULT 0,
+    reversals INTEGER NOT NULL DEFAULT 0,
+    moving_time REAL NOT NULL DEFAULT 0,
+    lube_distance REAL NOT NULL DEFAULT 0,
+    lube_ts INTEGER,
+    updated_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS axis_bins (
+    joint INTEGER NOT NULL,
+    bin INTEGER NOT NULL,
+    low REAL NOT NULL,
+    high REAL NOT NULL,
+    moving_time REAL NOT NULL DEFAULT 0,
+    distance REAL NOT NULL DEFAULT 0,
+    reversals INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (joint, bin)
+);
+"""
+
+def default_db_path():
+    return os.path.join(os.environ.get('LINUXCNC_CONFIG_DIR', ''), 'logs', 'machine_timers.db')
+
+def connect(path):
+    """Open the database in WAL mode, creating or migrating the schema"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")  # Readers (display) never block the writer
+    conn.execute("PRAGMA synchronous=NORMAL")
+    migrate(conn)
+    return conn
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def migrate(conn):
+    """Bring the schema up to SCHEMA_VERSION in place"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    # One transaction for the whole migration - an interrupted upgrade leaves v1 intact
+    conn.execute("BEGIN")
+    try:
+        old_events = 'timestamp' in table_columns(conn, 'events')
+        old_tools = bool(table_columns(conn, 'tool_times')) and 'updated_at' not in table_columns(conn, 'tool_times')
+        if old_events:
+            conn.execute("ALTER TABLE events RENAME TO events_v1")
+        if old_tools:
+            conn.execute("ALTER TABLE tool_times RENAME TO tool_times_v1")
+        for statement in SCHEMA.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+
+        if old_events:
+            migrate_events(conn)
+            conn.execute("DROP TABLE events_v1")
+        if old_tools:
+            migrate_tool_times(conn)
+            conn.execute("DROP TABLE tool_times_v1")
+
+        if version < 2:
+            first = conn.execute("SELECT MIN(ts) FROM events").fetchone()[0]
+            conn.execute("INSERT OR IGNORE INTO accumulated_times (key, value) VALUES ('first_event_ts', ?)",
+                         (first if first is not None else int(time.time()),))
+            rebuild_rollups(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if version > 0 or old_events:
+        print(f"Timers database migrated from version {version} to {SCHEMA_VERSION}")
+
+def migrate_events(conn):
+    """Copy v1 events (local TEXT timestamps) to the indexed table"""
+    rows = conn.execute("SELECT timestamp, event_type, details FROM events_v1 ORDER BY rowid").fetchall()
+    converted = []
+    for timestamp, event_type, details in rows:
+        try:
+            ts = int(datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').timestamp())
+        except (TypeError, ValueError):
+            continue
+        converted.append((ts, event_type, details) + parse_details(details))
+    conn.executemany("INSERT INTO events (ts, event_type, details, duration, tool) VALUES (?, ?, ?, ?, ?)",
+                     converted)
+
+def migrate_tool_times(conn):
+    """Recover per-tool totals from the unkeyed v1 table.
+    Each v1 update read the first row for the tool and appended first + duration,
+    so the total is the first row plus the increment of every later row.
+    """
+    totals = {}
+    for tool, value in conn.execute("SELECT tool_number, total_time FROM tool_times_v1 ORDER BY rowid"):
+        if tool not in totals:
+            totals[tool] = [value, value]
+        else:
+            totals[tool][1] += value - totals[tool][0]
+    now = int(time.time())
+    conn.executemany("INSERT INTO tool_times (tool_number, total_time, updated_at) VALUES (?, ?, ?)",
+                     [(tool, total, now) for tool, (_, total) in totals.items()])
+
+def parse_details(details):
+    """(duration, tool) from a details string like 'Duration: 12.5s, Tool: 20'"""
+    duration = DURATION.search(details or '')
+    tool = TOOL.search(details or '')
+    return (float(duration.group(1)) if duration else None,
+            int(tool.group(1)) if tool else None)
+
+def add_to_rollups(conn, event_type, ts, duration):
+    """Update the hourly/daily rollups for one event. Spindle run time is
+    split over the hours (and days) it covered, ending at ts.
+    """
+    if event_type == 'SPINDLE_START':
+        bump(conn, ts, 'spindle_starts', 1)
+    elif event_type == 'TOOL_CHANGE':
+        bump(conn, ts, 'tool_changes', 1)
+    elif event_type == 'SPINDLE_STOP' and duration:
+        end = float(ts)
+        start = end - duration
+        while end > start:
+            hour_start = (int(end - 1e-6) // 3600) * 3600
+            part = end - max(start, hour_start)
+            bump(conn, hour_start, 'spindle_time', part)
+            end = hour_start
+
+def bump(conn, ts, column, amount):
+    hour = (int(ts) // 3600) * 3600
+    day = datetime.fromtimestamp(ts).strftime('%Y-%m-%d')
+    conn.execute(f"INSERT INTO rollup_hourly (hour, {column}) VALUES (?, ?) "
+                 f"ON CONFLICT(hour) DO UPDATE SET {column} = {column} + excluded.{column}", (hour, amount))
+    conn.execute(f"INSERT INTO rollup_daily (day, {column}) VALUES (?, ?) "
+                 f"ON CONFLICT(day) DO UPDATE SET {column} = {column} + excluded.{column}", (day, amount))
+
+def rebuild_rollups(conn):
+    conn.execute("DELETE FROM rollup_hourly")
+    conn.execute("DELETE FROM rollup_daily")
+    for event_type, ts, duration in conn.execute("SELECT event_type, ts, duration FROM events ORDER BY id").fetchall():
+        add_to_rollups(conn, event_type, ts, duration)
+
+def insert_event(conn, ts, event_type, details, duration=None, tool=None):
+    """Insert one event and fold it into the rollups (caller commits)"""
+    conn.execute("INSERT INTO events (ts, event_type, details, duration, tool) VALUES (?, ?, ?, ?, ?)",
+                 (int(ts), event_type, details, duration, tool))
+    add_to_rollups(conn, event_type, ts, duration)
+
+def add_tool_time(conn, tool_number, duration, ts=None):
+    ts = int(time.time() if ts is None else ts)
+    conn.execute("""INSERT INTO tool_times (tool_number, total_time, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(tool_number) DO UPDATE SET total_time = total_time + excluded.total_time,
+                    updated_at = excluded.updated_at""", (tool_number, duration, ts))
+
+def add_state_time(conn, hour, state, tool, program, seconds):
+    """Add seconds spent in a state to its hourly total (caller commits)"""
+    conn.execute("""INSERT INTO state_hourly (hour, state, tool, program, seconds) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(hour, state, tool, program) DO UPDATE SET seconds = seconds + excluded.seconds""",
+                 (hour, state, tool, program, seconds))
+
+def add_state_interval(conn, start, end, state, tool, program):
+    conn.execute("INSERT INTO state_intervals (start, end, state, tool, program) VALUES (?, ?, ?, ?, ?)",
+                 (start, end, state, tool, program))
+
+def add_program_run(conn, run):
+    conn.execute("""INSERT INTO program_runs (program, file_hash, start, end, wall_time, cutting_time,
+                    tool_change_time, pause_time, tools, result)
+                    VALUES (:program, :file_hash, :start, :end, :wall_time, :cutting_time,
+                    :tool_change_time, :pause_time, :tools, :result)""", run)
+
+def add_axis_odometry(conn, joint, distance, reversals, moving_time, ts=None):
+    """Add travel to a joint's totals (caller commits)"""
+    ts = int(time.time() if ts is None else ts)
+    conn.execute("""INSERT INTO axis_odometry (joint, distance, reversals, moving_time, updated_at) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(joint) DO UPDATE SET distance = distance + excluded.distance,
+                    reversals = reversals + excluded.reversals, moving_time = moving_time + excluded.moving_time,
+                    updated_at = excluded.updated_at""", (joint, distance, reversals, moving_time, ts))
+
+def add_axis_bins(conn, joint, rows):
+    """Add (bin, low, high, moving_time, distance, reversals) rows to a joint's histogram"""
+    conn.executemany("""INSERT INTO axis_bins (joint, bin, low, high, moving_time, distance, reversals)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(joint, bin) DO UPDATE SET moving_time = moving_time + excluded.moving_time,
+                        distance = distance + excluded.distance, reversals = reversals + excluded.reversals""",
+                     [(joint,) + tuple(row) for row in rows])
+
+def compact(conn, retention_days):
+    """Delete raw events and state intervals older than retention_days.
+    The rollups and state_hourly keep their totals. Returns the number of rows removed.
+    """
+    if retention_days <= 0:
+        return 0
+    cutoff = int(time.time() - retention_days * 86400)
+    with conn:
+        removed = conn.execute("DELETE FROM events WHERE ts < ?", (cutoff,)).rowcount
+        removed += conn.execute("DELETE FROM state_intervals WHERE end < ?", (cutoff,)).rowcount
+    return removed
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('migrate', 'compact', 'rollup'):
+        print("Usage: timers_db.py migrate|compact|rollup [DB]")
+        sys.exit(1)
+    path = sys.argv[2] if len(sys.argv) > 2 else default_db_path()
+    conn = connect(path)
+    if sys.argv[1] == 'compact':
+        days = get_config().get_float('MACHINE_TIMERS', 'RETENTION_DAYS', 365)
+        print(f"Removed {compact(conn, days)} events older than {days:g} days")
+        conn.execute("VACUUM")
+    elif sys.argv[1] == 'rollup':
+        for day, spindle_time, starts, changes in conn.execute("SELECT * FROM rollup_daily ORDER BY day"):
+            print(f"{day}  spindle {spindle_time / 3600:6.2f} h  starts {starts:4d}  tool changes {changes:4d}")
+    else:
+        print(f"Schema version {conn.execute('PRAGMA user_version').fetchone()[0]}")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,14 @@
 
 import hal
 import time
+from heartbeat import Heartbeat
 from enum import Enum
 import logging
+import math
+import os
+import struct
+from collections import deque
+from ini_config import get_config
 
 # Set up logging
 logging.basicConfig(
@@ -19,6 +25,83 @@ class ToolState(Enum):
     LOCKING = 2
     ERROR = 3
 
+class CycleStats:
+    """Rolling pneumatic timing statistics with a compact on-disk history.
+    Every finished (or failed) cycle is appended to the history file as one
+    fixed-size record: wall time, release/hold/lock/cycle seconds, outcome.
+    Unknown durations are stored as NaN.
+    """
+    RECORD = struct.Struct('<dffffB')  # 25 bytes per cycle
+    OUTCOME_OK = 0
+    OUTCOME_RELEASE_TIMEOUT = 1
+    OUTCOME_LOCK_TIMEOUT = 2
+
+    def __init__(self, path, window):
+        self.path = path
+        self.release_times = deque(maxlen=window)
+        self.lock_times = deque(maxlen=window)
+        self.count = 0
+        self.load_history()
+
+    def load_history(self):
+        """Seed the rolling window from the tail of the history file"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        self.count = size // self.RECORD.size
+        window = self.lock_times.maxlen
+        start = max(0, self.count - window) * self.RECORD.size
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(start)
+                data = f.read((self.count * self.RECORD.size) - start)
+            for _, release, hold, lock, cycle, outcome in self.RECORD.iter_unpack(data):
+                self._add_to_window(release, lock)
+            logger.info(f"Loaded cycle history: {self.count} cycles, {len(self.lock_times)} in window")
+        except Exception as e:
+            logger.warning(f"Failed to load cycle history: {e}")
+
+    def _add_to_window(self, release, lock):
+        if not math.isnan(release):
+            self.release_times.append(release)
+        if not math.isnan(lock):
+            self.lock_times.append(lock)
+
+    def add(self, release, hold, lock, cycle, outcome):
+        """Record one cycle - called once per cycle, never in the fast loop"""
+        self.count += 1
+        self._add_to_window(release, lock)
+        try:
+            with open(self.path, 'ab') as f:
+                f.write(self.RECORD.pack(time.time(), release, hold, lock, cycle, outcome))
+        except Exception as e:
+            logger.warning(f"Failed to store cycle record: {e}")
+
+    @staticmethod
+    def percentile(values, fraction):
+        """Linear-interpolated percentile of a small window"""
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        pos = (len(ordered) - 1) * fraction
+        low = int(pos)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+    @staticmethod
+    def projected(values, horizon):
+        """Least-squares trend of the window, extrapolated horizon cycles ahead"""
+        n = len(values)
+        if n < 2:
+            return values[-1] if values else 0.0
+        mean_x = (n - 1) / 2
+        mean_y = sum(values) / n
+        sxx = sum((x - mean_x) ** 2 for x in range(n))
+        sxy = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+        slope = sxy / sxx
+        return mean_y + slope * (n - 1 + horizon - mean_x)
+
 class ToolReleaseControl:
     def __init__(self):
         self.h = hal.component("tool_release")
@@ -34,9 +117,19 @@ class ToolReleaseControl:
         self.h.newpin("lock_tool", hal.HAL_BIT, hal.HAL_OUT)         # Lock tool output
         self.h.newpin("error_active", hal.HAL_BIT, hal.HAL_OUT)      # Error status
         
-        # Parameters
-        self.TIMEOUT = 5.0          # Timeout for operations (seconds)
-        self.ERROR_RESET_TIME = 1.0 # Time button must be released to reset error
+        # Cycle timing output pins (seconds)
+        self.h.newpin("release_time", hal.HAL_FLOAT, hal.HAL_OUT)       # Last release command -> released
+        self.h.newpin("lock_time", hal.HAL_FLOAT, hal.HAL_OUT)          # Last lock command -> locked
+        self.h.newpin("release_time_p90", hal.HAL_FLOAT, hal.HAL_OUT)
+        self.h.newpin("lock_time_p50", hal.HAL_FLOAT, hal.HAL_OUT)
+        self.h.newpin("lock_time_p90", hal.HAL_FLOAT, hal.HAL_OUT)
+        self.h.newpin("lock_time_trend", hal.HAL_FLOAT, hal.HAL_OUT)    # Projected lock time TREND_HORIZON cycles ahead
+        self.h.newpin("cycle_count", hal.HAL_S32, hal.HAL_OUT)
+        self.h.newpin("lock_time_warning", hal.HAL_BIT, hal.HAL_OUT)    # Lock time trending towards TIMEOUT - service drawbar
+        
+        # Parameters (loaded from the [TOOL_RELEASE] section of the INI)
+        self.config = get_config()
+        self.load_parameters()
         
         # State tracking
         self.state = ToolState.IDLE
@@ -44,32 +137,121 @@ class ToolReleaseControl:
         self.operation_start_time = 0
         self.error_reset_time = 0
         
+        # Cycle timing - edges are timestamped at the midpoint between the
+        # sample that saw the old value and the one that saw the new value
+        self.last_sample_time = time.monotonic()
+        self.last_tool_released = False
+        self.last_tool_locked = False
+        self.cycle = {}
+        self.stats = CycleStats('logs/tool_release_cycles.bin', self.STATS_WINDOW)
+        
         # Initialize outputs
         self.h.lock_tool = True     # Start with tool locked
         self.h.release_tool = False
         self.h.error_active = False
+        self.publish_stats()
+        
+        # Liveness pins watched by component_supervisor.py
+        self.heartbeat = Heartbeat(self.h)
         
         self.h.ready()
         logger.info("Tool release component ready")
     
+    def load_parameters(self):
+        """Load timings from the cached INI config"""
+        self.TIMEOUT = self.config.get_float('TOOL_RELEASE', 'TIMEOUT', 5.0)                    # Timeout for operations (seconds)
+        self.ERROR_RESET_TIME = self.config.get_float('TOOL_RELEASE', 'ERROR_RESET_TIME', 1.0)  # Time button must be released to reset error
+        self.FAST_POLL = self.config.get_float('TOOL_RELEASE', 'FAST_POLL', 0.005)             # Loop period while a cycle is active
+        self.STATS_WINDOW = self.config.get_int('TOOL_RELEASE', 'STATS_WINDOW', 50)            # Cycles in the rolling statistics
+        self.WARN_FRACTION = self.config.get_float('TOOL_RELEASE', 'WARN_FRACTION', 0.6)       # Warn when lock time reaches this fraction of TIMEOUT
+        self.TREND_HORIZON = self.config.get_int('TOOL_RELEASE', 'TREND_HORIZON', 20)          # Cycles ahead for the lock time trend
+        logger.info(f"Parameters: TIMEOUT={self.TIMEOUT}s, ERROR_RESET_TIME={self.ERROR_RESET_TIME}s")
+    
+    def poll_interval(self):
+        """Sleep time for the main loop - poll fast while the drawbar is moving"""
+        if self.state in (ToolState.RELEASING, ToolState.LOCKING):
+            return self.FAST_POLL
+        return 0.1
+    
     def check_timeout(self):
         """Check if current operation has timed out"""
-        return time.time() - self.operation_start_time > self.TIMEOUT
+        return time.monotonic() - self.operation_start_time > self.TIMEOUT
+    
+    def cycle_duration(self, start, end):
+        if start in self.cycle and end in self.cycle:
+            return self.cycle[end] - self.cycle[start]
+        return float('nan')
+    
+    def finish_cycle(self, outcome):
+        """Store the finished cycle and refresh the statistics pins"""
+        release = self.cycle_duration('release_cmd', 'released')
+        hold = self.cycle_duration('release_cmd', 'lock_cmd')
+        lock = self.cycle_duration('lock_cmd', 'locked')
+        cycle = self.cycle_duration('release_cmd', 'end')
+        self.stats.add(release, hold, lock, cycle, outcome)
+        logger.info(f"Cycle {self.stats.count}: release={release * 1000:.0f}ms hold={hold * 1000:.0f}ms "
+                    f"lock={lock * 1000:.0f}ms total={cycle * 1000:.0f}ms outcome={outcome}")
+        if not math.isnan(release):
+            self.h.release_time = release
+        if not math.isnan(lock):
+            self.h.lock_time = lock
+        self.cycle = {}
+        self.publish_stats()
+    
+    def publish_stats(self):
+        lock_times = list(self.stats.lock_times)
+        self.h.release_time_p90 = CycleStats.percentile(list(self.stats.release_times), 0.9)
+        self.h.lock_time_p50 = CycleStats.percentile(lock_times, 0.5)
+        self.h.lock_time_p90 = CycleStats.percentile(lock_times, 0.9)
+        self.h.lock_time_trend = CycleStats.projected(lock_times, self.TREND_HORIZON)
+        self.h.cycle_count = self.stats.count
+        
+        limit = self.WARN_FRACTION * self.TIMEOUT
+        # Percentile needs a few cycles, the trend a few more before it is trusted
+        warning = ((len(lock_times) >= 5 and self.h.lock_time_p90 >= limit) or
+                   (len(lock_times) >= 10 and self.h.lock_time_trend >= limit))
+        if warning and not self.h.lock_time_warning:
+            logger.warning(f"Lock time trending towards TIMEOUT: p90={self.h.lock_time_p90:.3f}s "
+                           f"trend={self.h.lock_time_trend:.3f}s limit={limit:.3f}s - service the drawbar")
+        self.h.lock_time_warning = warning
     
     def handle_error(self):
         """Set error state and safe outputs"""
         logger.error("Operation timed out - entering error state")
+        self.cycle['end'] = time.monotonic()
+        if self.state == ToolState.RELEASING:
+            self.finish_cycle(CycleStats.OUTCOME_RELEASE_TIMEOUT)
+        else:
+            self.finish_cycle(CycleStats.OUTCOME_LOCK_TIMEOUT)
         self.state = ToolState.ERROR
         self.h.error_active = True
         self.h.release_tool = False
         self.h.lock_tool = True
     
     def update(self):
+        self.heartbeat.beat()
+        
+        # Pick up INI edits without restarting the component
+        if self.config.reload_if_changed():
+            self.load_parameters()
+        
         # Read current button state
         button_pressed = self.h.release_button
         button_rising_edge = button_pressed and not self.last_button_state
         button_falling_edge = not button_pressed and self.last_button_state
-        current_time = time.time()
+        current_time = time.monotonic()
+        edge_time = (self.last_sample_time + current_time) / 2
+        self.last_sample_time = current_time
+        
+        # Timestamp feedback edges for the cycle statistics
+        tool_released = self.h.tool_released
+        tool_locked = self.h.tool_locked
+        if tool_released and not self.last_tool_released and self.state == ToolState.RELEASING:
+            self.cycle.setdefault('released', edge_time)
+        if tool_locked and not self.last_tool_locked and self.state == ToolState.LOCKING:
+            self.cycle.setdefault('locked', edge_time)
+        self.last_tool_released = tool_released
+        self.last_tool_locked = tool_locked
         
         # Log state changes
         if button_rising_edge:
@@ -86,6 +268,7 @@ class ToolReleaseControl:
                 self.h.lock_tool = False
                 self.operation_start_time = current_time
                 self.h.error_active = False
+                self.cycle = {'release_cmd': current_time}
         
         elif self.state == ToolState.RELEASING:
             if button_falling_edge:
@@ -94,13 +277,18 @@ class ToolReleaseControl:
                 self.h.release_tool = False
                 self.h.lock_tool = True
                 self.operation_start_time = current_time
+                self.cycle['lock_cmd'] = current_time
             elif self.check_timeout():
                 self.handle_error()
         
         elif self.state == ToolState.LOCKING:
-            if self.h.tool_locked:
+            if tool_locked:
                 logger.info("Tool locked successfully")
                 self.state = ToolState.IDLE
+                # Lock feedback already present when locking started - no edge to time
+                self.cycle.setdefault('locked', current_time)
+                self.cycle['end'] = current_time
+                self.finish_cycle(CycleStats.OUTCOME_OK)
             elif self.check_timeout():
                 self.handle_error()
         
@@ -126,7 +314,7 @@ def main():
     try:
         while True:
             tool_control.update()
-            time.sleep(0.1)  # 100ms update rate
+            time.sleep(tool_control.poll_interval())  # 100ms idle, FAST_POLL during a cycle
             
     except KeyboardInterrupt:
         logger.info("Tool release control stopped")
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Trip capture and guided resume.
+#
+# machine_enable calls capture_trip() when a PCells or E-stop trip drops the
+# machine enable. The state of the interrupted program is written to
+# logs/trip_state.json. After the trip is reset and the machine is back on:
+#
+#   python3 python/trip_resume.py show      Print the captured state
+#   python3 python/trip_resume.py resume    Guided resume (asks before each step)
+#   python3 python/trip_resume.py clear     Discard the captured state
+
+import os
+import sys
+import json
+import time
+import argparse
+from ini_config import get_config
+from ngc_index import write_resume
+
+TRIP_FILE = 'logs/trip_state.json'
+
+# Modal groups restored before resuming (stat.gcodes holds G codes x10)
+RESTORE_GROUPS = ('plane', 'units', 'distance', 'feed_mode', 'coord_system')
+
+def format_gcode(code):
+    """Convert a stat.gcodes entry (x10) to G code text, e.g. 591 -> G59.1"""
+    if code % 10:
+        return f"G{code // 10}.{code % 10}"
+    return f"G{code // 10}"
+
+def classify_gcodes(gcodes):
+    """Pick the modal G codes that matter for a resume out of stat.gcodes"""
+    groups = {}
+    for code in gcodes:
+        if code < 0:
+            continue
+        if code in (170, 180, 190):
+            groups['plane'] = format_gcode(code)
+        elif code in (200, 210):
+            groups['units'] = format_gcode(code)
+        elif code in (900, 910):
+            groups['distance'] = format_gcode(code)
+        elif code in (930, 940, 950):
+            groups['feed_mode'] = format_gcode(code)
+        elif 540 <= code <= 593:
+            groups['coord_system'] = format_gcode(code)
+        elif code in (0, 10, 20, 30):
+            groups['motion'] = format_gcode(code)
+    return groups
+
+def snapshot(stat):
+    """Program, modal, tool, spindle and actuator state from a linuxcnc.stat()"""
+    import linuxcnc
+    stat.poll()
+    spindle = stat.spindle[0]
+    return {
+        'time': time.time(),
+        'file': stat.file,
+        # MDI and the on-abort O-word also leave the interpreter busy
+        'program_running': stat.interp_state != linuxcnc.INTERP_IDLE and stat.task_mode == linuxcnc.MODE_AUTO,
+        'motion_line': stat.motion_line,
+        'current_line': stat.current_line,
+        'modal': classify_gcodes(stat.gcodes),
+        'mcodes': [m for m in stat.mcodes if m >= 0],
+        'feed': stat.settings[1],
+        'speed': stat.settings[2],
+        'tool': stat.tool_in_spindle,
+        'spindle_direction': spindle['direction'],
+        'spindle_speed': spindle['speed'],
+        'position': list(stat.position[:3]),     # Machine coordinates
+        'g5x_offset': list(stat.g5x_offset[:3]),
+        # Actuator feedback (see remap_m6): blade up/down, router up/down
+        'blade_up': bool(stat.din[0]),
+        'blade_down': bool(stat.din[1]),
+        'router_up': bool(stat.din[2]),
+        'router_down': bool(stat.din[3]),
+    }
+
+def capture_trip(stat, reason, last_running=None, path=TRIP_FILE):
+    """Save the state of the interrupted program.
+    If the trip already aborted the program, last_running (the latest snapshot
+    taken while it ran) is saved instead.
+    """
+    state = snapshot(stat)
+    if not state['program_running'] and last_running is not None:
+        state = dict(last_running)
+    state['reason'] = reason
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+    return state
+
+def load_trip(path=TRIP_FILE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+class TripResume:
+    """Walks the operator through re-homing, tool restore, spin up, approach and run-from-line"""
+
+    def __init__(self, state, assume_yes=False, linuxcnc_module=None):
+        if linuxcnc_module is None:
+            import linuxcnc as linuxcnc_module
+        self.lc = linuxcnc_module
+        self.stat = self.lc.stat()
+        self.command = self.lc.command()
+        self.state = state
+        self.assume_yes = assume_yes
+
+        config = get_config()
+        self.SAFE_Z = config.get_float('TRIP_RESUME', 'SAFE_Z', 0.0)               # Machine Z for the approach
+        self.APPROACH_FEED = config.get_float('TRIP_RESUME', 'APPROACH_FEED', 500.0) # Final Z feed (units/min)
+        self.SPINUP_TIME = config.get_float('TRIP_RESUME', 'SPINUP_TIME', 5.0)       # Dwell after M3/M4
+        self.HOME_TIMEOUT = config.get_float('TRIP_RESUME', 'HOME_TIMEOUT', 120.0)
+
+    def confirm(self, text):
+        print(f"  Step: {text}")
+        if self.assume_yes:
+            return True
+        answer = input("    Continue? [Y/n] ").strip().lower()
+        return answer in ('', 'y', 'yes')
+
+    def mdi(self, line):
+        print(f"    MDI: {line}")
+        self.command.mode(self.lc.MODE_MDI)
+        self.command.wait_complete()
+        self.command.mdi(line)
+        # Tool changes and dwells can take a while
+        self.command.wait_complete(300)
+
+    def check_machine(self):
+        self.stat.poll()
+        if self.stat.task_state != self.lc.STATE_ON:
+            print("Machine is not on - reset the trip and turn the machine on first")
+            return False
+        if self.stat.interp_state != self.lc.INTERP_IDLE:
+            print("Interpreter is busy - stop the current program first")
+            return False
+        return True
+
+    def home_if_needed(self):
+        self.stat.poll()
+        if all(self.stat.homed[i] for i in range(self.stat.joints)):
+            return True
+        if not self.confirm("Machine is not homed - home all joints"):
+            return False
+        self.command.mode(self.lc.MODE_MANUAL)
+        self.command.wait_complete()
+        self.command.home(-1)
+        deadline = time.monotonic() + self.HOME_TIMEOUT
+        while time.monotonic() < deadline:
+            self.stat.poll()
+            if all(self.stat.homed[i] for i in range(self.stat.joints)):
+                return True
+            time.sleep(0.5)
+        print("Homing did not finish in time")
+        return False
+
+    def restore_tool(self):
+        """M6 releases all actuator outputs and sets them for the tool (router/blade down)"""
+        tool = self.state['tool']
+        if tool <= 0:
+            return True
+        if not self.confirm(f"Restore T{tool} and its actuators through M6"):
+            return False
+        self.mdi(f"T{tool} M6")
+        return True
+
+    def restore_modal(self):
+        modal = self.state['modal']
+        words = [modal[group] for group in RESTORE_GROUPS if group in modal]
+        if words:
+            self.mdi(' '.join(words))
+
+    def spin_up(self):
+        direction = self.state['spindle_direction']
+        if direction == 0:
+            return True
+        word = 'M3' if direction > 0 else 'M4'
+        speed = abs(self.state['spindle_speed']) or self.state['speed']
+        if not self.confirm(f"Start spindle {word} S{speed:.0f}"):
+            return False
+        self.mdi(f"{word} S{speed:.0f}")
+        self.mdi(f"G4 P{self.SPINUP_TIME}")
+        return True
+
+    def approach(self):
+        """Rapid at safe Z to the trip point, then feed down to the trip Z"""
+        x, y, z = self.state['position']
+        if not self.confirm(f"Approach X{x:.3f} Y{y:.3f} Z{z:.3f} (machine) from safe Z {self.SAFE_Z:.3f}"):
+            return False
+        self.mdi(f"G53 G0 Z{self.SAFE_Z:.4f}")
+        self.mdi(f"G53 G0 X{x:.4f} Y{y:.4f}")
+        self.mdi(f"G53 G1 Z{z:.4f} F{self.APPROACH_FEED:.1f}")
+        return True
+
+    def run_from_line(self):
+        line = self.state['motion_line']
+        if self.state['modal'].get('motion') in ('G2', 'G3'):
+            print("    Warning: trip happened during an arc - the restarted arc begins at the trip point")
+        if not self.confirm(f"Run {self.state['file']} from line {line}"):
+            return False
+        # The checkpoint index avoids the interpreter scanning the whole program
+        program, start = self.state['file'], line
+        try:
+            program, start = write_resume(self.state['file'], line, setup=False), 0
+            print(f"    Resume program: {program}")
+        except (OSError, ValueError) as e:
+            print(f"    Using full run-from-line: {e}")
+        self.command.mode(self.lc.MODE_AUTO)
+        self.command.wait_complete()
+        self.command.program_open(program)
+        self.command.auto(self.lc.AUTO_RUN, start)
+        return True
+
+    def run(self):
+        if not self.state.get('program_running'):
+            print("No program was running at the trip - nothing to resume")
+            return False
+        steps = (self.check_machine, self.home_if_needed, self.restore_tool,
+                 self.restore_modal, self.spin_up, self.approach, self.run_from_line)
+        for step in steps:
+            if step() is False:
+                print("Resume stopped")
+                return False
+        print("Resumed")
+        return True
+
+def show(state):
+    when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(state['time']))
+    print(f"Trip at {when}: {state['reason']}")
+    print(f"  Program: {state['file']} line {state['motion_line']} (running={state['program_running']})")
+    print(f"  Modal: {' '.join(state['modal'].values())}  F{state['feed']} S{state['speed']}")
+    print(f"  Tool: T{state['tool']}  spindle direction={state['spindle_direction']} speed={state['spindle_speed']}")
+    print(f"  Position (machine): {state['position']}")
+    print(f"  Blade up/down: {state['blade_up']}/{state['blade_down']}  Router up/down: {state['router_up']}/{state['router_down']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or resume from a captured PCells/E-stop trip")
+    parser.add_argument('action', choices=('show', 'resume', 'clear'))
+    parser.add_argument('--yes', action='store_true', help="Do not ask before each step")
+    args = parser.parse_args()
+
+    state = load_trip()
+    if state is None:
+        print("No trip captured")
+        sys.exit(1)
+
+    if args.action == 'show':
+        show(state)
+    elif args.action == 'clear':
+        os.unlink(TRIP_FILE)
+        print("Trip state cleared")
+    else:
+        show(state)
+        if TripResume(state, args.yes).run():
+            os.unlink(TRIP_FILE)
+        else:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,18 @@
 
 import hal
 import time
+from heartbeat import Heartbeat
 from enum import Enum
+import logging
+from ini_config import get_config
+
+# Set up logging - every vacuum dip and feed hold is recorded here
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename='logs/vacuum.log'
+)
+logger = logging.getLogger('vacuum')
 
 class VacuumState(Enum):
     IDLE = 0
@@ -11,6 +22,12 @@ class VacuumState(Enum):
     VACUUM_OFF = 2
     ERROR = 3
 
+class HoldState(Enum):
+    NONE = 0
+    HOLDING = 1        # Program paused, waiting for vacuum to be stable again
+    WAIT_CONFIRM = 2   # Vacuum stable, waiting for the operator to confirm
+    RETURNING = 3      # Z retract being removed before resuming
+
 class VacuumControl:
     def __init__(self):
         self.h = hal.component("vacuum")
@@ -19,33 +36,207 @@ class VacuumControl:
         self.h.newpin("vacuum_pedal", hal.HAL_BIT, hal.HAL_IN)
         self.h.newpin("vacuum_ok", hal.HAL_BIT, hal.HAL_IN)      # Vacuum level OK signal
         self.h.newpin("work_area_setup", hal.HAL_BIT, hal.HAL_IN)  # Set by work area control
+        self.h.newpin("program_running", hal.HAL_BIT, hal.HAL_IN)  # halui.program.is-running
+        self.h.newpin("program_paused", hal.HAL_BIT, hal.HAL_IN)   # halui.program.is-paused
+        self.h.newpin("resume_confirm", hal.HAL_BIT, hal.HAL_IN)   # Operator confirm when AUTO_RESUME = 0
+        self.h.newpin("z_eoffset", hal.HAL_FLOAT, hal.HAL_IN)      # axis.z.eoffset - applied retract
+        self.h.newpin("pendulum_mode", hal.HAL_BIT, hal.HAL_IN)    # Dual-station mode selected
+        self.h.newpin("left_setup", hal.HAL_BIT, hal.HAL_IN)       # Pendulum: left station being loaded
+        self.h.newpin("right_setup", hal.HAL_BIT, hal.HAL_IN)      # Pendulum: right station being loaded
         
         # Output pins
         self.h.newpin("suction_on", hal.HAL_BIT, hal.HAL_OUT)    # Turn vacuum on
         self.h.newpin("suction_off", hal.HAL_BIT, hal.HAL_OUT)   # Turn vacuum off
         self.h.newpin("suction_up", hal.HAL_BIT, hal.HAL_OUT)    # Raise suction cups
         self.h.newpin("low_vacuum", hal.HAL_BIT, hal.HAL_OUT)    # Low vacuum warning
+        self.h.newpin("program_pause", hal.HAL_BIT, hal.HAL_OUT)   # Pulse to halui.program.pause
+        self.h.newpin("program_resume", hal.HAL_BIT, hal.HAL_OUT)  # Pulse to halui.program.resume
+        self.h.newpin("vacuum_hold", hal.HAL_BIT, hal.HAL_OUT)     # Feed hold for vacuum loss active
+        self.h.newpin("dip_time", hal.HAL_FLOAT, hal.HAL_OUT)      # Current/last vacuum dip (seconds)
+        self.h.newpin("z_eoffset_enable", hal.HAL_BIT, hal.HAL_OUT)   # axis.z.eoffset-enable
+        self.h.newpin("z_eoffset_counts", hal.HAL_S32, hal.HAL_OUT)   # axis.z.eoffset-counts
+        self.h.newpin("left_zone", hal.HAL_BIT, hal.HAL_OUT)       # Pendulum: left station vacuum zone valve
+        self.h.newpin("right_zone", hal.HAL_BIT, hal.HAL_OUT)      # Pendulum: right station vacuum zone valve
+        
+        # Parameters (loaded from the [VACUUM] section of the INI)
+        self.config = get_config()
+        self.load_parameters()
         
         # State tracking
         self.vacuum_state = VacuumState.IDLE
         self.last_vacuum_ok = False
         self.last_vacuum_pedal = False
+        self.vacuum_lost = False       # Debounced vacuum loss
+        self.dip_start = 0             # vacuum_ok went low
+        self.ok_since = 0              # vacuum_ok came back
+        self.hold_state = HoldState.NONE
+        self.last_resume_confirm = False
         
         # Initialize outputs
         self.h.suction_on = False
         self.h.suction_off = False
         self.h.suction_up = False
         self.h.low_vacuum = False
+        self.h.program_pause = False
+        self.h.program_resume = False
+        self.h.vacuum_hold = False
+        self.h.dip_time = 0.0
+        self.h.z_eoffset_enable = False
+        self.h.z_eoffset_counts = 0
+        self.h.left_zone = False
+        self.h.right_zone = False
+        
+        # Liveness pins watched by component_supervisor.py
+        self.heartbeat = Heartbeat(self.h)
         
         self.h.ready()
     
+    def load_parameters(self):
+        """Load hold/resume behaviour from the cached INI config"""
+        self.LOSS_DEBOUNCE = self.config.get_float('VACUUM', 'LOSS_DEBOUNCE', 0.0)     # Loss must last this long (0 = first sample)
+        self.RESTORE_STABLE = self.config.get_float('VACUUM', 'RESTORE_STABLE', 1.0)   # Vacuum must be back this long
+        self.AUTO_RESUME = self.config.get_bool('VACUUM', 'AUTO_RESUME', True)         # False = wait for resume_confirm
+        self.RETRACT_HEIGHT = self.config.get_float('VACUUM', 'RETRACT_HEIGHT', 0.0)   # Z lift during hold (mm, 0 = off)
+        self.EOFFSET_SCALE = self.config.get_float('VACUUM', 'EOFFSET_SCALE', 0.001)   # Must match axis.z.eoffset-scale
+    
+    def debounce_vacuum(self, now):
+        """Debounce vacuum_ok - lost after LOSS_DEBOUNCE, restored after RESTORE_STABLE"""
+        if not self.h.vacuum_ok:
+            self.ok_since = 0
+            if self.dip_start == 0:
+                self.dip_start = now
+            self.h.dip_time = now - self.dip_start
+            if not self.vacuum_lost and now - self.dip_start >= self.LOSS_DEBOUNCE:
+                self.vacuum_lost = True
+                logger.warning(f"VACUUM_LOSS program_running={self.h.program_running}")
+        elif self.dip_start != 0:
+            if self.ok_since == 0:
+                self.ok_since = now
+            if not self.vacuum_lost:
+                # Glitch shorter than the debounce - record it and carry on
+                logger.info(f"VACUUM_DIP ignored dip={self.ok_since - self.dip_start:.3f}s")
+                self.dip_start = 0
+            elif now - self.ok_since >= self.RESTORE_STABLE:
+                dip = self.ok_since - self.dip_start
+                self.h.dip_time = dip
+                logger.info(f"VACUUM_RESTORED dip={dip:.3f}s")
+                self.vacuum_lost = False
+                self.dip_start = 0
+        return self.vacuum_lost
+    
+    def set_retract(self, retract):
+        """Lift Z by RETRACT_HEIGHT through the external offset pins"""
+        if self.RETRACT_HEIGHT <= 0:
+            return
+        self.h.z_eoffset_enable = True
+        self.h.z_eoffset_counts = int(round(self.RETRACT_HEIGHT / self.EOFFSET_SCALE)) if retract else 0
+    
+    def end_hold(self, now, reason):
+        logger.info(f"{reason} hold={now - self.hold_start:.3f}s dip={self.h.dip_time:.3f}s")
+        print(f"  Action: Vacuum hold ended ({reason})")
+        self.hold_state = HoldState.NONE
+        self.h.vacuum_hold = False
+        self.set_retract(False)
+    
+    def update_feed_hold(self, vacuum_lost, now):
+        """Pause a running program on vacuum loss and resume once vacuum is stable"""
+        if self.hold_state == HoldState.NONE:
+            if vacuum_lost and self.h.program_running and not self.h.program_paused:
+                print("  Action: Vacuum lost - feed hold")
+                logger.warning("FEED_HOLD issued")
+                self.h.program_pause = True
+                self.h.vacuum_hold = True
+                self.hold_state = HoldState.HOLDING
+                self.hold_start = now
+                self.set_retract(True)
+            return
+        
+        confirm_pressed = self.h.resume_confirm and not self.last_resume_confirm
+        
+        if not self.h.program_running and not self.h.program_paused:
+            # Program aborted by the operator while holding
+            self.end_hold(now, "VACUUM_HOLD_ABORTED")
+        
+        elif self.hold_state == HoldState.HOLDING:
+            if not vacuum_lost:
+                if self.AUTO_RESUME:
+                    self.hold_state = HoldState.RETURNING
+                    self.set_retract(False)
+                else:
+                    print("  Action: Vacuum restored - waiting for operator confirm")
+                    logger.info("VACUUM_WAIT_CONFIRM")
+                    self.hold_state = HoldState.WAIT_CONFIRM
+        
+        elif self.hold_state == HoldState.WAIT_CONFIRM:
+            if vacuum_lost:
+                self.hold_state = HoldState.HOLDING
+            elif confirm_pressed:
+                logger.info("VACUUM_CONFIRMED by operator")
+                self.hold_state = HoldState.RETURNING
+                self.set_retract(False)
+        
+        elif self.hold_state == HoldState.RETURNING:
+            if vacuum_lost:
+                self.hold_state = HoldState.HOLDING
+                self.set_retract(True)
+            elif self.RETRACT_HEIGHT <= 0 or abs(self.h.z_eoffset) < 0.01:
+                # Z is back on the cut - resume the program
+                self.h.z_eoffset_enable = False
+                self.h.program_resume = True
+                self.end_hold(now, "VACUUM_RESUME")
+    
+    def update_zones(self, pedal_pressed):
+        """Pendulum: the pedal toggles the vacuum zone of the station being loaded.
+        pendulum_mode is only set with [PENDULUM]ZONE_VALVES fitted (rover-custom.hal),
+        since suction_on/suction_up below serve the whole table.
+        """
+        if self.h.left_setup and not self.h.right_setup:
+            side = 'left'
+        elif self.h.right_setup and not self.h.left_setup:
+            side = 'right'
+        else:
+            side = None  # No station, or both, in setup - pedal is ambiguous
+        
+        if pedal_pressed and side:
+            zone = f"{side}_zone"
+            self.h[zone] = not self.h[zone]
+            print(f"  Action: {side} vacuum zone {'on' if self.h[zone] else 'off'}")
+        
+        # Pump and cups follow the zones
+        any_on = self.h.left_zone or self.h.right_zone
+        self.h.suction_off = self.h.suction_on and not any_on  # One cycle pulse when the last zone turns off
+        self.h.suction_on = any_on
+        self.h.suction_up = any_on
+        self.vacuum_state = VacuumState.VACUUM_ON if any_on else VacuumState.IDLE
     
     def update(self):
+        self.heartbeat.beat()
+        
+        # Pick up INI edits without restarting the component
+        if self.config.reload_if_changed():
+            self.load_parameters()
+        
+        now = time.monotonic()
+        
+        # halui pause/resume are edge triggered - only pulse for one cycle
+        self.h.program_pause = False
+        self.h.program_resume = False
+        
+        vacuum_lost = self.debounce_vacuum(now)
+        self.update_feed_hold(vacuum_lost, now)
+        self.last_resume_confirm = self.h.resume_confirm
+        
         # Check for vacuum loss in any state
-        if not self.h.vacuum_ok:
+        if vacuum_lost:
             self.vacuum_state = VacuumState.ERROR
             self.h.low_vacuum = True
             return
+        
+        # Reset error once vacuum is restored and stable - also outside setup
+        # mode, so a dip during a job clears without a restart
+        if self.vacuum_state == VacuumState.ERROR:
+            self.vacuum_state = VacuumState.IDLE
+            self.h.low_vacuum = False
         # print(f"Vacuum state: {self.vacuum_state}")
         # print(f"work_area_setup: {self.h.work_area_setup}")
         # print(f"vacuum_pedal: {self.h.vacuum_pedal}")
@@ -58,6 +249,10 @@ class VacuumControl:
         pedal_pressed = self.h.vacuum_pedal and not self.last_vacuum_pedal
         self.last_vacuum_pedal = self.h.vacuum_pedal
         
+        if self.h.pendulum_mode:
+            self.update_zones(pedal_pressed)
+            return
+        
         # Only allow pedal control in setup mode
         if not self.h.work_area_setup:
             return  # Skip all control when not in setup mode
@@ -83,11 +278,6 @@ class VacuumControl:
         elif self.vacuum_state == VacuumState.VACUUM_OFF:
             self.vacuum_state = VacuumState.IDLE
             self.h.suction_off = False
-        
-        elif self.vacuum_state == VacuumState.ERROR:
-            if self.h.vacuum_ok:  # Reset error if vacuum restored
-                self.vacuum_state = VacuumState.IDLE
-                self.h.low_vacuum = False
 
 def main():
     vacuum = VacuumControl()
@@ -2,7 +2,8 @@
 
 import hal
 import time
-import os
+from heartbeat import Heartbeat
+from ini_config import get_config
 
 class VFDControl:
     def __init__(self):
@@ -21,38 +22,19 @@ class VFDControl:
         self.h.newpin("vfd_reset", hal.HAL_BIT, hal.HAL_OUT)        # VFD reset command
         self.h.newpin("fault_active", hal.HAL_BIT, hal.HAL_OUT)     # Fault status
         self.h.newpin("vfd_speed", hal.HAL_FLOAT, hal.HAL_OUT)      # Scaled speed output (RPM)
+        self.h.newpin("spindle_speed_est", hal.HAL_FLOAT, hal.HAL_OUT)  # Modelled motor speed (RPM)
+        self.h.newpin("spindle_at_speed", hal.HAL_BIT, hal.HAL_OUT)     # Motor at commanded speed (spindle.0.at-speed)
         
-        # Parameters
-        self.START_DELAY = 0.5       # Delay before starting VFD (seconds)
-        self.RESET_PULSE = 1.0       # Duration of reset pulse (seconds)
-        self.STOP_TIMEOUT = 10.0      # Maximum time to wait for motor to stop
-        
-        # Read spindle speed limits from INI file
-        try:
-            # Get the config directory from the environment
-            config_dir = os.environ.get('LINUXCNC_CONFIG_DIR', '')
-            if not config_dir:
-                print("Warning: LINUXCNC_CONFIG_DIR not set, using default speed limits")
-                self.MAX_SPEED = 24000.0
-                self.MIN_SPEED = 300.0
-            else:
-                ini_file = os.path.join(config_dir, 'Rover13s.ini')
-                with open(ini_file, 'r') as f:
-                    for line in f:
-                        if line.startswith('MAX_SPINDLE_0_SPEED'):
-                            self.MAX_SPEED = float(line.split('=')[1].strip())
-                        elif line.startswith('MIN_SPINDLE_0_SPEED'):
-                            self.MIN_SPEED = float(line.split('=')[1].strip())
-                
-                print(f"Loaded speed limits from INI: MIN={self.MIN_SPEED:.0f}, MAX={self.MAX_SPEED:.0f}")
-        except Exception as e:
-            print(f"Warning: Failed to read speed limits from INI: {e}")
-            print("Using default speed limits")
-            self.MAX_SPEED = 24000.0
-            self.MIN_SPEED = 300.0
+        # Parameters (loaded from the [VFD] section of the INI)
+        self.config = get_config()
+        self.load_parameters()
         
         # State variables
-        self.timer_start = 0
+        self.stop_timer_start = 0
+        self.stop_timeout_fault = False
+        self.speed_est = 0.0
+        self.last_update_time = time.monotonic()
+        self.at_speed_reported = False
         self.reset_timer = 0
         self.is_resetting = False
         self.last_reset_button = False
@@ -64,10 +46,27 @@ class VFDControl:
         self.h.vfd_reset = False
         self.h.fault_active = False
         self.h.vfd_speed = 0.0
+        self.h.spindle_speed_est = 0.0
+        self.h.spindle_at_speed = False
+        
+        # Liveness pins watched by component_supervisor.py
+        self.heartbeat = Heartbeat(self.h)
         
         print("VFD Control initialized")
         self.h.ready()
     
+    def load_parameters(self):
+        """Load timings and speed limits from the cached INI config"""
+        self.RESET_PULSE = self.config.get_float('VFD', 'RESET_PULSE', 1.0)    # Duration of reset pulse (seconds)
+        self.STOP_TIMEOUT = self.config.get_float('VFD', 'STOP_TIMEOUT', 10.0) # Maximum time to wait for motor to stop
+        self.MAX_SPEED = self.config.get_float('DISPLAY', 'MAX_SPINDLE_0_SPEED', 24000.0)
+        self.MIN_SPEED = self.config.get_float('DISPLAY', 'MIN_SPINDLE_0_SPEED', 300.0)
+        # Ramp model - match the VFD accel/decel times: rate = MAX_SPEED / ramp time
+        self.ACCEL_RATE = self.config.get_float('VFD', 'ACCEL_RATE', 4800.0)   # RPM/s while speeding up
+        self.DECEL_RATE = self.config.get_float('VFD', 'DECEL_RATE', 2400.0)   # RPM/s while slowing down
+        self.AT_SPEED_TOLERANCE = self.config.get_float('VFD', 'AT_SPEED_TOLERANCE', 0.02)  # Fraction of commanded speed
+        print(f"Loaded speed limits from INI: MIN={self.MIN_SPEED:.0f}, MAX={self.MAX_SPEED:.0f}")
+    
     def check_faults(self):
         """Check for VFD faults"""
         # Only check VFD fault signal, ignore overload for now
@@ -90,11 +89,32 @@ class VFDControl:
         """Scale the spindle speed to RPM range"""
         # Ensure speed is within limits
         speed = max(self.MIN_SPEED, min(self.MAX_SPEED, speed))
-        print(f"Speed scaling: {speed} RPM")
         return speed
     
+    def update_speed_model(self, target, dt):
+        """Ramp the modelled motor speed towards target at the configured rates"""
+        if self.h.motor_stopped and not self.h.vfd_run:
+            # Drive reports zero speed - resync the model
+            self.speed_est = 0.0
+        elif self.speed_est < target:
+            self.speed_est = min(target, self.speed_est + self.ACCEL_RATE * dt)
+        else:
+            self.speed_est = max(target, self.speed_est - self.DECEL_RATE * dt)
+        
+        self.h.spindle_speed_est = self.speed_est
+        return self.speed_est
+    
     def update(self):
+        self.heartbeat.beat()
+        
         current_time = time.time()
+        now = time.monotonic()
+        dt = now - self.last_update_time
+        self.last_update_time = now
+        
+        # Pick up INI edits without restarting the component
+        if self.config.reload_if_changed():
+            self.load_parameters()
         
         # Check for faults
         fault_detected = self.check_faults()
@@ -104,7 +124,7 @@ class VFDControl:
             self.h.fault_active = True
             self.h.vfd_speed = 0.0
         else:
-            self.h.fault_active = False
+            self.h.fault_active = self.stop_timeout_fault
         
         # Handle reset button
         reset_button_pressed = self.h.reset_button
@@ -113,29 +133,48 @@ class VFDControl:
         if reset_button_rising_edge and fault_detected and not self.is_resetting:
             self.handle_reset(current_time)
         
-        # Normal operation
+        # Normal operation - no start delay, the ramp model decides when
+        # the motor is at speed and speed changes ramp without a restart
         if self.h.spindle_on and not self.h.fault_active:
-            if self.timer_start == 0:
-                print(f"Starting spindle at {self.h.spindle_speed} RPM")
-                self.timer_start = current_time
-            elif current_time - self.timer_start >= self.START_DELAY:
-                # Set both the run command and speed
-                self.h.vfd_run = True
-                self.h.vfd_speed = self.scale_speed(self.h.spindle_speed)
-                print(f"VFD enabled: run={self.h.vfd_run}, speed={self.h.vfd_speed:.0f} RPM")
+            target = self.scale_speed(self.h.spindle_speed)
+            if not self.h.vfd_run:
+                print(f"Starting spindle at {target:.0f} RPM")
+                self.at_speed_reported = False
+            elif target != self.last_spindle_speed:
+                print(f"Spindle speed change: {self.last_spindle_speed:.0f} -> {target:.0f} RPM")
+                self.at_speed_reported = False
+            self.last_spindle_speed = target
+            self.h.vfd_run = True
+            self.stop_timer_start = 0
+            
+            # The drive follows the ramped reference, so the model tracks the motor
+            self.h.vfd_speed = self.update_speed_model(target, dt)
+            at_speed = abs(self.speed_est - target) <= target * self.AT_SPEED_TOLERANCE
+            self.h.spindle_at_speed = at_speed
+            if at_speed and not self.at_speed_reported:
+                print(f"Spindle at speed: {target:.0f} RPM")
+                self.at_speed_reported = True
         else:
             if self.h.vfd_run:  # Only print when stopping
                 print("Stopping spindle")
             self.h.vfd_run = False
             self.h.vfd_speed = 0.0
-            self.timer_start = 0
+            self.h.spindle_at_speed = False
+            self.last_spindle_speed = 0.0
+            self.update_speed_model(0.0, dt)
             
-            # Check motor stop timeout
-            if not self.h.motor_stopped and self.h.spindle_on == False:
-                if self.timer_start == 0:
-                    self.timer_start = current_time
-                elif current_time - self.timer_start >= self.STOP_TIMEOUT:
-                    print("Motor stop timeout - setting fault")
+            # Check motor stop timeout on elapsed time since the stop command
+            if self.h.motor_stopped:
+                self.stop_timer_start = 0
+                if self.stop_timeout_fault:
+                    print("Motor stopped - clearing stop timeout fault")
+                    self.stop_timeout_fault = False
+            elif not self.h.spindle_on:
+                if self.stop_timer_start == 0:
+                    self.stop_timer_start = now
+                elif now - self.stop_timer_start >= self.STOP_TIMEOUT and not self.stop_timeout_fault:
+                    print(f"Motor stop timeout after {now - self.stop_timer_start:.1f}s - setting fault")
+                    self.stop_timeout_fault = True
                     self.h.fault_active = True
         
         # Update button state tracking
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# command to make python files executable: chmod +x python/*.py
+#
+# Idle-aware spindle warm-up.
+#
+# Decides from the machine_timers database whether the router spindle needs a
+# warm-up and which profile to run. remap_m3 applies the decision before
+# starting the spindle; run this script to see what it would decide now.
+
+import os
+import time
+import sqlite3
+import logging
+from ini_config import get_config
+
+# Every decision is kept in logs/warmup.log. This module is imported by the
+# interpreter (remap.py), so it gets its own handler rather than basicConfig.
+logger = logging.getLogger('warmup')
+if not logger.handlers:
+    try:
+        _handler = logging.FileHandler(os.path.join(os.environ.get('LINUXCNC_CONFIG_DIR', ''), 'logs', 'warmup.log'))
+        _handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        logger.addHandler(_handler)
+    except OSError as e:
+        print(f"Warning: Failed to open warm-up log: {e}")
+    logger.setLevel(logging.INFO)
+
+PROFILES = ('short', 'medium', 'full')
+DEFAULT_PROFILES = {
+    'short': '18000:30 24000:30',
+    'medium': '12000:60 18000:60 24000:30',
+    'full': '12000:120 18000:120 24000:60',   # Same as ngc/spindle_warmup.ngc
+}
+
+def parse_profile(text):
+    """'12000:60 18000:60' -> [(12000.0, 60.0), (18000.0, 60.0)]"""
+    steps = []
+    for step in text.split():
+        rpm, seconds = step.split(':')
+        steps.append((float(rpm), float(seconds)))
+    return steps
+
+def default_db_path():
+    return os.path.join(os.environ.get('LINUXCNC_CONFIG_DIR', ''), 'logs', 'machine_timers.db')
+
+def spindle_history(db_path, limit=200):
+    """Recent SPINDLE_START/SPINDLE_STOP events, newest first, as (epoch, type, run seconds)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("""SELECT ts, event_type, duration FROM events
+                               WHERE event_type IN ('SPINDLE_START', 'SPINDLE_STOP')
+                               ORDER BY ts DESC, id DESC LIMIT ?""", (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [(ts, event_type, duration or 0.0) for ts, event_type, duration in rows]
+
+def idle_time(history, now, warm_run):
+    """Seconds the spindle has been cold.
+    Runs shorter than warm_run do not warm the spindle, so idle time is
+    accumulated from the end of the last run that did. Returns 0 if the
+    spindle is running and None if it has never had a warm run.
+    """
+    if history and history[0][1] == 'SPINDLE_START':
+        return 0.0
+    for when, event_type, duration in history:
+        if event_type == 'SPINDLE_STOP' and duration >= warm_run:
+            return now - when
+    return None
+
+class WarmupScheduler:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or default_db_path()
+        config = get_config()
+        self.WARM_RUN = config.get_float('WARMUP', 'WARM_RUN', 300.0)        # Run that leaves the spindle warm (s)
+        self.SHORT_IDLE = config.get_float('WARMUP', 'SHORT_IDLE', 1800.0)   # Idle needing the short profile (s)
+        self.MEDIUM_IDLE = config.get_float('WARMUP', 'MEDIUM_IDLE', 7200.0)
+        self.FULL_IDLE = config.get_float('WARMUP', 'FULL_IDLE', 28800.0)
+        self.MIN_TOOL = config.get_int('WARMUP', 'MIN_TOOL', 20)            # Router (VFD spindle) tools
+        self.profiles = {name: parse_profile(config.get_str('WARMUP', f"PROFILE_{name.upper()}", DEFAULT_PROFILES[name]))
+                         for name in PROFILES}
+
+    def choose(self, idle):
+        """Profile name for an idle time, or None if no warm-up is needed"""
+        if idle is None or idle >= self.FULL_IDLE:
+            return 'full'
+        if idle >= self.MEDIUM_IDLE:
+            return 'medium'
+        if idle >= self.SHORT_IDLE:
+            return 'short'
+        return None
+
+    def decide(self, tool=None, now=None):
+        """Return (profile name or None, steps, idle seconds) and log the decision"""
+        now = time.time() if now is None else now
+        if tool is not None and tool < self.MIN_TOOL:
+            return None, [], None
+        try:
+            idle = idle_time(spindle_history(self.db_path), now, self.WARM_RUN)
+        except Exception as e:
+            # No history to go on - a full warm-up is the safe choice
+            logger.warning(f"Spindle history unavailable ({e}) - using full profile")
+            idle = None
+        profile = self.choose(idle)
+        steps = self.profiles[profile] if profile else []
+        idle_text = 'never warm' if idle is None else f"{idle / 60:.1f} min"
+        total = sum(seconds for _, seconds in steps)
+        logger.info(f"DECISION tool={tool} idle={idle_text} profile={profile or 'none'} duration={total:.0f}s")
+        return profile, steps, idle
+
+def main():
+    profile, steps, idle = WarmupScheduler().decide()
+    idle_text = 'never warm' if idle is None else f"{idle / 60:.1f} min"
+    print(f"Spindle idle: {idle_text}")
+    if profile is None:
+        print("No warm-up needed")
+    else:
+        print(f"Warm-up profile: {profile}")
+        for rpm, seconds in steps:
+            print(f"  S{rpm:.0f} for {seconds:.0f}s")
+
+if __name__ == "__main__":
+    main()
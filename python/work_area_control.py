@@ -3,6 +3,7 @@
 
 import hal
 import time
+from heartbeat import Heartbeat
 from enum import Enum
 
 class WorkAreaState(Enum):
@@ -10,6 +11,7 @@ class WorkAreaState(Enum):
     SETUP_MODE = 1
     # WAITING_FOR_VACUUM = 2
     ERROR = 3
+    PENDULUM = 4  # Dual-station: load one side while the other is machined
 
 class WorkAreaControl:
     def __init__(self):
@@ -18,12 +20,19 @@ class WorkAreaControl:
         # Work Area Input pins
         self.h.newpin("left_button", hal.HAL_BIT, hal.HAL_IN)
         self.h.newpin("right_button", hal.HAL_BIT, hal.HAL_IN)
+        self.h.newpin("pendulum_mode", hal.HAL_BIT, hal.HAL_IN)   # Dual-station mode selected
+        self.h.newpin("left_busy", hal.HAL_BIT, hal.HAL_IN)       # Program machining left station (M64 P18)
+        self.h.newpin("right_busy", hal.HAL_BIT, hal.HAL_IN)      # Program machining right station (M64 P19)
 
         # Work Area Output pins
         self.h.newpin("left_stops", hal.HAL_BIT, hal.HAL_OUT)
         self.h.newpin("right_stops", hal.HAL_BIT, hal.HAL_OUT)
         self.h.newpin("front_stops", hal.HAL_BIT, hal.HAL_OUT)
         self.h.newpin("work_area_setup", hal.HAL_BIT, hal.HAL_OUT)
+        self.h.newpin("left_setup", hal.HAL_BIT, hal.HAL_OUT)     # Pendulum: operator loading left station
+        self.h.newpin("right_setup", hal.HAL_BIT, hal.HAL_OUT)    # Pendulum: operator loading right station
+        self.h.newpin("left_ready", hal.HAL_BIT, hal.HAL_OUT)     # Pendulum: left loaded, wait with M66 P6
+        self.h.newpin("right_ready", hal.HAL_BIT, hal.HAL_OUT)    # Pendulum: right loaded, wait with M66 P7
 
         # State tracking
         self.work_area_state = WorkAreaState.IDLE
@@ -31,16 +40,58 @@ class WorkAreaControl:
         self.last_right_button = False
         self.setup_side = None  # 'left' or 'right'
         self.home_sent = False  # Track if home command has been sent
+        self.last_busy = {'left': False, 'right': False}
 
         # Initialize outputs
         self.h.left_stops = False
         self.h.right_stops = False
         self.h.front_stops = False
         self.h.work_area_setup = False
+        self.h.left_setup = False
+        self.h.right_setup = False
+        self.h.left_ready = False
+        self.h.right_ready = False
+
+        # Liveness pins watched by component_supervisor.py
+        self.heartbeat = Heartbeat(self.h)
 
         self.h.ready()
 
+    def update_pendulum(self, left_pressed, right_pressed):
+        """Per-station setup: each button toggles its own side's setup and stops"""
+        for side, pressed in (('left', left_pressed), ('right', right_pressed)):
+            busy = self.h[f"{side}_busy"]
+            setup_pin = f"{side}_setup"
+            ready_pin = f"{side}_ready"
+
+            # Program finished this station - part must be unloaded before it is ready again
+            if self.last_busy[side] and not busy:
+                print(f"  Action: {side} station finished - ready for unloading")
+                self.h[ready_pin] = False
+            self.last_busy[side] = busy
+
+            if not pressed:
+                continue
+            if busy:
+                print(f"  Action: {side} station is being machined - setup ignored")
+            elif self.h[setup_pin]:
+                print(f"  Action: {side} station loaded - ready")
+                self.h[setup_pin] = False
+                self.h[ready_pin] = True
+            else:
+                print(f"  Action: {side} station setup")
+                self.h[setup_pin] = True
+                self.h[ready_pin] = False
+
+        self.h.left_stops = self.h.left_setup
+        self.h.right_stops = self.h.right_setup
+        # Front stops span both stations - only raise them while nothing is being machined
+        self.h.front_stops = (self.h.left_setup or self.h.right_setup) and \
+                             not (self.h.left_busy or self.h.right_busy)
+
     def update(self):
+        self.heartbeat.beat()
+
         # print(f"Work area state: {self.work_area_state}")
         # print(f"work_area_setup: {self.h.work_area_setup}")
         # print(f"left_button: {self.h.left_button}")
@@ -57,7 +108,11 @@ class WorkAreaControl:
         right_pressed = right_button and not self.last_right_button
 
         # Work area state machine
-        if self.work_area_state == WorkAreaState.IDLE:
+        if self.work_area_state == WorkAreaState.IDLE and self.h.pendulum_mode:
+            print("  Action: Pendulum mode on")
+            self.work_area_state = WorkAreaState.PENDULUM
+
+        elif self.work_area_state == WorkAreaState.IDLE:
             if left_pressed or right_pressed:
                 self.work_area_state = WorkAreaState.SETUP_MODE
                 self.setup_side = 'left' if left_pressed else 'right'
@@ -83,6 +138,19 @@ class WorkAreaControl:
                 self.h.front_stops = False
                 self.h.work_area_setup = False
 
+        elif self.work_area_state == WorkAreaState.PENDULUM:
+            self.update_pendulum(left_pressed, right_pressed)
+
+            # Leave pendulum mode only once neither station is in setup
+            if not self.h.pendulum_mode and not (self.h.left_setup or self.h.right_setup):
+                print("  Action: Pendulum mode off")
+                self.work_area_state = WorkAreaState.IDLE
+                self.h.left_ready = False
+                self.h.right_ready = False
+                self.h.left_stops = False
+                self.h.right_stops = False
+                self.h.front_stops = False
+
         # Update button state tracking
         self.last_left_button = left_button
         self.last_right_button = right_button